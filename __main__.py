@@ -1,71 +1,329 @@
-import time, logging, sys
+import argparse, datetime, os, signal, socket, threading, time
+START_TIME = time.perf_counter()
+from app import input_controller, profiler
+from app.anchors import AnchorCalibrator, recalibrate
+from app.control import ControlServer, register_bot_commands
+from app.cpu_governor import CpuGovernor
+from app.input_backends import backend_from_settings
+from app.logger import setup_logger
+from app.rfb import RFBBackend
+from app.map_scheduler import MapScheduler
+from app.run_history import RunHistory
 from app.game_controller import GameController
 from app.round_monitor import RoundMonitor
 from app.config import Settings
 from app.img_to_str_reader import ImageToTextReader
-from app.window_capture import WindowCapture, QUARTZ_AVAILABLE
-
-def setup_logger(name):
-    formatter = logging.Formatter(fmt='%(asctime)s %(levelname)-8s %(message)s',
-                                  datefmt='%Y-%m-%d %H:%M:%S')
-    handler = logging.FileHandler('log.txt', mode='a')
-    handler.setFormatter(formatter)
-    screen_handler = logging.StreamHandler(stream=sys.stdout)
-    screen_handler.setFormatter(formatter)
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    logger.addHandler(handler)
-    logger.addHandler(screen_handler)
-    return logger
+from app.frame_dumper import FrameDumper
+from app.ocr_cache import OcrCache
+from app.session_state import SessionState
+from app.startup import warm_start, report_startup_time
+from app.memory_monitor import MemoryMonitor
+from app.supervisor import Supervisor, heartbeat, restart_process
+from app.window_capture import WindowCapture, WindowTracker, CAPTURE_AVAILABLE
+
+# Seconds of unreadable round counter after which a level up screen is assumed, and then a defeat.
+# Measured in time rather than failed polls, since the CPU governor stretches the poll interval.
+LEVEL_UP_AFTER = 120
+DEFEAT_AFTER = 180
+
+def play_maps(game_controller, round_monitor, logger, max_maps=None, resume=False, map_scheduler=None,
+              control=None):
+    """
+    Play maps back to back, stopping after max_maps if given.
+    With resume, the first map continues the game recorded in the session state if there is one.
+    The map_scheduler picks the route of each new map, otherwise Dark Dungeons is played.
+    Commands of the control server are applied between instruction groups, and pausing holds the loop.
+    """
+    def safe_point():
+        if control:
+            control.safe_point(game_controller._action_lock, lambda: game_controller.paused)
+
+    # With screen navigation, check what is shown after a few seconds of unreadable round counter
+    recovery_after = game_controller.global_settings.get('navigation', {}).get('recovery_after', 5.0)
+    maps_played = 0
+    while max_maps is None or maps_played < max_maps:
+        safe_point()
+        game_controller.map_ended = False
+        if resume and game_controller.resume_map():
+            logger.info("$$$$ Resumed map in progress")
+        else:
+            logger.info("$$$$ Starting new map")
+            route, points_per_win = game_controller.next_route, None
+            game_controller.next_route = None
+            if route is None and map_scheduler:
+                route = map_scheduler.next_route()
+            if map_scheduler and route in map_scheduler.routes:
+                points_per_win = map_scheduler.points_per_win(route)
+            started = game_controller.start_route(route or 'dark_dungeons', points_per_win)
+            if not started:
+                logger.warning("Could not navigate into a game, retrying")
+                time.sleep(5)
+                continue
+            game_controller.run_start_map_instructions()
+        resume = False
+
+        # 3 minutes of failed OCR likely means defeat
+        last_recovery = 0
+        level_up_cleared = False
+        while round_monitor.failing_for() <= DEFEAT_AFTER and not game_controller.map_ended:
+            profiler.checkpoint()
+            heartbeat()
+            safe_point()
+            game_controller.run_affordable_steps()
+            failing = round_monitor.failing_for()
+            if failing < last_recovery:
+                last_recovery = 0
+            if game_controller.navigator and failing >= last_recovery + recovery_after:
+                last_recovery = failing
+                if game_controller.recover_in_game():
+                    break
+            # At 2 minutes of failures, try to clear level up screen (once per failure streak)
+            if failing < LEVEL_UP_AFTER:
+                level_up_cleared = False
+            elif not level_up_cleared:
+                level_up_cleared = True
+                logger.info(f"Failed 2 minutes of OCR, assuming level up screen")
+                game_controller.click_at_position('INSTASELECTOK')
+            time.sleep(.5)
+
+        # If loop exited due to OCR failures (not map_ended), assume defeat the lives monitor missed
+        if round_monitor.failing_for() > DEFEAT_AFTER and not game_controller.map_ended:
+            logger.info(f"Failed 3 minutes of OCR, assuming defeat - going back home")
+            game_controller.end_lost_map()
+        maps_played += 1
+        if game_controller.img_reader.ocr_cache:
+            logger.info(f"OCR cache stats: {game_controller.img_reader.ocr_cache.stats()}")
+    logger.info(f"Played {maps_played} maps, stopping")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='BTD6 Auto Player')
+    parser.add_argument('--max-maps', type=int, default=None,
+                        help='Stop after playing this many maps (default: run forever)')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Start a new map even if the session state shows a game in progress')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the main loop, round monitor and input execution per thread')
+    parser.add_argument('--profile-dir', default=None,
+                        help='Where to write .pstats/.collapsed files (default: profiles/<timestamp>)')
+    parser.add_argument('--profile-interval', type=float, default=0.01,
+                        help='Seconds between stack samples for collapsed stacks (0 disables sampling)')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    logger = setup_logger('btd6')
+    args = parse_args()
+    settings = Settings().load_global_settings()
+    logger = setup_logger('btd6', settings.get('logging'))
     logger.info('-----------Starting BTD6 Auto Player------------')
 
-    # Setup background mode if available (captures screenshots without focus)
-    settings = Settings().load_global_settings()
-    background_mode = settings.get('background_mode', True) and QUARTZ_AVAILABLE
+    session_profiler = None
+    if args.profile:
+        profile_dir = args.profile_dir or os.path.join(
+            'profiles', datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+        session_profiler = profiler.SessionProfiler(profile_dir, args.profile_interval, logger)
+        session_profiler.start()
+        if hasattr(signal, 'SIGUSR1'):
+            # kill -USR1 <pid> writes the profile collected so far without stopping
+            signal.signal(signal.SIGUSR1, lambda signum, frame: session_profiler.request_dump())
+        logger.info(f"Profiling enabled, writing to {profile_dir}")
+
+    input_settings = settings.get('input', {})
+    input_controller.set_backend(backend_from_settings(input_settings))
+    logger.info(f"Input backend: {input_settings.get('backend', 'pynput')}")
+
     app_name = settings.get('app_name', 'BloonsTD6')
+    # The game's screen read from a VNC server instead of the local display
+    capture_settings = settings.get('capture', {})
+    capture_backend = None
+    if capture_settings.get('backend', 'local') == 'rfb':
+        capture_backend = RFBBackend.from_settings(capture_settings.get('rfb', {}), app_name, logger)
+
+    # Setup background mode if available (captures screenshots without focus)
+    background_mode = settings.get('background_mode', True) and CAPTURE_AVAILABLE
+    if capture_backend is not None:
+        # The remote screen can only be read through window capture, whatever background_mode says
+        background_mode = True
+
+    ocr_cache_settings = settings.get('ocr_cache', {})
+    ocr_cache = None
+    if ocr_cache_settings.get('enabled', True):
+        ocr_cache = OcrCache(ocr_cache_settings.get('path', 'ocr_cache.json'),
+                             ocr_cache_settings.get('max_entries', 5000),
+                             ocr_cache_settings.get('save_every', 50))
+        logger.info(f"OCR cache loaded with {ocr_cache.stats()['entries']} entries")
+
+    debug_capture = settings.get('debug_capture', {})
+    frame_dumper = None
+    if debug_capture.get('enabled', False):
+        frame_dumper = FrameDumper(debug_capture.get('directory', 'debug_frames'),
+                                   debug_capture.get('mode', 'on_failure'),
+                                   debug_capture.get('queue_size', 64),
+                                   debug_capture.get('ring_size', 20),
+                                   debug_capture.get('max_files', 2000),
+                                   logger)
+        frame_dumper.start()
+        logger.info(f"Debug capture enabled ({frame_dumper.mode}) into {frame_dumper.directory}")
 
     if background_mode:
-        logger.info(f"Background mode enabled - capturing '{app_name}' window")
-        window_capture = WindowCapture(app_name)
-        img_reader = ImageToTextReader(window_capture)
+        source = f"over VNC from {capture_backend.options['host']}:{capture_backend.options['port']}" \
+            if capture_backend else 'window'
+        logger.info(f"Background mode enabled - capturing '{app_name}' {source}")
+        window_capture = WindowCapture(app_name, backend=capture_backend, **settings.get('window_tracking', {}))
+        img_reader = ImageToTextReader(window_capture, ocr_cache, frame_dumper)
     else:
         logger.info("Background mode disabled - using screen capture (game must be in foreground)")
         window_capture = None
-        img_reader = ImageToTextReader()
+        img_reader = ImageToTextReader(ocr_cache=ocr_cache, frame_dumper=frame_dumper)
 
     round_monitor = RoundMonitor(logger, img_reader, window_capture)
-    game_controller = GameController(round_monitor, logger, background_mode)
+    session_state = SessionState(settings.get('session_state_file', 'session_state.json'))
+    # A remote screen has no local window to focus for input
+    game_controller = GameController(round_monitor, logger, background_mode and capture_backend is None,
+                                     session_state=session_state)
     # Share the img_reader and window_capture with game_controller
     game_controller.img_reader = img_reader
     game_controller.window_capture = window_capture
+    game_controller.hud_reader.img_reader = img_reader
+    img_reader.coordinates = game_controller.coordinates
+
+    scheduler_settings = settings.get('map_scheduler', {})
+    run_history = RunHistory(scheduler_settings.get('history_path', 'run_history.sqlite3'))
+    game_controller.run_history = run_history
+    map_scheduler = MapScheduler(run_history, settings, logger)
+
+    anchor_calibrator = None
+    if settings.get('anchor_calibration', {}).get('enabled', False):
+        anchor_calibrator = AnchorCalibrator(settings)
+        if anchor_calibrator.anchors:
+            recalibrate(anchor_calibrator, game_controller.coordinates, img_reader, logger)
+        else:
+            logger.warning(f"Anchor calibration enabled but no anchors recorded in {anchor_calibrator.anchors_dir}")
+            anchor_calibrator = None
+
+    if window_capture:
+        def on_window_change(event, old_bounds, new_bounds):
+            logger.info(f"Game window {event}: {old_bounds} -> {new_bounds}")
+            if event == WindowTracker.RESIZED:
+                # Learned glyph templates were captured at the old size
+                game_controller.hud_reader.reset()
+        window_capture.add_listener(on_window_change)
+
+    if window_capture and anchor_calibrator:
+        def follow_window(event, old_bounds, new_bounds):
+            if event == WindowTracker.CLOSED:
+                return
+            if event != WindowTracker.MOVED and recalibrate(anchor_calibrator, game_controller.coordinates,
+                                                            img_reader, logger):
+                return
+            # The mapping within the window still holds, input just has to follow the window
+            coordinates = game_controller.coordinates
+            coordinates.update(coordinates.scale_x, coordinates.scale_y, coordinates.offset_x,
+                               coordinates.offset_y, origin=(int(new_bounds['X']), int(new_bounds['Y'])))
+        window_capture.add_listener(follow_window)
+
+    cpu_governor = None
+    governor_settings = settings.get('cpu_governor', {})
+    if governor_settings.get('enabled', True):
+        # Started before the warm-up so the first Tesseract run already gets its thread limit
+        cpu_governor = CpuGovernor(logger, governor_settings.get('budget', 0.5),
+                                   governor_settings.get('window', 10.0),
+                                   governor_settings.get('max_throttle', 4.0),
+                                   governor_settings.get('report_interval', 300.0),
+                                   governor_settings.get('worker_nice', 5),
+                                   governor_settings.get('cpus'),
+                                   governor_settings.get('ocr_threads', 1))
+        cpu_governor.start()
+        if window_capture:
+            window_capture.max_frame_age = governor_settings.get('frame_reuse', 0.1)
+
+    warm_start(logger, settings, img_reader, window_capture)
+    report_startup_time(logger, START_TIME, settings.get('startup_budget'))
 
     if not background_mode:
         time.sleep(5) # Give 5 seconds to switch to the game window
     #game_controller.run_start_map_instructions()
     #round_monitor.start_monitoring()
     
-    round_monitor.start_monitoring()
-    while True:
-        logger.info("$$$$ Starting new map")
-        game_controller.map_ended = False
-        #game_controller.start_collection_game()
-        game_controller.start_dark_dungeons_game()
-        game_controller.run_start_map_instructions()
+    supervisor = None
+    supervisor_settings = settings.get('supervisor', {})
+    if supervisor_settings.get('enabled', True):
+        supervisor = Supervisor(logger, supervisor_settings.get('incidents_path', 'incidents.jsonl'),
+                                supervisor_settings.get('check_interval', 1.0),
+                                supervisor_settings.get('stall_timeout', 15.0),
+                                supervisor_settings.get('min_backoff', 1.0),
+                                supervisor_settings.get('max_backoff', 60.0))
 
-        # 3 minutes of failed OCR likely means defeat
-        while round_monitor.ROUND_COUNTER_FAILS <= 360 and not game_controller.map_ended:
-            # At 2 minutes of failures (240), try to clear level up screen (once)
-            if round_monitor.ROUND_COUNTER_FAILS == 240:
-                logger.info(f"Failed 2 minutes of OCR, assuming level up screen")
-                game_controller.click_at_position('INSTASELECTOK')
-            time.sleep(.5)
+        def restart_bot():
+            if not supervisor_settings.get('restart_process', True):
+                return
+            if ocr_cache:
+                ocr_cache.save()
+            restart_process(logger)
 
-        # If loop exited due to OCR failures (not map_ended), assume defeat
-        if round_monitor.ROUND_COUNTER_FAILS > 360 and not game_controller.map_ended:
-            logger.info(f"Failed 3 minutes of OCR, assuming defeat - going back home")
-            game_controller.click_at_position('DEFEAT_GAME_HOME_BUTTON')
-            game_controller.map_ended = True
-            time.sleep(3)   
\ No newline at end of file
+        supervisor.watch('RoundMonitor', lambda: round_monitor._thread, round_monitor.restart_monitoring)
+        # Waits on the action lock while the monitor thread runs a milestone, so allow more time
+        supervisor.watch('MainThread', threading.main_thread, restart_bot,
+                         supervisor_settings.get('main_loop_stall_timeout', 120.0))
+
+    memory_monitor = None
+    memory_settings = settings.get('memory', {})
+    if memory_settings.get('enabled', False):
+        def restart_at_safe_point():
+            if not memory_settings.get('restart_on_ceiling', True):
+                return
+            # Wait for the running instruction group so the resumed session starts from a clean state
+            with game_controller._action_lock:
+                if ocr_cache:
+                    ocr_cache.save()
+                restart_process(logger)
+
+        memory_monitor = MemoryMonitor(logger, memory_settings.get('interval', 60.0),
+                                       memory_settings.get('trace', False),
+                                       memory_settings.get('frames', 10),
+                                       memory_settings.get('top', 10),
+                                       memory_settings.get('ceiling_mb'),
+                                       memory_settings.get('snapshot_dir', 'memory_snapshots'),
+                                       restart_at_safe_point,
+                                       memory_settings.get('trend_window', 60))
+        memory_monitor.start()
+
+    control = None
+    control_settings = settings.get('control', {})
+    if control_settings.get('enabled', True) and hasattr(socket, 'AF_UNIX'):
+        control = ControlServer(control_settings.get('socket', 'btd6.sock'), logger,
+                                control_settings.get('reply_timeout', 10.0))
+        register_bot_commands(control, game_controller, round_monitor, map_scheduler, ocr_cache)
+        control.start()
+
+    round_monitor.start_monitoring()
+    if supervisor:
+        supervisor.start()
+    try:
+        with profiler.profile_thread():
+            play_maps(game_controller, round_monitor, logger, args.max_maps, resume=not args.no_resume,
+                      map_scheduler=map_scheduler, control=control)
+    finally:
+        if control:
+            control.stop()
+        if supervisor:
+            supervisor.stop()
+            logger.info(f"Supervisor handled {supervisor.incidents} incidents")
+        round_monitor.stop_monitoring()
+        if game_controller.verifier:
+            logger.info(f"Action verification: {game_controller.verifier.stats()}")
+        if cpu_governor:
+            cpu_governor.stop()
+            cpu_governor.log_report()
+        if memory_monitor:
+            memory_monitor.stop()
+            logger.info(f"Peak RSS {memory_monitor.peak_rss / (1024 * 1024):.1f}MB")
+        if capture_backend:
+            capture_backend.close()
+            logger.info(f"Skipped {img_reader.untouched_reads} reads of regions the VNC server did not repaint")
+        if frame_dumper:
+            frame_dumper.stop()
+            logger.info(f"Debug capture wrote {frame_dumper.frames_written} frames, dropped {frame_dumper.dropped}")
+        if ocr_cache:
+            ocr_cache.save()
+            logger.info(f"OCR cache stats: {ocr_cache.stats()}")
+        if session_profiler:
+            session_profiler.stop()
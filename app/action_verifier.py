@@ -0,0 +1,167 @@
+"""
+Post-condition checks for tower actions, with immediate retries.
+
+Keys and clicks sent to a VM are occasionally dropped, and a tower that was
+never placed is otherwise only noticed when the run is lost. With
+action_verification enabled in settings.json, GameController checks each
+action right after sending it, on a fresh capture of a small region:
+
+- place: the patch around the tower's coordinates changed (checked with the
+  cursor parked at park, so a held placement ghost does not count), or the
+  cash went down by at least half the tower's price
+- upgrade: the cash went down by at least half the tier's price after each
+  upgrade press, allowing for the income extrapolated from two reads before
+  it. Pressing an upgrade twice buys two tiers, so a check that was out-earned
+  must not read as a dropped key
+- select (before upgrading or changing targeting): the patch around the tower
+  changed, i.e. its range circle and panel are shown
+
+A failed check repeats the action's input right away, up to retries times.
+When a check cannot be evaluated (cash unreadable, no capture, unknown price)
+the action counts as unverified and is not repeated. The per-action success rates are
+logged at exit and returned by the control socket's metrics command.
+
+Since dropped input is now caught, the delays that only existed to make the
+game catch up are scaled by delay_scale.
+"""
+import time
+from .timing import frame_difference
+
+PASSED = 'passed'
+RETRIED = 'retried'
+FAILED = 'failed'
+UNVERIFIED = 'unverified'
+
+# Delays that only mask flaky input once actions are verified
+VERIFIED_DELAYS = ('instruction_gap', 'hero_menu', 'placement_ghost', 'upgrade_panel', 'upgrade_press',
+                   'upgrade_close', 'targeting_panel')
+
+
+class ActionVerifier:
+    """Check and retry tower actions, keeping per-action outcome counts."""
+
+    def __init__(self, hud_reader, logger, retries=2, settle=0.15, patch_size=60, min_change=8.0, clock=time):
+        """
+        Args:
+            hud_reader: HudReader for cash reads; its img_reader captures the patches
+            logger: Logger for failed checks
+            retries: Times an action is repeated after a failed check
+            settle: Seconds between sending an action and checking it
+            patch_size: Side of the square region checked around a tower
+            min_change: Mean pixel difference (0-255) that counts as a change
+            clock: Object with sleep() and monotonic() (defaults to the time module)
+        """
+        self.hud_reader = hud_reader
+        self.logger = logger
+        self.retries = retries
+        self.settle = settle
+        self.patch_size = patch_size
+        self.min_change = min_change
+        self.clock = clock
+        self.outcomes = {}
+
+    def _fresh(self):
+        # A window grab reused from before the action would hide its effect
+        window_capture = self.hud_reader.img_reader.window_capture
+        if window_capture:
+            window_capture.invalidate()
+
+    def patch(self, x, y):
+        """
+        Returns:
+            Image: The region around reference coordinates (x, y), or None if it could not be captured
+        """
+        self._fresh()
+        size = self.patch_size
+        try:
+            return self.hud_reader.img_reader.take_screenshot(x - size // 2, y - size // 2, size, size)
+        except Exception:
+            return None
+
+    def cash(self):
+        """
+        Returns:
+            tuple: (monotonic time, cash on a fresh capture or None if unreadable)
+        """
+        self._fresh()
+        return self.clock.monotonic(), self.hud_reader.read_cash()
+
+    def changed(self, before, x, y):
+        """
+        Returns:
+            bool: Whether the patch at (x, y) differs from before, None if either is missing
+        """
+        if before is None:
+            return None
+        after = self.patch(x, y)
+        if after is None:
+            return None
+        return frame_difference(before, after) >= self.min_change
+
+    def spent(self, before, cost, earlier=None):
+        """
+        Args:
+            before: cash() read right before the action
+            cost: Price of the action
+            earlier: Optional cash() read before that, with nothing bought in between, to extrapolate income from
+
+        Returns:
+            bool: Whether the cash is below what it would be without the action by at least half of cost,
+                  None if a read failed or the price is unknown
+        """
+        if not cost or before[1] is None:
+            return None
+        after = self.cash()
+        if after[1] is None:
+            return None
+        income = 0.0
+        if earlier is not None and earlier[1] is not None and before[0] > earlier[0]:
+            income = max(0, before[1] - earlier[1]) / (before[0] - earlier[0]) * (after[0] - before[0])
+        return before[1] + income - after[1] >= cost / 2
+
+    def run(self, action, perform, check, description=None):
+        """
+        Send an action and check it, repeating it after failed checks.
+
+        Args:
+            action: Action type the outcome is counted under ('place', 'upgrade', 'select')
+            perform: Callable sending the action's input, given the attempt number (0 first)
+            check: Callable returning True if the action took effect, False if not, None if unknown
+            description: What the action was, for the log
+
+        Returns:
+            bool: True if verified, False if every attempt failed, None if unverifiable
+        """
+        for attempt in range(self.retries + 1):
+            perform(attempt)
+            self.clock.sleep(self.settle)
+            result = check()
+            if result is None:
+                self._count(action, UNVERIFIED)
+                return None
+            if result:
+                self._count(action, RETRIED if attempt else PASSED)
+                return True
+            self.logger.warning(f"{description or action} did not take effect "
+                                f"(attempt {attempt + 1}/{self.retries + 1})")
+        self._count(action, FAILED)
+        return False
+
+    def _count(self, action, outcome):
+        counts = self.outcomes.setdefault(action, {PASSED: 0, RETRIED: 0, FAILED: 0, UNVERIFIED: 0})
+        counts[outcome] += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: {action: outcome counts, first_try_rate and success_rate of the verified actions}
+        """
+        stats = {}
+        for action, counts in self.outcomes.items():
+            verified = counts[PASSED] + counts[RETRIED] + counts[FAILED]
+            stats[action] = {
+                **counts,
+                'first_try_rate': round(counts[PASSED] / verified, 3) if verified else None,
+                'success_rate': round((counts[PASSED] + counts[RETRIED]) / verified, 3) if verified else None,
+            }
+        return stats
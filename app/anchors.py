@@ -0,0 +1,493 @@
+"""
+Anchor-based calibration of screen coordinates.
+
+button_positions and tower coords are measured for reference_resolution with
+the game at the top-left of the captured frame. A few UI anchors (small
+template crops recorded at the reference resolution) are located in a
+captured frame with normalized cross-correlation, coarse-to-fine over an image
+pyramid: every scale candidate is tried on a heavily downsampled frame with
+FFT correlation, and the best match is then refined level by level in a small
+window. The matched anchors give the scale and offset that map reference
+coordinates to the frame, which GameController and ImageToTextReader apply to
+every click and capture region. A full frame takes well under a second, so the
+calibration re-runs whenever the game window moves or is resized.
+
+Record an anchor (from a frame at the reference resolution), then calibrate:
+    python -m app.anchors record HOME_PLAY 700 800 100 60
+    python -m app.anchors calibrate [--image frame.png]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from app.lazy import LazyModule
+from .config import Settings
+
+np = LazyModule('numpy')
+Image = LazyModule('PIL.Image')
+
+ANCHORS_DIR = os.path.join('app', 'config', 'anchors')
+
+
+class CoordinateMapper:
+    """Maps reference coordinates to capture-frame and screen coordinates."""
+
+    def __init__(self, scale_x=1.0, scale_y=1.0, offset_x=0.0, offset_y=0.0, origin=(0, 0)):
+        """
+        Args:
+            scale_x, scale_y: Frame pixels per reference pixel
+            offset_x, offset_y: Frame position of the reference origin
+            origin: Screen position of the frame's top-left (the window origin in background mode)
+        """
+        self.update(scale_x, scale_y, offset_x, offset_y, origin)
+
+    def update(self, scale_x, scale_y, offset_x, offset_y, origin=None):
+        """Change the mapping in place so every holder of this mapper sees it."""
+        self.scale_x, self.scale_y = scale_x, scale_y
+        self.offset_x, self.offset_y = offset_x, offset_y
+        if origin is not None:
+            self.origin = tuple(origin)
+
+    def point(self, x, y):
+        """Reference point -> capture-frame point."""
+        return int(round(x * self.scale_x + self.offset_x)), int(round(y * self.scale_y + self.offset_y))
+
+    def region(self, x, y, width, height):
+        """Reference region -> capture-frame region."""
+        left, top = self.point(x, y)
+        return left, top, max(1, int(round(width * self.scale_x))), max(1, int(round(height * self.scale_y)))
+
+    def screen_point(self, x, y):
+        """Reference point -> absolute screen point for input."""
+        frame_x, frame_y = self.point(x, y)
+        return frame_x + self.origin[0], frame_y + self.origin[1]
+
+    def to_dict(self):
+        return {'scale_x': self.scale_x, 'scale_y': self.scale_y,
+                'offset_x': self.offset_x, 'offset_y': self.offset_y, 'origin': list(self.origin)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['scale_x'], data['scale_y'], data['offset_x'], data['offset_y'], data.get('origin', (0, 0)))
+
+
+def to_gray(image):
+    return np.asarray(image.convert('L'), dtype=np.float32)
+
+
+def downsample(array):
+    """Halve an array by averaging 2x2 blocks."""
+    height, width = array.shape[0] // 2 * 2, array.shape[1] // 2 * 2
+    array = array[:height, :width]
+    return (array[0::2, 0::2] + array[1::2, 0::2] + array[0::2, 1::2] + array[1::2, 1::2]) / 4
+
+
+def resize(array, scale):
+    height, width = array.shape
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return np.asarray(Image.fromarray(array).resize(size, Image.Resampling.BILINEAR), dtype=np.float32)
+
+
+def _fast_length(n):
+    """Smallest 2^a * 3^b * 5^c >= n, a length FFTs are fast for."""
+    best = 2 ** int(np.ceil(np.log2(n)))
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+class PreparedImage:
+    """Image with its spectrum and integral images, reused for every template matched against it."""
+
+    def __init__(self, image):
+        self.image = image
+        self.shape = image.shape
+        self.fft_shape = (_fast_length(image.shape[0]), _fast_length(image.shape[1]))
+        self.spectrum = np.fft.rfft2(image, self.fft_shape)
+        self.integral = self._integral(image)
+        self.integral_squares = self._integral(image.astype(np.float64) ** 2)
+
+    @staticmethod
+    def _integral(array):
+        integral = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=np.float64)
+        integral[1:, 1:] = array.cumsum(0).cumsum(1)
+        return integral
+
+    @staticmethod
+    def box_sums(integral, height, width):
+        """Sums of every height x width window (valid positions)."""
+        return (integral[height:, width:] - integral[:-height, width:]
+                - integral[height:, :-width] + integral[:-height, :-width])
+
+
+def normalized_cross_correlation(image, template):
+    """
+    NCC of template at every position where it fits in image, computed with FFTs.
+
+    Args:
+        image: Grayscale array or PreparedImage
+        template: Grayscale array
+
+    Returns:
+        ndarray: Scores in [-1, 1], shape (H - h + 1, W - w + 1)
+    """
+    if not isinstance(image, PreparedImage):
+        image = PreparedImage(image)
+    image_height, image_width = image.shape
+    height, width = template.shape
+    if height > image_height or width > image_width:
+        return np.full((1, 1), -1.0)
+    template = template - template.mean()
+    template_norm = np.sqrt((template ** 2).sum())
+    if template_norm == 0:
+        return np.full((image_height - height + 1, image_width - width + 1), -1.0)
+
+    spectrum = image.spectrum * np.conj(np.fft.rfft2(template, image.fft_shape))
+    correlation = np.fft.irfft2(spectrum, image.fft_shape)
+    correlation = correlation[:image_height - height + 1, :image_width - width + 1]
+
+    sums = PreparedImage.box_sums(image.integral, height, width)
+    variance = PreparedImage.box_sums(image.integral_squares, height, width) - sums ** 2 / (height * width)
+    # Flat windows (std below one gray level) would turn rounding noise into high scores
+    return correlation / (np.sqrt(np.maximum(variance, height * width)) * template_norm)
+
+
+def _peak(scores):
+    index = np.unravel_index(np.argmax(scores), scores.shape)
+    return float(scores[index]), int(index[1]), int(index[0])
+
+
+class FramePyramid:
+    """A frame halved level by level on demand, with FFT-ready coarse levels."""
+
+    def __init__(self, frame):
+        self.levels = [frame]
+        self._prepared = {}
+
+    def level(self, level):
+        while len(self.levels) <= level:
+            self.levels.append(downsample(self.levels[-1]))
+        return self.levels[level]
+
+    def prepared(self, level):
+        if level not in self._prepared:
+            self._prepared[level] = PreparedImage(self.level(level))
+        return self._prepared[level]
+
+
+def locate(pyramid, template, scales, scale_step=0.05, min_template_size=12, search_radius=3, candidates=6,
+           accept_score=0.995):
+    """
+    Find template in a frame pyramid. Each scale is searched over the whole
+    frame on the coarsest level that keeps the scaled template at least
+    min_template_size pixels, and the best candidates are refined level by level
+    in a small window.
+
+    Args:
+        pyramid: FramePyramid of the grayscale frame
+        template: Grayscale template array at the reference resolution
+        scales: Candidate frame/reference scale factors
+        scale_step: Spacing of the candidate scales (refined to a quarter of it)
+        min_template_size: Smallest template side searched on a coarse level
+        search_radius: Pixels searched around the upscaled match on each finer level
+        candidates: Best coarse matches refined to full resolution
+        accept_score: Full resolution score at which the remaining candidates are skipped
+
+    Returns:
+        tuple: (score, x, y, scale) with x, y the template's center in the full frame
+    """
+    found = []
+    for scale in scales:
+        size = min(template.shape) * scale
+        level = max(0, int(np.log2(size / min_template_size))) if size > min_template_size else 0
+        coarse = pyramid.level(level)
+        if min(coarse.shape) < min_template_size:
+            continue
+        scaled = resize(template, scale / 2 ** level)
+        scores = normalized_cross_correlation(pyramid.prepared(level), scaled)
+        for _ in range(2):
+            score, x, y = _peak(scores)
+            found.append((score, x, y, scale, level))
+            # Suppress the neighbourhood so the next candidate is a different location
+            scores[max(0, y - 2):y + 3, max(0, x - 2):x + 3] = -1.0
+
+    best = (-1.0, 0.0, 0.0, 1.0)
+    found = sorted(found, reverse=True)[:candidates]
+    for score, x, y, scale, coarse_level in found:
+        if best[0] >= accept_score or score < found[0][0] - 0.2:
+            break
+        for level in range(coarse_level - 1, -1, -1):
+            score, x, y, _, _ = _refine(pyramid.level(level), template, scale / 2 ** level, x * 2, y * 2, search_radius)
+        # The coarse search only tried every scale_step, settle the scale at full resolution
+        refined = []
+        for k in range(-4, 5):
+            fine_scale = scale + k * scale_step / 8
+            refined.append(_refine(pyramid.level(0), template, fine_scale, x, y, search_radius) + (fine_scale,))
+        score, x, y, width, height, scale = max(refined)
+        if score > best[0]:
+            best = (score, x + width / 2, y + height / 2, scale)
+    return best
+
+
+def _refine(frame, template, scale, x, y, search_radius):
+    """
+    Best match of the scaled template within search_radius of (x, y). The few
+    positions are scored directly, which is cheaper than FFTs at this size.
+    """
+    scaled = resize(template, scale)
+    height, width = scaled.shape
+    left, top = max(0, x - search_radius), max(0, y - search_radius)
+    window = frame[top:y + search_radius + height, left:x + search_radius + width]
+    if window.shape[0] < height or window.shape[1] < width:
+        return -1.0, x, y, width, height
+    scaled = scaled - scaled.mean()
+    windows = np.lib.stride_tricks.sliding_window_view(window, (height, width))
+    sums = windows.sum(axis=(2, 3))
+    variance = np.square(windows).sum(axis=(2, 3)) - sums ** 2 / (height * width)
+    correlation = np.einsum('ijkl,kl->ij', windows, scaled)
+    scores = correlation / (np.sqrt(np.maximum(variance, height * width)) * max(np.sqrt((scaled ** 2).sum()), 1e-6))
+    score, dx, dy = _peak(scores)
+    return score, left + dx, top + dy, width, height
+
+
+def _fit(matches):
+    """Least-squares mapping of matches and the residual of each match."""
+    reference = np.array([(m[0], m[1]) for m in matches], dtype=np.float64)
+    found = np.array([(m[2], m[3]) for m in matches], dtype=np.float64)
+    result = []
+    for axis in (0, 1):
+        if len(matches) >= 2 and np.ptp(reference[:, axis]) > 0:
+            scale, offset = np.polyfit(reference[:, axis], found[:, axis], 1)
+        else:
+            # Too few anchors spread along this axis, trust the matched template scale
+            scale = float(np.mean([m[4] for m in matches]))
+            offset = float(np.mean(found[:, axis] - scale * reference[:, axis]))
+        result.append((float(scale), float(offset)))
+    return _fit_residuals(matches, (result[0][0], result[1][0], result[0][1], result[1][1]))
+
+
+def fit_mapping(matches, tolerance=3.0):
+    """
+    Least-squares scale and offset from matched anchors. Anchors that disagree
+    with the others (e.g. a template that also fits somewhere else) are left
+    out: every pair of anchors whose spacing agrees with their matched scale
+    proposes a mapping, and the one most anchors agree with within tolerance
+    is refitted on those anchors.
+
+    Args:
+        matches: List of (reference_x, reference_y, frame_x, frame_y, scale, score) for anchor centers
+        tolerance: Largest residual in pixels an anchor may have
+
+    Returns:
+        tuple: ((scale_x, scale_y, offset_x, offset_y), matches that were kept)
+    """
+    matches = list(matches)
+    best = matches
+    if len(matches) > 2:
+        best = []
+        for i in range(len(matches)):
+            for j in range(i + 1, len(matches)):
+                mapping, _ = _fit([matches[i], matches[j]])
+                # The spacing of the two anchors has to agree with the size they were matched at
+                template_scale = (matches[i][4] + matches[j][4]) / 2
+                if any(abs(scale / template_scale - 1) > 0.1 for scale in mapping[:2]):
+                    continue
+                _, residuals = _fit_residuals(matches, mapping)
+                inliers = [m for m, r in zip(matches, residuals) if r <= tolerance]
+                # More agreeing anchors win, then better matching ones
+                if (len(inliers), sum(m[5] for m in inliers)) > (len(best), sum(m[5] for m in best)):
+                    best = inliers
+        best = best or matches
+    mapping, _ = _fit(best)
+    return mapping, best
+
+
+def _fit_residuals(matches, mapping):
+    reference = np.array([(m[0], m[1]) for m in matches], dtype=np.float64)
+    found = np.array([(m[2], m[3]) for m in matches], dtype=np.float64)
+    predicted = reference * mapping[:2] + mapping[2:]
+    return mapping, np.abs(predicted - found).max(axis=1)
+
+
+class AnchorCalibrator:
+    """Locate recorded anchors in a frame and derive a CoordinateMapper."""
+
+    def __init__(self, global_settings, anchors_dir=ANCHORS_DIR):
+        """
+        Args:
+            global_settings: Parsed settings.json (reference_resolution and "anchor_calibration")
+            anchors_dir: Directory with anchors.json and <NAME>.png templates
+        """
+        settings = global_settings.get('anchor_calibration', {})
+        self.reference_resolution = global_settings['reference_resolution']
+        self.anchors_dir = anchors_dir
+        self.min_score = settings.get('min_score', 0.8)
+        self.scale_range = settings.get('scale_range')
+        self.scale_tolerance = settings.get('scale_tolerance', 0.1)
+        self.scale_step = settings.get('scale_step', 0.05)
+        self.min_template_size = settings.get('min_template_size', 12)
+        self.tolerance = settings.get('tolerance', 3.0)
+        self.anchors = self.load_anchors()
+
+    def load_anchors(self):
+        """{name: ((x, y), grayscale template)} for every recorded anchor."""
+        try:
+            with open(os.path.join(self.anchors_dir, 'anchors.json'), 'r') as f:
+                positions = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        anchors = {}
+        for name, position in positions.items():
+            path = os.path.join(self.anchors_dir, f'{name}.png')
+            if os.path.exists(path):
+                anchors[name] = (tuple(position), to_gray(Image.open(path)))
+        return anchors
+
+    def record(self, frame, name, x, y, width, height):
+        """Save a crop of a reference-resolution frame as an anchor template."""
+        os.makedirs(self.anchors_dir, exist_ok=True)
+        frame.crop((x, y, x + width, y + height)).save(os.path.join(self.anchors_dir, f'{name}.png'))
+        index_path = os.path.join(self.anchors_dir, 'anchors.json')
+        try:
+            with open(index_path, 'r') as f:
+                positions = json.load(f)
+        except (OSError, ValueError):
+            positions = {}
+        positions[name] = [x, y]
+        with open(index_path, 'w') as f:
+            json.dump(positions, f, indent=2)
+        self.anchors = self.load_anchors()
+
+    def _scales(self, frame_width, frame_height):
+        """
+        Scale candidates. The game normally fills the captured window or screen,
+        so by default only scales a little below the one at which it exactly
+        fits the frame are tried; scale_range searches a fixed range instead.
+        """
+        fits = min(frame_width / self.reference_resolution[0], frame_height / self.reference_resolution[1])
+        low, high = self.scale_range or (fits * (1 - self.scale_tolerance), fits)
+        count = int(round((high - low) / self.scale_step)) + 1
+        return [round(high - i * self.scale_step, 4) for i in range(count)]
+
+    def calibrate(self, frame):
+        """
+        Args:
+            frame: PIL Image of the whole capture (window or screen)
+
+        Returns:
+            tuple: (scale_x, scale_y, offset_x, offset_y) and the per-anchor matches,
+                   or (None, matches) if no anchor matched well enough
+        """
+        pyramid = FramePyramid(to_gray(frame))
+        scales = self._scales(frame.width, frame.height)
+        matches = {}
+        for name, ((reference_x, reference_y), template) in self.anchors.items():
+            score, x, y, scale = locate(pyramid, template, scales, self.scale_step, self.min_template_size)
+            matches[name] = {'score': round(score, 3), 'x': x, 'y': y, 'scale': round(scale, 4)}
+            if score >= self.min_score:
+                height, width = template.shape
+                matches[name]['reference'] = (reference_x + width / 2, reference_y + height / 2)
+
+        good = [(m['reference'][0], m['reference'][1], m['x'], m['y'], m['scale'], m['score'])
+                for m in matches.values() if 'reference' in m]
+        if not good:
+            return None, matches
+        mapping, kept = fit_mapping(good, self.tolerance)
+        for match in matches.values():
+            if 'reference' in match:
+                match['used'] = any(k[:2] == match['reference'] for k in kept)
+        return mapping, matches
+
+
+def capture_frame(img_reader):
+    """Whole window in background mode, the whole screen otherwise."""
+    if img_reader.window_capture:
+        frame = img_reader.window_capture.capture_window()
+        if frame is not None:
+            return frame
+    import pyautogui
+    return pyautogui.screenshot()
+
+
+def recalibrate(calibrator, mapper, img_reader, logger):
+    """
+    Capture a frame and update mapper in place.
+
+    Returns:
+        bool: True if the anchors were found
+    """
+    started = time.perf_counter()
+    frame = capture_frame(img_reader)
+    mapping, matches = calibrator.calibrate(frame)
+    elapsed = time.perf_counter() - started
+    if mapping is None:
+        logger.warning(f"Anchor calibration found no anchors ({elapsed:.2f}s): {matches}")
+        return False
+    origin = (0, 0)
+    if img_reader.window_capture:
+        bounds = img_reader.window_capture.get_window_bounds()
+        if bounds:
+            origin = (int(bounds['X']), int(bounds['Y']))
+    mapper.update(*mapping, origin=origin)
+    logger.info(f"Anchor calibration in {elapsed:.2f}s: scale ({mapping[0]:.4f}, {mapping[1]:.4f}), "
+                f"offset ({mapping[2]:.1f}, {mapping[3]:.1f}), origin {origin}")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record UI anchors and calibrate coordinates')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record = subparsers.add_parser('record', help='Save a region of a reference-resolution frame as an anchor')
+    record.add_argument('name')
+    record.add_argument('coords', nargs=4, type=int, metavar=('X', 'Y', 'WIDTH', 'HEIGHT'))
+    record.add_argument('--image', help='Frame to crop from (defaults to a screenshot)')
+    calibrate = subparsers.add_parser('calibrate', help='Locate the anchors and store the mapping for this machine')
+    calibrate.add_argument('--image', help='Frame to calibrate on (defaults to a screenshot)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('btd6.anchors')
+    settings = Settings()
+    global_settings = settings.load_global_settings()
+    calibrator = AnchorCalibrator(global_settings)
+
+    if args.image:
+        frame = Image.open(args.image).convert('RGB')
+    else:
+        import pyautogui
+        frame = pyautogui.screenshot()
+
+    if args.command == 'record':
+        calibrator.record(frame, args.name, *args.coords)
+        logger.info(f"Recorded anchor {args.name} at {args.coords}")
+        return 0
+
+    if not calibrator.anchors:
+        logger.error(f"No anchors recorded in {calibrator.anchors_dir}")
+        return 1
+    started = time.perf_counter()
+    mapping, matches = calibrator.calibrate(frame)
+    logger.info(f"Located {len(matches)} anchors in {time.perf_counter() - started:.3f}s")
+    for name, match in matches.items():
+        logger.info(f"  {name}: score {match['score']} at ({match['x']}, {match['y']}) scale {match['scale']}")
+    if mapping is None:
+        logger.error("No anchor matched well enough, mapping not saved")
+        return 1
+    mapper = CoordinateMapper(*mapping)
+    machine_settings = settings.load_machine_settings()
+    machine_settings['coordinates'] = mapper.to_dict()
+    logger.info(f"Saved {mapper.to_dict()} to {settings.save_machine_settings(machine_settings)}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+"""
+End-to-end throughput benchmark against the synthetic game.
+
+Starts app/fake_game.py in a subprocess, then plays maps with the same loop as
+__main__.py (play_maps) using the input backend and capture configured in
+settings.json. The fake game's event log is the ground truth for
+    - maps/hour: finished maps (victories and defeats) per wall-clock hour
+    - detection latency: time from the game starting a round until the round
+      monitor confirmed it
+    - missed rounds: rounds the game played that were never confirmed
+    - CPU per map: bot process plus its Tesseract subprocesses, and separately
+      the fake game itself
+Results are printed and optionally written as JSON for comparing runs.
+
+Run on a Linux box without a display:
+    xvfb-run -s '-screen 0 1600x1000x24' python -m app.benchmark --maps 3 --speed 20
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from . import input_controller
+from .config import Settings
+from .game_controller import GameController
+from .img_to_str_reader import ImageToTextReader
+from .input_backends import backend_from_settings
+from .round_monitor import RoundMonitor
+from .window_capture import WindowCapture, CAPTURE_AVAILABLE
+
+
+def _load_play_maps():
+    """play_maps from the repository's __main__.py, so the benchmark runs the real loop."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__main__.py')
+    spec = importlib.util.spec_from_file_location('btd6_main', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.play_maps
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def read_events(path):
+    try:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def detection_latencies(events, detections):
+    """
+    Match every confirmed round to the latest time the game started that round before it.
+
+    Args:
+        events: Fake game events ({"t", "event": "round", "round"} among others)
+        detections: [(t, round)] confirmed by the round monitor
+
+    Returns:
+        tuple: (latencies in seconds, number of game rounds never confirmed)
+    """
+    rounds = [(event['t'], event['round']) for event in events if event['event'] == 'round']
+    latencies, matched = [], set()
+    for detected_at, round in detections:
+        started = [(t, i) for i, (t, r) in enumerate(rounds) if r == round and t <= detected_at]
+        if started:
+            t, index = max(started)
+            latencies.append(detected_at - t)
+            matched.add(index)
+    # Rounds are often confirmed by a later jump (e.g. 17 -> 19); only count rounds
+    # the monitor never got past
+    confirmed = set()
+    for index, (t, round) in enumerate(rounds):
+        if index in matched or any(r >= round and td >= t for td, r in detections):
+            confirmed.add(index)
+    return latencies, len(rounds) - len(confirmed)
+
+
+def summarize(events, detections, wall_seconds, bot_cpu, game_cpu):
+    victories = sum(1 for event in events if event['event'] == 'victory')
+    defeats = sum(1 for event in events if event['event'] == 'defeat')
+    maps = victories + defeats
+    latencies, missed = detection_latencies(events, detections)
+    latency = None
+    if latencies:
+        latency = {'median': round(statistics.median(latencies), 3), 'p95': round(_percentile(latencies, 0.95), 3),
+                   'max': round(max(latencies), 3), 'samples': len(latencies)}
+    return {
+        'maps': maps,
+        'victories': victories,
+        'defeats': defeats,
+        'wall_seconds': round(wall_seconds, 1),
+        'maps_per_hour': round(maps * 3600 / wall_seconds, 2) if wall_seconds else 0.0,
+        'detection_latency': latency,
+        'missed_rounds': missed,
+        'bot_cpu_seconds': round(bot_cpu, 2),
+        'bot_cpu_per_map': round(bot_cpu / maps, 2) if maps else None,
+        'game_cpu_seconds': round(game_cpu, 2),
+    }
+
+
+def wait_for_window(app_name, timeout=15.0):
+    """Block until the fake game window can be found, if window capture is available."""
+    if not CAPTURE_AVAILABLE:
+        time.sleep(3)
+        return True
+    capture = WindowCapture(app_name)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if capture.refresh_window()[0] is not None:
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def run_benchmark(maps, speed, defeat_rate, logger, seed=0):
+    """
+    Play maps against a freshly started fake game.
+
+    Returns:
+        dict: Throughput, detection latency and CPU figures (see summarize)
+    """
+    global_settings = Settings().load_global_settings()
+    app_name = global_settings.get('app_name', 'BloonsTD6')
+    events_path = tempfile.mktemp(prefix='fake_game_', suffix='.jsonl')
+    game = subprocess.Popen([sys.executable, '-m', 'app.fake_game', '--speed', str(speed),
+                             '--defeat-rate', str(defeat_rate), '--events', events_path, '--seed', str(seed)])
+    try:
+        if not wait_for_window(app_name):
+            raise RuntimeError(f"Fake game window '{app_name}' did not appear")
+
+        input_settings = global_settings.get('input', {})
+        input_controller.set_backend(backend_from_settings(input_settings))
+        background_mode = global_settings.get('background_mode', True) and CAPTURE_AVAILABLE
+        window_capture = WindowCapture(app_name, **global_settings.get('window_tracking', {})) \
+            if background_mode else None
+        img_reader = ImageToTextReader(window_capture)
+
+        round_monitor = RoundMonitor(logger, img_reader, window_capture)
+        detections = []
+        # Registered before the controller's listener, which may run instructions first
+        round_monitor.add_round_change_listener(lambda round: detections.append((time.time(), round)))
+        game_controller = GameController(round_monitor, logger, background_mode)
+        game_controller.img_reader = img_reader
+        game_controller.window_capture = window_capture
+        game_controller.hud_reader.img_reader = img_reader
+        img_reader.coordinates = game_controller.coordinates
+
+        play_maps = _load_play_maps()
+        children_before = _children_cpu()
+        cpu_before = time.process_time()
+        started = time.time()
+        round_monitor.start_monitoring()
+        try:
+            play_maps(game_controller, round_monitor, logger, maps, resume=False)
+        finally:
+            round_monitor.stop_monitoring()
+        wall_seconds = time.time() - started
+        # Tesseract runs as a child process of the bot
+        children_after_bot = _children_cpu()
+        bot_cpu = time.process_time() - cpu_before + children_after_bot - children_before
+    finally:
+        game.terminate()
+        game.wait()
+    game_cpu = _children_cpu() - children_after_bot
+    events = read_events(events_path)
+    if os.path.exists(events_path):
+        os.remove(events_path)
+    return summarize(events, detections, wall_seconds, bot_cpu, game_cpu)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the bot end to end against the fake game')
+    parser.add_argument('--maps', type=int, default=3, help='Maps to play')
+    parser.add_argument('--speed', type=float, default=20.0, help='Fake game round clock acceleration')
+    parser.add_argument('--defeat-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(message)s')
+    logger = logging.getLogger('btd6.benchmark')
+    results = run_benchmark(args.maps, args.speed, args.defeat_rate, logger, args.seed)
+    results['settings'] = {'maps': args.maps, 'speed': args.speed, 'defeat_rate': args.defeat_rate}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
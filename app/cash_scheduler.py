@@ -0,0 +1,120 @@
+"""
+Cash-aware scheduling of strategy steps.
+
+Instead of waiting for fixed milestone rounds, every instruction of a strategy
+is queued in milestone order and run as soon as the cash on hand covers it.
+Costs come from app/config/tower_costs.json (medium prices) scaled for the
+difficulty the same way the game does, rounded to the nearest $5.
+"""
+from collections import deque
+from .config import Settings
+
+
+class CostTable:
+    """Tower, hero and upgrade prices for one difficulty."""
+
+    def __init__(self, costs, difficulty='impoppable'):
+        """
+        Args:
+            costs: Parsed tower_costs.json
+            difficulty: Key of costs['difficulty_multipliers']
+        """
+        self.costs = costs
+        self.multiplier = costs['difficulty_multipliers'][difficulty]
+
+    def _scale(self, medium_cost):
+        return int(round(medium_cost * self.multiplier / 5) * 5)
+
+    def place_cost(self, tower_type, hero=None):
+        if tower_type == 'HERO':
+            return self._scale(self.costs['heroes'].get(hero, 0))
+        return self._scale(self.costs['towers'][tower_type]['cost'])
+
+    def upgrade_cost(self, tower_type, path, tier):
+        """
+        Args:
+            tower_type: Tower type, e.g. 'DART'
+            path: 1 (top), 2 (middle) or 3 (bottom)
+            tier: Current tier on that path (0-4)
+        """
+        upgrades = self.costs['towers'].get(tower_type, {}).get('upgrades')
+        if not upgrades or tier >= len(upgrades[path - 1]):
+            return 0
+        return self._scale(upgrades[path - 1][tier])
+
+
+def upgrade_path(value):
+    """Map an instruction path argument to 1-3 the same way GameController.upgrade_tower does."""
+    value = int(value)
+    return value if value in (1, 2) else 3
+
+
+def record_tiers(tiers, instruction):
+    """Add the tiers an instruction buys to tiers ({tower id: [top, middle, bottom]})."""
+    parts = instruction.split(' ')
+    if parts[0] == 'upgrade':
+        tower_tiers = tiers.setdefault(parts[1], [0, 0, 0])
+        for value in parts[2:]:
+            tower_tiers[upgrade_path(value) - 1] += 1
+
+
+class CashScheduler:
+    """Queue of strategy instructions, released in order once affordable."""
+
+    def __init__(self, map_settings, cost_table):
+        """
+        Args:
+            map_settings: Parsed strategy JSON
+            cost_table: CostTable for the difficulty being played
+        """
+        self.towers = map_settings['towers']
+        self.hero = map_settings['hero']
+        self.cost_table = cost_table
+        instructions = map_settings['instructions']
+        self.steps = deque(instruction
+                           for round in instructions['milestones']
+                           for instruction in instructions[str(round)])
+        self.tiers = {}  # tower id -> [top, middle, bottom] tiers bought
+
+    def step_cost(self, instruction):
+        """Total cost of an instruction given the upgrades bought so far."""
+        parts = instruction.split(' ')
+        instruction_type = parts[0]
+        if instruction_type not in ('place', 'upgrade'):
+            return 0
+        tower_type = self.towers[parts[1]]['type']
+        if instruction_type == 'place':
+            return self.cost_table.place_cost(tower_type, self.hero)
+        if instruction_type == 'upgrade':
+            tiers = list(self.tiers.get(parts[1], [0, 0, 0]))
+            cost = 0
+            for value in parts[2:]:
+                path = upgrade_path(value)
+                cost += self.cost_table.upgrade_cost(tower_type, path, tiers[path - 1])
+                tiers[path - 1] += 1
+            return cost
+        return 0
+
+    def peek(self):
+        """
+        Returns:
+            Tuple of (instruction, cost) for the next step, or None when done
+        """
+        if not self.steps:
+            return None
+        instruction = self.steps[0]
+        return instruction, self.step_cost(instruction)
+
+    def pop(self):
+        """Remove the next step and record the upgrades it buys."""
+        instruction = self.steps.popleft()
+        self.record(instruction)
+        return instruction
+
+    def record(self, instruction):
+        """Track tiers bought by an instruction run outside the queue (start and emergency instructions)."""
+        record_tiers(self.tiers, instruction)
+
+
+def load_cost_table(difficulty='impoppable'):
+    return CostTable(Settings().load_settings('app', 'config', 'tower_costs.json'), difficulty)
@@ -1,4 +1,9 @@
-import json, os, difflib
+import json, os, difflib, functools, socket
+
+@functools.lru_cache(maxsize=None)
+def _list_map_folders(maps_dir):
+    return tuple(d for d in os.listdir(maps_dir)
+                 if os.path.isdir(os.path.join(maps_dir, d)))
 
 class Settings:
     def load_settings(self, *args):
@@ -12,11 +17,105 @@ class Settings:
     def load_global_settings(self):
         return self.load_settings('app', 'config', 'settings.json')
 
+    def machine_settings_path(self):
+        """Per-machine settings (e.g. the timing profile) live in config/machine/<hostname>.json."""
+        return os.path.join(os.getcwd(), 'app', 'config', 'machine', socket.gethostname() + '.json')
+
+    def load_machine_settings(self):
+        """Return this machine's settings, or an empty dict if there are none yet."""
+        try:
+            with open(self.machine_settings_path(), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_machine_settings(self, machine_settings):
+        path = self.machine_settings_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(machine_settings, f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
     def get_available_maps(self):
-        """Return list of all available map folder names."""
+        """Return list of all available map folder names (listed once per process)."""
         maps_dir = os.path.join(os.getcwd(), 'app', 'config', 'maps')
-        return [d for d in os.listdir(maps_dir)
-                if os.path.isdir(os.path.join(maps_dir, d))]
+        return list(_list_map_folders(maps_dir))
+
+    def load_all_map_settings(self, difficulty='impoppable'):
+        """Load the strategy for every map folder, keyed by map name."""
+        return {map_name: self.load_map_settings(map_name, difficulty)
+                for map_name in self.get_available_maps()}
+
+    def validate_map_settings(self, map_settings, global_settings):
+        """
+        Check a map strategy for mistakes that would otherwise only show up mid-run.
+
+        Args:
+            map_settings: Parsed strategy JSON for one map
+            global_settings: Parsed settings.json (for tower shortcuts)
+
+        Returns:
+            list: Human readable problems, empty if the strategy is valid
+        """
+        errors = []
+        for key in ('hero', 'towers', 'instructions'):
+            if key not in map_settings:
+                errors.append(f"missing '{key}'")
+        if errors:
+            return errors
+
+        shortcuts = global_settings['tower_shortcuts']
+        towers = map_settings['towers']
+        for tower_id, tower in towers.items():
+            if tower.get('type') not in shortcuts:
+                errors.append(f"tower '{tower_id}' has unknown type '{tower.get('type')}'")
+            coords = tower.get('coords')
+            if not (isinstance(coords, list) and len(coords) == 2
+                    and all(isinstance(c, int) for c in coords)):
+                errors.append(f"tower '{tower_id}' has invalid coords {coords}")
+
+        instructions = map_settings['instructions']
+        milestones = instructions.get('milestones', [])
+        if milestones != sorted(milestones):
+            errors.append("milestones are not in ascending order")
+        groups = ['start'] + [str(round) for round in milestones]
+        for group in groups:
+            if group not in instructions:
+                errors.append(f"no instructions for '{group}'")
+                continue
+            for instruction in instructions[group]:
+                error = self._validate_instruction(instruction.split(' '), towers, shortcuts)
+                if error:
+                    errors.append(f"'{group}': '{instruction}' {error}")
+
+        for index, response in enumerate(map_settings.get('emergency', [])):
+            if not response.get('instructions'):
+                errors.append(f"emergency response {index} has no instructions")
+                continue
+            for instruction in response['instructions']:
+                error = self._validate_instruction(instruction.split(' '), towers, shortcuts)
+                if error:
+                    errors.append(f"emergency response {index}: '{instruction}' {error}")
+        return errors
+
+    def _validate_instruction(self, instruction, towers, shortcuts):
+        instruction_type = instruction[0]
+        if instruction_type not in ('place', 'upgrade', 'change', 'ability'):
+            return "has unknown instruction type"
+        if instruction_type == 'ability':
+            if len(instruction) != 2 or f'ABILITY_{instruction[1]}' not in shortcuts:
+                return "needs an ability number with an ABILITY_<n> shortcut"
+            return None
+        if len(instruction) < 2 or instruction[1] not in towers:
+            return "references an unknown tower"
+        if instruction_type == 'upgrade' and not (
+                len(instruction) > 2 and all(path in ('1', '2', '3') for path in instruction[2:])):
+            return "needs upgrade paths 1, 2 or 3"
+        if instruction_type == 'change' and not (len(instruction) == 3 and instruction[2].isdigit()):
+            return "needs a number of targeting changes"
+        return None
 
     def find_best_map_match(self, ocr_text, cutoff=0.75):
         """
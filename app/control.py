@@ -0,0 +1,274 @@
+"""
+Local control socket for changing a running bot without restarting it.
+
+The bot listens on a Unix domain socket (control.socket in settings.json,
+owner-only permissions). Each connection sends one JSON request line,
+{"command": ..., "args": [...]}, and gets one JSON response line,
+{"ok": true, "result": ...} or {"ok": false, "error": ...}.
+
+Read-only commands are answered right away. Commands that change what the bot
+does are queued and applied by the main loop at its next safe point, while
+holding the controller's action lock, so they never land in the middle of an
+instruction group. The client gets the result once the command was applied,
+or "queued" if the main loop is busy (e.g. navigating menus) for longer than
+reply_timeout.
+
+    python -m app.control state
+    python -m app.control pause
+    python -m app.control resume
+    python -m app.control next collection
+    python -m app.control reload DARKDUNGEONS
+    python -m app.control poll 0.25
+    python -m app.control delay menu_click 0.8
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from . import cpu_governor, memory_monitor
+from .config import Settings
+from .supervisor import heartbeat
+
+QUEUED = 'queued'
+
+
+class ControlServer:
+    """Unix socket server whose commands are applied at the main loop's safe points."""
+
+    def __init__(self, path, logger, reply_timeout=10.0):
+        """
+        Args:
+            path: Socket file path
+            logger: Logger for received commands
+            reply_timeout: Seconds a client waits for a queued command to be applied
+        """
+        self.path = path
+        self.logger = logger
+        self.reply_timeout = reply_timeout
+        self._commands = {}
+        self._pending = queue.Queue()
+        self._running = False
+        self._socket = None
+        self._thread = None
+
+    def register(self, name, handler, safe_point=True):
+        """
+        Args:
+            name: Command name
+            handler: Callable taking the request args, returning a JSON serializable result;
+                     raise ValueError to reject a request
+            safe_point: Queue the command for the main loop instead of running it right away
+        """
+        self._commands[name] = (handler, safe_point)
+
+    def start(self):
+        if os.path.exists(self.path):
+            # Left behind by a bot that did not shut down cleanly
+            os.remove(self.path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._socket.listen(4)
+        self._socket.settimeout(1.0)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='ControlServer', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Control socket listening on {self.path}")
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _serve(self):
+        while self._running:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            with connection:
+                try:
+                    connection.settimeout(5.0)
+                    request = json.loads(connection.makefile('r').readline())
+                    response = self.dispatch(request.get('command'), request.get('args', []))
+                except (OSError, ValueError, AttributeError) as e:
+                    response = {'ok': False, 'error': f"Bad request: {e}"}
+                try:
+                    connection.sendall((json.dumps(response) + '\n').encode())
+                except OSError:
+                    pass
+
+    def dispatch(self, name, args):
+        """Run or queue one command and return its response."""
+        if name not in self._commands:
+            return {'ok': False, 'error': f"Unknown command {name!r}, expected one of {sorted(self._commands)}"}
+        handler, safe_point = self._commands[name]
+        self.logger.info(f"Control command: {name} {' '.join(str(arg) for arg in args)}".rstrip())
+        if not safe_point:
+            return self._run(handler, args)
+        reply = {'done': threading.Event()}
+        self._pending.put((handler, args, reply))
+        if reply['done'].wait(self.reply_timeout):
+            return reply['response']
+        return {'ok': True, 'result': QUEUED}
+
+    @staticmethod
+    def _run(handler, args):
+        try:
+            return {'ok': True, 'result': handler(*args)}
+        except (ValueError, TypeError, KeyError) as e:
+            return {'ok': False, 'error': str(e)}
+
+    def apply_pending(self, lock=None):
+        """Apply the queued commands, holding lock (the controller's action lock) if given."""
+        while True:
+            try:
+                handler, args, reply = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if lock is not None:
+                with lock:
+                    reply['response'] = self._run(handler, args)
+            else:
+                reply['response'] = self._run(handler, args)
+            reply['done'].set()
+
+    def safe_point(self, lock=None, hold=None, interval=0.5):
+        """
+        Called by the main loop between instruction groups. Applies the queued commands,
+        then blocks while hold() is true (the bot is paused), still applying commands.
+        """
+        self.apply_pending(lock)
+        while hold is not None and hold():
+            heartbeat(expected=interval)
+            time.sleep(interval)
+            self.apply_pending(lock)
+
+
+def register_bot_commands(server, game_controller, round_monitor, map_scheduler=None, ocr_cache=None):
+    """Register the bot's control commands on server."""
+    from .game_controller import ROUTES
+    started = time.time()
+
+    def state():
+        controller = game_controller
+        return {
+            'paused': controller.paused,
+            'map': controller.map,
+            'route': controller.route,
+            'next_route': controller.next_route,
+            'map_ended': controller.map_ended,
+            'round': round_monitor.CUR_ROUND,
+            'round_counter_fails': round_monitor.ROUND_COUNTER_FAILS,
+            'round_counter_failing_for': round(round_monitor.failing_for(), 1),
+            'lives': round_monitor.lives_tracker.lives,
+            'pending_milestones': list(controller.milestone_rounds),
+            'pending_cash_steps': len(controller.cash_scheduler.steps) if controller.cash_scheduler else None,
+            'points': controller.current_points,
+            'poll_interval': round_monitor.poll_interval,
+            'delays': controller.timing.delays,
+        }
+
+    def metrics():
+        hud = game_controller.hud_reader
+        return {
+            'uptime_seconds': round(time.time() - started, 1),
+            'rss_mb': round(memory_monitor.rss_bytes() / memory_monitor.MB, 1),
+            'ocr_cache': ocr_cache.stats() if ocr_cache else None,
+            'hud_template_reads': hud.template_reads,
+            'hud_ocr_reads': hud.ocr_reads,
+            'routes': dict(map_scheduler.rank()) if map_scheduler else None,
+            'cpu': cpu_governor.report(),
+            'actions': game_controller.verifier.stats() if game_controller.verifier else None,
+        }
+
+    def pause():
+        game_controller.paused = True
+        return 'paused'
+
+    def resume():
+        game_controller.paused = False
+        # Failed reads while paused (operator in menus) must not look like a defeat
+        round_monitor.ROUND_COUNTER_FAILS = 0
+        return 'resumed'
+
+    def next_route(route):
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route {route!r}, expected one of {sorted(ROUTES)}")
+        game_controller.next_route = route
+        return route
+
+    def reload(map_name):
+        settings = Settings()
+        if map_name not in settings.get_available_maps():
+            raise ValueError(f"Unknown map {map_name!r}")
+        errors = settings.validate_map_settings(settings.load_map_settings(map_name, 'impoppable'),
+                                                game_controller.global_settings)
+        if errors:
+            raise ValueError(f"{map_name} not reloaded: {'; '.join(errors)}")
+        if map_name == game_controller.map and not game_controller.map_ended:
+            game_controller.reload_map_plan()
+            return f"reloaded {map_name}, {len(game_controller.milestone_rounds)} milestones pending"
+        return f"{map_name} is valid, used from its next run"
+
+    def poll(seconds):
+        seconds = float(seconds)
+        if not 0.05 <= seconds <= 10:
+            raise ValueError("Poll interval must be between 0.05 and 10 seconds")
+        round_monitor.poll_interval = seconds
+        return seconds
+
+    def delay(name, seconds):
+        game_controller.set_delay(name, float(seconds))
+        return {name: game_controller.timing.delay(name)}
+
+    server.register('state', state, safe_point=False)
+    server.register('metrics', metrics, safe_point=False)
+    server.register('pause', pause)
+    server.register('resume', resume)
+    server.register('next', next_route)
+    server.register('reload', reload)
+    server.register('poll', poll)
+    server.register('delay', delay)
+
+
+def send(path, command, args=(), timeout=30.0):
+    """Send one command to a running bot and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path)
+        connection.sendall((json.dumps({'command': command, 'args': list(args)}) + '\n').encode())
+        return json.loads(connection.makefile('r').readline())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send a command to the running bot')
+    parser.add_argument('command', help='state, metrics, pause, resume, next, reload, poll or delay')
+    parser.add_argument('args', nargs='*')
+    parser.add_argument('--socket', default=None, help='Control socket (default from settings.json)')
+    args = parser.parse_args(argv)
+
+    path = args.socket or Settings().load_global_settings().get('control', {}).get('socket', 'btd6.sock')
+    try:
+        response = send(path, args.command, args.args)
+    except OSError as e:
+        print(f"Could not reach the bot on {path}: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(response.get('result') if response['ok'] else response, indent=2))
+    return 0 if response['ok'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+"""
+CPU budget for the bot's capture and OCR work.
+
+On a shared VM every millisecond the bot spends capturing and running
+Tesseract is taken from the game. The governor measures the bot's CPU use
+(its own threads plus the Tesseract processes it spawned) every window
+seconds and compares it with budget, a share of one core. When the bot is
+over budget the round monitor poll interval is stretched by the throttle
+factor (up to max_throttle); under budget it relaxes back to 1. Stages
+(capture, preprocess, ocr, hud_match) are timed so the report shows where the
+CPU goes.
+
+While GameController sends input (an input burst), non-critical work waits:
+lives reads, debug frame writes, memory samples and OCR cache saves. The OCR
+worker thread runs at a lower priority (worker_nice, per thread on Linux),
+the process can be pinned to cpus (Tesseract children inherit the mask), and
+Tesseract is limited to ocr_threads OpenMP threads, which avoids spinning up a
+thread per core for a 150x30 crop.
+
+The module-level helpers are no-ops unless a CpuGovernor is active, so the hot
+paths can call them unconditionally.
+"""
+import contextlib
+import os
+import resource
+import sys
+import threading
+import time
+
+_active = None
+
+
+def stage(name):
+    """Account the CPU and wall time of the block to a named stage."""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.stage(name)
+
+
+def input_burst():
+    """Mark the block as sending game input, deferring non-critical work."""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.input_burst()
+
+
+def in_burst():
+    """True while input is being sent, for work that should skip a turn."""
+    return _active is not None and _active.bursts > 0
+
+
+def wait_idle(timeout):
+    """Block until no input is being sent, for at most timeout seconds."""
+    if _active is not None:
+        _active.idle.wait(timeout)
+
+
+def throttle():
+    """Factor to stretch polling intervals by, 1.0 within budget."""
+    return _active.throttle if _active is not None else 1.0
+
+
+def lower_thread_priority():
+    """Lower the priority of the calling worker thread (and the processes it spawns)."""
+    if _active is not None:
+        _active.lower_thread_priority()
+
+
+def report():
+    """The active governor's report, or None if there is none."""
+    return _active.report() if _active is not None else None
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class CpuGovernor:
+    """Keep the bot's CPU use within a budget by throttling its polling."""
+
+    def __init__(self, logger, budget=0.5, window=10.0, max_throttle=4.0, report_interval=300.0,
+                 worker_nice=5, cpus=None, ocr_threads=1, clock=time.monotonic):
+        """
+        Args:
+            logger: Logger for reports
+            budget: CPU the bot may use, as a share of one core
+            window: Seconds between measurements
+            max_throttle: Largest factor polling intervals are stretched by
+            report_interval: Seconds between logged reports
+            worker_nice: Niceness added to OCR worker threads (0 to leave them alone)
+            cpus: Optional list of CPUs to pin the process to
+            ocr_threads: OMP_THREAD_LIMIT for Tesseract (None to leave it alone)
+            clock: Time source
+        """
+        self.logger = logger
+        self.budget = budget
+        self.window = window
+        self.max_throttle = max_throttle
+        self.report_interval = report_interval
+        self.worker_nice = worker_nice
+        self.cpus = cpus
+        self.ocr_threads = ocr_threads
+        self.clock = clock
+        self.throttle = 1.0
+        self.share = 0.0
+        self.bursts = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._windows = 0
+        self._over_budget = 0
+        self._started = None
+        self._cpu_started = None
+        self._last = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        global _active
+        if self.ocr_threads:
+            # Read by Tesseract when it starts, so it has to be set before the first spawn
+            os.environ['OMP_THREAD_LIMIT'] = str(self.ocr_threads)
+        if self.cpus and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cpus)
+        self._started = self.clock()
+        self._cpu_started = self._cpu()
+        self._last = (self._started, self._cpu_started)
+        _active = self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='CpuGovernor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        global _active
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if _active is self:
+            _active = None
+        self.idle.set()
+
+    @staticmethod
+    def _cpu():
+        return time.process_time() + _children_cpu()
+
+    def _run(self):
+        next_report = self.clock() + self.report_interval
+        while self._running:
+            time.sleep(self.window)
+            try:
+                self.update()
+                if self.clock() >= next_report:
+                    next_report += self.report_interval
+                    self.log_report()
+            except Exception as e:
+                self.logger.exception(f"CPU governor update failed: {e}")
+
+    def update(self):
+        """Measure the CPU share of the last window and adjust the throttle."""
+        now, cpu = self.clock(), self._cpu()
+        last_time, last_cpu = self._last
+        self._last = (now, cpu)
+        if now <= last_time:
+            return self.throttle
+        self.share = (cpu - last_cpu) / (now - last_time)
+        self._windows += 1
+        if self.share > self.budget:
+            self._over_budget += 1
+        # Square root damping: the measured share lags the throttle by a window
+        factor = (max(self.share, 0.01) / self.budget) ** 0.5
+        self.throttle = min(self.max_throttle, max(1.0, self.throttle * factor))
+        return self.throttle
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall, cpu, children = time.perf_counter(), time.thread_time(), _children_cpu()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu + _children_cpu() - children
+            with self._lock:
+                totals = self._stages.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += cpu
+                totals[2] += wall
+
+    @contextlib.contextmanager
+    def input_burst(self):
+        with self._lock:
+            self.bursts += 1
+            self.idle.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.bursts -= 1
+                if not self.bursts:
+                    self.idle.set()
+
+    def lower_thread_priority(self):
+        if not self.worker_nice or not sys.platform.startswith('linux'):
+            # Elsewhere niceness is per process and would slow input as well
+            return
+        try:
+            thread_id = threading.get_native_id()
+            os.setpriority(os.PRIO_PROCESS, thread_id, os.getpriority(os.PRIO_PROCESS, thread_id) + self.worker_nice)
+        except OSError as e:
+            self.logger.warning(f"Could not lower the priority of {threading.current_thread().name}: {e}")
+
+    def report(self):
+        """
+        Returns:
+            dict: Budget, achieved shares, throttle and per-stage costs
+        """
+        elapsed = self.clock() - self._started if self._started is not None else 0.0
+        cpu = self._cpu() - self._cpu_started if self._cpu_started is not None else 0.0
+        with self._lock:
+            stages = {name: {'calls': calls, 'cpu_ms': round(cpu_seconds * 1000 / calls, 2),
+                             'wall_ms': round(wall_seconds * 1000 / calls, 2),
+                             'cpu_fraction': round(cpu_seconds / cpu, 3) if cpu else 0.0}
+                      for name, (calls, cpu_seconds, wall_seconds) in self._stages.items()}
+        return {
+            'budget': self.budget,
+            'share': round(self.share, 3),
+            'average_share': round(cpu / elapsed, 3) if elapsed else 0.0,
+            'over_budget_fraction': round(self._over_budget / self._windows, 3) if self._windows else 0.0,
+            'throttle': round(self.throttle, 2),
+            'stages': stages,
+        }
+
+    def log_report(self):
+        report = self.report()
+        stages = ', '.join(f"{name} {cost['cpu_ms']}ms x{cost['calls']} ({cost['cpu_fraction']:.0%})"
+                           for name, cost in sorted(report['stages'].items()))
+        self.logger.info(f"CPU {report['average_share']:.0%} of a core on average (budget {self.budget:.0%}, "
+                         f"last window {report['share']:.0%}, over budget {report['over_budget_fraction']:.0%} "
+                         f"of windows, throttle x{report['throttle']}); {stages}")
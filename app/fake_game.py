@@ -0,0 +1,308 @@
+"""
+Synthetic stand-in for the game, for end-to-end benchmarks without BTD6.
+
+FakeGame is a small state machine over the screens the bot walks through
+(home, map/difficulty/mode selection, loading, the impoppable start popup,
+in game, victory, game over, defeat, insta collection). Each screen is
+rendered with PIL at reference_resolution, with buttons drawn at the
+button_positions of settings.json and the round counter drawn as white
+'N/100' text with a dark outline where the bot reads it. The lives counter
+shows the single impoppable life, and 0 behind the defeat screen. Clicks near a
+button and key presses change screens like the game does; once started with
+space, rounds advance on an accelerated clock using the expected round
+durations, ending in victory after round 100 or in defeat with a configured
+probability. Every state change is appended to a JSON lines event log that
+app/benchmark.py compares against what the bot detected.
+
+The Tk frontend shows the game in a window named after app_name at the top
+left of the screen, so the bot finds, captures and clicks it as usual. Run it
+under Xvfb:
+    xvfb-run -s '-screen 0 1600x1000x24' python -m app.fake_game --speed 20
+"""
+import argparse
+import json
+import random
+import time
+from app.lazy import LazyModule
+from .config import Settings
+from .round_tracker import expected_round_duration
+
+Image = LazyModule('PIL.Image')
+ImageDraw = LazyModule('PIL.ImageDraw')
+ImageFont = LazyModule('PIL.ImageFont')
+ImageTk = LazyModule('PIL.ImageTk')
+
+HOME = 'HOME'
+MAP_SELECT = 'MAP_SELECT'
+DIFFICULTY_SELECT = 'DIFFICULTY_SELECT'
+MODE_SELECT = 'MODE_SELECT'
+LOADING = 'LOADING'
+IMPOPPABLE_START = 'IMPOPPABLE_START'
+IN_GAME = 'IN_GAME'
+PAUSED = 'PAUSED'
+VICTORY = 'VICTORY'
+GAME_OVER = 'GAME_OVER'
+DEFEAT = 'DEFEAT'
+INSTA_COLLECT = 'INSTA_COLLECT'
+
+# Screen -> {button position name: screen it leads to}
+BUTTONS = {
+    HOME: {'HOME_PLAY_BUTTON': MAP_SELECT, 'COLLECT_INSTA': INSTA_COLLECT},
+    MAP_SELECT: {'MAP_GO_LEFT_BUTTON': MAP_SELECT, 'MAP_SELECT_TOPRIGHT': DIFFICULTY_SELECT, 'BACK_BUTTON': HOME},
+    DIFFICULTY_SELECT: {'HARD_MODE_SELECT': MODE_SELECT, 'BACK_BUTTON': MAP_SELECT},
+    MODE_SELECT: {'IMPOPPABLE_MODE_SELECT': LOADING, 'BACK_BUTTON': DIFFICULTY_SELECT},
+    LOADING: {},
+    IMPOPPABLE_START: {'IMPOPPABLE_GAMESTART_OK': IN_GAME},
+    IN_GAME: {},
+    PAUSED: {},
+    VICTORY: {'END_GAME_NEXT_BUTTON': GAME_OVER},
+    GAME_OVER: {'END_GAME_HOME_BUTTON': HOME},
+    DEFEAT: {'DEFEAT_GAME_HOME_BUTTON': HOME},
+    INSTA_COLLECT: {'3INSTA1': INSTA_COLLECT, '3INSTA2': INSTA_COLLECT, '3INSTA3': INSTA_COLLECT,
+                    '2INSTA1': INSTA_COLLECT, '2INSTA2': INSTA_COLLECT, 'INSTASELECTOK': INSTA_COLLECT,
+                    'BACK_BUTTON': HOME},
+}
+
+BACKGROUNDS = {
+    HOME: (40, 90, 160), MAP_SELECT: (60, 120, 60), DIFFICULTY_SELECT: (90, 60, 120), MODE_SELECT: (120, 60, 90),
+    LOADING: (20, 20, 20), IMPOPPABLE_START: (70, 70, 70), IN_GAME: (95, 110, 70), PAUSED: (50, 55, 35),
+    VICTORY: (170, 130, 30), GAME_OVER: (140, 100, 40), DEFEAT: (130, 30, 30), INSTA_COLLECT: (30, 120, 130),
+}
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype('DejaVuSans-Bold.ttf', size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+class FakeGame:
+    """Screen state machine with an accelerated round clock."""
+
+    def __init__(self, global_settings, speed=20.0, defeat_rate=0.0, load_seconds=1.0, hit_radius=40,
+                 events_path=None, seed=None, clock=time.monotonic):
+        """
+        Args:
+            global_settings: Parsed settings.json (button_positions, reference_resolution)
+            speed: How many times faster than the expected fast-forward round durations rounds pass
+            defeat_rate: Probability that a map ends in defeat at a random round
+            load_seconds: Loading screen duration after selecting the mode
+            hit_radius: Pixels around a button position that count as clicking it
+            events_path: Optional JSON lines file of state changes
+            seed: Random seed for reproducible defeats
+            clock: Time source
+        """
+        self.positions = global_settings['button_positions']
+        self.resolution = tuple(global_settings['reference_resolution'])
+        self.speed = speed
+        self.defeat_rate = defeat_rate
+        self.load_seconds = load_seconds
+        self.hit_radius = hit_radius
+        self.events_path = events_path
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.screen = HOME
+        self.round = 6
+        self.lives = 1
+        self.running = False
+        self.defeat_round = None
+        self.maps_started = 0
+        self.clicks = 0
+        self.keys = 0
+        self._screen_since = clock()
+        self._round_started = None
+
+    def _event(self, event, **fields):
+        if self.events_path:
+            with open(self.events_path, 'a') as f:
+                f.write(json.dumps({'t': time.time(), 'event': event, **fields}) + '\n')
+
+    def _enter(self, screen):
+        previous = self.screen
+        if screen != previous:
+            self._event('screen', screen=screen, previous=previous)
+        self.screen = screen
+        self._screen_since = self.clock()
+        if screen == IN_GAME and previous == IMPOPPABLE_START:
+            self._reset_map()
+            self.maps_started += 1
+            self.defeat_round = self.random.randint(30, 99) if self.random.random() < self.defeat_rate else None
+            self._event('map_start', map=self.maps_started, defeat_round=self.defeat_round)
+
+    def click(self, x, y):
+        """Handle a click at reference coordinates."""
+        self.clicks += 1
+        for name, target in BUTTONS[self.screen].items():
+            bx, by = self.positions[name]
+            if abs(x - bx) <= self.hit_radius and abs(y - by) <= self.hit_radius:
+                if target == HOME and self.screen in (GAME_OVER, DEFEAT):
+                    self._reset_map()
+                self._enter(target)
+                return name
+        return None
+
+    def press(self, key):
+        """Handle a key press ('space', 'esc', tower shortcuts, ...)."""
+        self.keys += 1
+        if self.screen == IN_GAME and key == 'space' and not self.running:
+            self.running = True
+            self._round_started = self.clock()
+            self._event('round', round=self.round)
+        elif self.screen == IN_GAME and key == 'esc':
+            self._enter(PAUSED)
+        elif self.screen == PAUSED and key == 'esc':
+            self._enter(IN_GAME)
+
+    def _reset_map(self):
+        self.round, self.running, self._round_started, self.defeat_round = 6, False, None, None
+        self.lives = 1
+
+    def round_duration(self, round):
+        return expected_round_duration(round) / self.speed
+
+    def tick(self):
+        """Advance time-based state: loading and rounds."""
+        now = self.clock()
+        if self.screen == LOADING and now - self._screen_since >= self.load_seconds:
+            self._enter(IMPOPPABLE_START)
+        if not self.running or self.screen not in (IN_GAME, PAUSED):
+            return
+        if self.screen == PAUSED:
+            # Rounds do not progress while paused
+            self._round_started += now - self._screen_since
+            self._screen_since = now
+            return
+        while self.running and now - self._round_started >= self.round_duration(self.round):
+            self._round_started += self.round_duration(self.round)
+            if self.defeat_round and self.round >= self.defeat_round:
+                self.running = False
+                self.lives = 0
+                self._event('defeat', round=self.round)
+                self._enter(DEFEAT)
+            elif self.round >= 100:
+                self.running = False
+                self._event('victory', round=self.round)
+                self._enter(VICTORY)
+            else:
+                self.round += 1
+                self._event('round', round=self.round)
+
+    def render(self):
+        """The current screen as a PIL Image at reference resolution."""
+        image = Image.new('RGB', self.resolution, BACKGROUNDS[self.screen])
+        draw = ImageDraw.Draw(image)
+        draw.text((self.resolution[0] // 2, 40), self.screen.replace('_', ' '), fill=(235, 235, 235),
+                  font=_font(36), anchor='mt')
+        for name in BUTTONS[self.screen]:
+            x, y = self.positions[name]
+            draw.rounded_rectangle((x - 60, y - 25, x + 60, y + 25), radius=10, fill=(90, 200, 60),
+                                   outline=(20, 20, 20), width=3)
+            draw.text((x, y), name[:12], fill=(20, 20, 20), font=_font(14), anchor='mm')
+        if self.screen in (IN_GAME, PAUSED):
+            x, y = self.positions['ROUND_COUNTER']
+            width, height = self.positions['ROUND_DIMENSIONS']
+            draw.text((x + width // 2, y + height // 2), f'{self.round}/100', fill=(255, 255, 255),
+                      font=_font(height - 6), anchor='mm', stroke_width=3, stroke_fill=(10, 10, 10))
+            x, y = self.positions['CASH_COUNTER']
+            draw.text((x, y), f'${1000 + 250 * (self.round - 6)}', fill=(255, 255, 255),
+                      font=_font(30), stroke_width=3, stroke_fill=(10, 10, 10))
+        if self.screen in (IN_GAME, PAUSED, DEFEAT):
+            x, y = self.positions['LIVES_COUNTER']
+            draw.text((x, y), str(self.lives), fill=(255, 255, 255),
+                      font=_font(30), stroke_width=3, stroke_fill=(10, 10, 10))
+        return image
+
+
+class TkFrontend:
+    """Show a FakeGame in a Tk window and feed it the window's mouse and key events."""
+
+    KEYSYMS = {'space': 'space', 'Escape': 'esc', 'Tab': 'tab', 'Return': 'enter'}
+
+    def __init__(self, game, title, fps=30):
+        import tkinter
+        self.game = game
+        self.fps = fps
+        self.root = tkinter.Tk()
+        self.root.title(title)
+        self.root.geometry(f'{game.resolution[0]}x{game.resolution[1]}+0+0')
+        self.root.resizable(False, False)
+        self.label = tkinter.Label(self.root, borderwidth=0)
+        self.label.pack()
+        self.label.bind('<Button-1>', lambda event: self.game.click(event.x, event.y))
+        self.root.bind('<Key>', self._on_key)
+        self._photo = None
+        self._rendered = None
+
+    def _on_key(self, event):
+        self.game.press(self.KEYSYMS.get(event.keysym, event.char or event.keysym))
+
+    def _refresh(self):
+        self.game.tick()
+        state = (self.game.screen, self.game.round)
+        # Only re-render when something visible changed
+        if state != self._rendered:
+            self._photo = ImageTk.PhotoImage(self.game.render())
+            self.label.configure(image=self._photo)
+            self._rendered = state
+        self.root.after(int(1000 / self.fps), self._refresh)
+
+    def run(self):
+        self._refresh()
+        self.root.mainloop()
+
+
+class RFBFrontend:
+    """Serve a FakeGame over VNC with the mock server of app/rfb.py, taking its clicks and keys."""
+
+    def __init__(self, game, name, port, fps=30):
+        from .rfb import MockRFBServer
+        self.game = game
+        self.fps = fps
+        self.server = MockRFBServer(host='0.0.0.0', port=port, name=name, on_key=game.press, on_click=game.click)
+        self._rendered = None
+
+    def run(self):
+        self.server.start()
+        try:
+            while True:
+                self.game.tick()
+                state = (self.game.screen, self.game.round)
+                # Only changed frames are diffed into dirty rectangles for the clients
+                if state != self._rendered:
+                    self.server.update(self.game.render())
+                    self._rendered = state
+                time.sleep(1 / self.fps)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the synthetic game stand-in')
+    parser.add_argument('--speed', type=float, default=20.0, help='Round clock acceleration')
+    parser.add_argument('--defeat-rate', type=float, default=0.0, help='Probability a map ends in defeat')
+    parser.add_argument('--load-seconds', type=float, default=1.0)
+    parser.add_argument('--events', default=None, help='JSON lines file to log state changes to')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--snapshot', default=None, help='Write the home screen to this PNG and exit')
+    parser.add_argument('--rfb-port', type=int, default=None,
+                        help='Serve the game over VNC on this port instead of showing a window')
+    args = parser.parse_args(argv)
+
+    global_settings = Settings().load_global_settings()
+    game = FakeGame(global_settings, args.speed, args.defeat_rate, args.load_seconds,
+                    events_path=args.events, seed=args.seed)
+    if args.snapshot:
+        game.render().save(args.snapshot)
+        return 0
+    if args.rfb_port is not None:
+        RFBFrontend(game, global_settings.get('app_name', 'BloonsTD6'), args.rfb_port).run()
+        return 0
+    TkFrontend(game, global_settings.get('app_name', 'BloonsTD6')).run()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
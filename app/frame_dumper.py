@@ -0,0 +1,148 @@
+"""
+Asynchronous debug capture of OCR input frames.
+
+Saving PNGs in the poll loop is too slow, so OCR reads hand their raw and
+preprocessed crops plus the result to a FrameDumper, which only appends to an
+in-memory ring and (in 'always' mode) a bounded queue. A background thread
+writes queued frames into a rolling archive; when the queue is full frames are
+dropped instead of blocking the caller.
+
+In 'on_failure' mode nothing is written until dump_recent() is called (e.g.
+when the round counter stalls), which flushes the last N frames. The archive
+index (index.jsonl) uses the reading format replayed by app/round_tracker.py.
+It is rotated to index.1.jsonl once it refers to max_files / 2 PNGs, so both
+indexes together never refer to more PNGs than are kept.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from . import cpu_governor
+
+
+class FrameDumper:
+    """Bounded, non-blocking writer of OCR debug frames."""
+
+    def __init__(self, directory='debug_frames', mode='on_failure', queue_size=64,
+                 ring_size=20, max_files=2000, logger=None):
+        """
+        Args:
+            directory: Archive directory (PNG crops plus index.jsonl)
+            mode: 'always' writes every frame, 'on_failure' only writes on dump_recent()
+            queue_size: Frames waiting to be written before new ones are dropped
+            ring_size: Recent frames kept in memory for dump_recent()
+            max_files: Oldest PNGs are deleted beyond this many
+            logger: Optional logger
+        """
+        self.directory = directory
+        self.mode = mode
+        self.max_files = max_files
+        self.logger = logger
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._ring = deque(maxlen=ring_size)
+        self._ring_lock = threading.Lock()
+        self._written = deque()
+        # PNGs referred to by the live index.jsonl
+        self._index_files = 0
+        self._sequence = 0
+        self._thread = None
+        self.dropped = 0
+        self.frames_written = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._written = deque(sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.endswith('.png')))
+        try:
+            with open(os.path.join(self.directory, 'index.jsonl')) as f:
+                self._index_files = sum(len({'raw', 'processed'} & json.loads(line).keys()) for line in f)
+        except (OSError, ValueError):
+            self._index_files = 0
+        self._thread = threading.Thread(target=self._writer_loop, name='FrameDumper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out whatever is queued and stop the writer thread."""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, region, raw, processed, text, confidence=None):
+        """
+        Record one OCR read. Never blocks.
+
+        Args:
+            region: Name of the region read (e.g. 'ROUND_COUNTER')
+            raw: Captured crop (PIL Image)
+            processed: Preprocessed crop passed to OCR (PIL Image)
+            text: OCR result
+            confidence: Optional OCR confidence 0-1
+        """
+        frame = {'t': time.time(), 'region': region, 'text': text, 'conf': confidence,
+                 'raw': raw, 'processed': processed}
+        with self._ring_lock:
+            self._ring.append(frame)
+        if self.mode == 'always':
+            self._enqueue(frame, None)
+
+    def dump_recent(self, reason):
+        """Queue the frames currently in the ring for writing, tagged with reason."""
+        with self._ring_lock:
+            frames = list(self._ring)
+            self._ring.clear()
+        for frame in frames:
+            self._enqueue(frame, reason)
+        if self.logger:
+            self.logger.info(f"Dumping {len(frames)} recent frames ({reason}) to {self.directory}")
+
+    def _enqueue(self, frame, reason):
+        try:
+            self._queue.put_nowait((frame, reason))
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer_loop(self):
+        index_path = os.path.join(self.directory, 'index.jsonl')
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, reason = item
+            # PNG encoding competes with the input being sent, let it finish first
+            cpu_governor.wait_idle(timeout=5.0)
+            try:
+                self._write_frame(index_path, frame, reason)
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Failed to write debug frame: {e}")
+
+    def _write_frame(self, index_path, frame, reason):
+        self._sequence += 1
+        stem = f"{int(frame['t'] * 1000)}_{self._sequence:06d}_{frame['region']}"
+        entry = {'t': frame['t'], 'region': frame['region'], 'text': frame['text'],
+                 'conf': frame['conf'], 'reason': reason}
+        for kind in ('raw', 'processed'):
+            if frame[kind] is None:
+                continue
+            path = os.path.join(self.directory, f'{stem}_{kind}.png')
+            frame[kind].save(path, optimize=True)
+            entry[kind] = os.path.basename(path)
+            self._written.append(path)
+            self._index_files += 1
+        with open(index_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.frames_written += 1
+        if self._index_files >= self.max_files // 2:
+            # Rotated on the PNGs written, the unit pruning counts, so index.1 never outlives its files
+            os.replace(index_path, os.path.join(self.directory, 'index.1.jsonl'))
+            self._index_files = 0
+
+        while len(self._written) > self.max_files:
+            try:
+                os.remove(self._written.popleft())
+            except OSError:
+                pass
@@ -1,16 +1,52 @@
+import threading
 import time
-from . import input_controller
+from collections import Counter
+from . import cpu_governor, input_controller, profiler
+from .action_verifier import VERIFIED_DELAYS, ActionVerifier
+from .anchors import CoordinateMapper
+from .cash_scheduler import CashScheduler, load_cost_table, record_tiers, upgrade_path as path_number
 from .config import Settings
+from .hud_reader import HudReader
+from .lives_tracker import LivesTracker
+from .logger import RateLimiter
+from .navigator import Navigator, ScreenGraph
+from .round_tracker import parse_round
+from .run_history import ABORTED, DEFEAT, VICTORY
+from .supervisor import heartbeat
+from .timing import TimingProfile
 from app.img_to_str_reader import ImageToTextReader
-from app.window_capture import WindowCapture, WindowFocus, QUARTZ_AVAILABLE
+from app.map_identifier import MapIdentifier
+from app.window_capture import WindowCapture, WindowFocus, CAPTURE_AVAILABLE
+
+# Opening the 3 and 2 instas of the collection reward, then confirming
+INSTA_COLLECT_CLICKS = ('3INSTA1', '3INSTA1', '3INSTA2', '3INSTA2', '3INSTA3', '3INSTA3',
+                        '2INSTA1', '2INSTA1', '2INSTA2', '2INSTA2', 'INSTASELECTOK')
+
+# Map scheduler route -> GameController method starting a game through it
+ROUTES = {
+    'dark_dungeons': 'start_dark_dungeons_game',
+    'collection': 'start_collection_game',
+}
 
 class GameController:
     """
     Handles game logic and responses to round changes.
     This class defines what should happen at different round milestones.
     """
-    def __init__(self, round_monitor, logger, background_mode=True):
+    def __init__(self, round_monitor, logger, background_mode=True, input_backend=None, clock=None,
+                 session_state=None):
+        """
+        Args:
+            round_monitor: RoundMonitor to receive round changes from
+            logger: Logger for progress messages
+            background_mode: Capture without focus, only focusing the game for input
+            input_backend: Object with the input_controller API (defaults to input_controller)
+            clock: Object with sleep() and monotonic() (defaults to the time module)
+            session_state: Optional SessionState to checkpoint progress into for resuming
+        """
         self.round_monitor = round_monitor
+        self.input = input_backend if input_backend else input_controller
+        self.clock = clock if clock else time
         # Register our round change handler
         self.round_monitor.add_round_change_listener(self.handle_round_change)
         self.logger = logger
@@ -19,36 +55,107 @@ class GameController:
         self.map_settings = Settings().load_map_settings(self.map, 'impoppable')
         self.milestone_rounds = self.map_settings['instructions']['milestones']
         self.map_ended = False
-        self.current_points = 37
-        self.points_per_run = 14
-        self.points_to_collect = 70
+        # Set through the control socket (app/control.py): no game input while paused,
+        # next_route overrides the map scheduler for one map
+        self.paused = False
+        self.next_route = None
+        self.session_state = session_state
+        rewards = self.global_settings.get('rewards', {})
+        starting_points = rewards.get('starting_points', 37)
+        self.current_points = session_state.get('points', starting_points) if session_state else starting_points
+        self.points_per_run = rewards.get('points_per_run', 14)
+        self.points_to_collect = rewards.get('points_to_collect', 70)
+
+        # Run recording for the map scheduler; __main__ attaches a RunHistory
+        self.run_history = None
+        self.route = 'dark_dungeons'
+        self._run = None
+
+        # 'milestones' runs instructions at fixed rounds, 'cash' runs them in order once affordable
+        self.scheduling = self.global_settings.get('scheduling', 'milestones')
+        self.cost_table = load_cost_table('impoppable')
+        self.cash_scheduler = None
+        # Round changes arrive on the monitor thread, cash steps on the main loop
+        self._action_lock = threading.RLock()
 
         # Background mode: capture screenshots without focus, only grab focus for input
-        self.background_mode = background_mode and QUARTZ_AVAILABLE
+        self.background_mode = background_mode and CAPTURE_AVAILABLE
         self.app_name = self.global_settings.get('app_name', 'BloonsTD6')
+        # Focus switches fail the same way every instruction group, e.g. without a window manager
+        self._focus_errors = RateLimiter(logger, interval=60.0)
+
+        self.map_identifier = MapIdentifier(
+            max_distance=self.global_settings.get('map_hash_max_distance', 10))
 
+        # Named UI delays, calibrated for this machine if `python -m app.timing --calibrate` was run
+        self.timing = TimingProfile.for_machine(self.global_settings)
         # Delay after bringing window to focus (seconds)
-        self.focus_delay = self.global_settings.get('focus_delay', 0.3)
+        self.focus_delay = self.timing.delay('focus')
 
-        # Window capture for background mode
-        if QUARTZ_AVAILABLE:
-            self.window_capture = WindowCapture(self.app_name)
+        # Reference -> captured/screen coordinates, from `python -m app.anchors calibrate` or
+        # re-derived at runtime from the UI anchors. Identity when never calibrated.
+        coordinates = Settings().load_machine_settings().get('coordinates')
+        self.coordinates = CoordinateMapper.from_dict(coordinates) if coordinates else CoordinateMapper()
+
+        # Window capture for background mode only: headless runs (simulator, CI) have no display to open
+        if self.background_mode:
+            self.window_capture = WindowCapture(self.app_name, **self.global_settings.get('window_tracking', {}))
         else:
             self.window_capture = None
 
         if self.background_mode:
-            self.img_reader = ImageToTextReader(self.window_capture)
+            self.img_reader = ImageToTextReader(self.window_capture, coordinates=self.coordinates)
             self.logger.info(f"Background mode enabled for '{self.app_name}'")
         else:
-            self.img_reader = ImageToTextReader()
-            if background_mode and not QUARTZ_AVAILABLE:
-                self.logger.warning("Background mode requested but Quartz not available. "
-                                    "Install with: pip install pyobjc-framework-Quartz")
+            self.img_reader = ImageToTextReader(coordinates=self.coordinates)
+            if background_mode and not CAPTURE_AVAILABLE:
+                self.logger.warning("Background mode requested but no capture backend available. "
+                                    "Install with: pip install pyobjc-framework-Quartz (macOS) "
+                                    "or pip install python-xlib (Linux)")
+        self.hud_reader = HudReader(self.img_reader, self.global_settings)
+        # Lives are sampled on the monitor thread alongside the round counter
+        self.round_monitor.lives_reader = self.hud_reader
+        self.round_monitor.add_lives_change_listener(self.handle_lives_change)
+        # Index of a strategy emergency response -> when it last ran on this map
+        self._emergencies_run = {}
+        # Emergency instructions run on this map, replayed into a reloaded or resumed cash queue
+        self._emergency_done = []
+        # Start instructions of this map that already ran
+        self._start_steps_done = 0
+        # Tower id -> [top, middle, bottom] tiers bought on this map, pricing verified upgrades
+        self.tower_tiers = {}
+
+        # Post-condition checks and retries for tower actions (app/action_verifier.py)
+        self.verifier = None
+        verification = self.global_settings.get('action_verification', {})
+        # Where the cursor waits while a placement is checked, None checks placements by cash only
+        self.verification_park = verification.get('park')
+        if verification.get('enabled', False):
+            self.verifier = ActionVerifier(self.hud_reader, logger, verification.get('retries', 2),
+                                           verification.get('settle', 0.15), verification.get('patch_size', 60),
+                                           verification.get('min_change', 8.0), self.clock)
+            self.timing.scale(VERIFIED_DELAYS, verification.get('delay_scale', 0.6))
+
+        # Screen graph navigation once signatures are recorded (`python -m app.navigator record`)
+        self.navigator = None
+        if self.global_settings.get('navigation', {}).get('enabled', False):
+            graph = ScreenGraph.load()
+            if graph.recorded():
+                self.navigator = Navigator(self, graph, self.global_settings, logger)
+            else:
+                self.logger.warning("Navigation enabled but no screen signatures recorded, using click scripts")
+
+    def _wait(self, name):
+        """Sleep for the named delay of the timing profile."""
+        delay = self.timing.delay(name)
+        heartbeat(expected=delay)
+        self.clock.sleep(delay)
 
     def _ensure_focus(self):
         """Bring the game window to the foreground for input."""
-        if self.background_mode:
-            WindowFocus.bring_to_front(self.app_name, self.focus_delay)
+        if self.background_mode and not WindowFocus.bring_to_front(self.app_name, self.focus_delay):
+            self._focus_errors.warning('focus', f"Could not bring '{self.app_name}' to the foreground, "
+                                                f"sending input without focusing it")
 
     def _store_previous_app(self):
         """Store the currently focused app to restore later."""
@@ -58,17 +165,18 @@ class GameController:
     def _restore_focus(self):
         """Restore focus to the previously active app."""
         if self.background_mode and hasattr(self, '_previous_app') and self._previous_app:
-            time.sleep(0.05)
-            WindowFocus.bring_to_front(self._previous_app)
+            self.clock.sleep(0.05)
+            if not WindowFocus.bring_to_front(self._previous_app):
+                self._focus_errors.warning('restore', f"Could not give the focus back to '{self._previous_app}'")
             self._previous_app = None
 
     def _click(self, x, y):
-        """Click at the specified coordinates."""
-        input_controller.click(x, y)
+        """Click at the specified reference coordinates."""
+        self.input.click(*self.coordinates.screen_point(x, y))
 
     def _move_mouse(self, x, y):
-        """Move mouse to the specified coordinates."""
-        input_controller.moveTo(x, y)
+        """Move mouse to the specified reference coordinates."""
+        self.input.moveTo(*self.coordinates.screen_point(x, y))
 
     def _get_region(self, x, y, width, height):
         """Return region coordinates as-is."""
@@ -80,43 +188,316 @@ class GameController:
         """
         self.logger.info(f"Current round: {current_round}") # For debugging
 
-        remove_rounds = []
-        for round in self.milestone_rounds:
-            if current_round >= round: # Handle cases where we missed a round due to OCR errors
-                self.logger.info(f"Running instructions for round {round}")
-                self._store_previous_app()
-                self._ensure_focus()
-                self.run_instruction_group(self.map_settings['instructions'][str(round)])
-                self._restore_focus()
-                remove_rounds.append(round)
-
-        for round in remove_rounds:
-            self.milestone_rounds.remove(round)
+        with self._action_lock:
+            if self.paused:
+                # Milestones stay pending and are caught up on the first round change after resuming
+                return
+            remove_rounds = []
+            for round in self.milestone_rounds:
+                if current_round >= round: # Handle cases where we missed a round due to OCR errors
+                    self.logger.info(f"Running instructions for round {round}")
+                    self._store_previous_app()
+                    self._ensure_focus()
+                    self.run_instruction_group(self.map_settings['instructions'][str(round)])
+                    self._restore_focus()
+                    remove_rounds.append(round)
+
+            for round in remove_rounds:
+                self.milestone_rounds.remove(round)
+            if self.session_state:
+                executed = self.session_state.get('executed_milestones', []) + remove_rounds
+                self.save_checkpoint(round=current_round, executed_milestones=executed)
+
+            if current_round >= 99:
+                self.logger.info("Second to last or last round! Assuming it takes 30 seconds to finish")
+                heartbeat(expected=30)
+                self.clock.sleep(30)
+                self.run_end_map_instructions()
+
+    def handle_lives_change(self, event, lives, previous):
+        """
+        Responds to confirmed lives drops: runs the strategy's emergency instructions,
+        or leaves the map right away once no lives are left.
+        """
+        if self.map_ended or self.paused:
+            return
+        if event == LivesTracker.ZERO:
+            self.logger.info(f"No lives left at round {self.round_monitor.CUR_ROUND}, ending the run")
+            self.end_lost_map()
+            return
+
+        instructions = self._emergency_instructions(lives)
+        if not instructions:
+            return
+        self.logger.info(f"Lives dropped {previous} -> {lives}, running emergency instructions")
+        with self._action_lock:
+            self._store_previous_app()
+            self._ensure_focus()
+            self.run_instruction_group(instructions)
+            self._restore_focus()
+            self._record_bought(instructions)
+            self._emergency_done += instructions
+            self.save_checkpoint(emergency_done=self._emergency_done)
+
+    def _emergency_instructions(self, lives):
+        """
+        Instructions of the strategy's "emergency" responses due at this lives count. A response
+        with "lives_below" runs once per map when lives first fall below it, one without runs on
+        every drop, at most once per "cooldown" seconds.
+        """
+        instructions = []
+        now = self.clock.monotonic()
+        for index, response in enumerate(self.map_settings.get('emergency', [])):
+            last_run = self._emergencies_run.get(index)
+            if 'lives_below' in response:
+                if lives >= response['lives_below'] or last_run is not None:
+                    continue
+            elif last_run is not None and now - last_run < response.get('cooldown', 0):
+                continue
+            self._emergencies_run[index] = now
+            instructions += response['instructions']
+        return instructions
+
+    def end_lost_map(self):
+        """Leave a lost map for the home screen and record the defeat."""
+        with self._action_lock:
+            if self.map_ended:
+                return
+            self._store_previous_app()
+            self._ensure_focus()
+            self.mark_phase('end')
+            self._wait('screen_transition')  # The defeat screen slides in
+            if self.navigator:
+                self.navigator.navigate('HOME')
+            else:
+                self.click_at_position('DEFEAT_GAME_HOME_BUTTON')
+                self._wait('home_transition')
+            self.map_ended = True
+            self.save_checkpoint(in_progress=False)
+            self.finish_run(DEFEAT)
+            self._restore_focus()
+
+    def run_affordable_steps(self):
+        """
+        In cash scheduling mode, run the queued strategy steps the current cash covers.
+        Called periodically from the main loop.
+        """
+        if self.cash_scheduler is None or self.map_ended or self.paused:
+            return
+        cash = self.hud_reader.read_cash()
+        if cash is None:
+            return
+
+        steps = []
+        remaining = cash
+        next_step = self.cash_scheduler.peek()
+        while next_step and next_step[1] <= remaining:
+            remaining -= next_step[1]
+            steps.append(self.cash_scheduler.pop())
+            next_step = self.cash_scheduler.peek()
+        if not steps:
+            return
+
+        self.logger.info(f"Cash ${cash} covers {steps} (${cash - remaining})")
+        with self._action_lock:
+            self._store_previous_app()
+            self._ensure_focus()
+            self.run_instruction_group(steps)
+            self._restore_focus()
+        if self.session_state:
+            self.save_checkpoint(cash_steps_done=self.session_state.get('cash_steps_done', 0) + len(steps))
 
-        if current_round >= 99:
-            self.logger.info("Second to last or last round! Assuming it takes 30 seconds to finish")
-            time.sleep(30)
-            self.run_end_map_instructions()
-        
     def run_start_map_instructions(self):
         """
         Run the instructions to start the map.
         """
         self.round_monitor.CUR_ROUND = 5 # Reset the round counter for a new map
         self.round_monitor.ROUND_COUNTER_FAILS = 0 # Reset fail counter for new map
-        # Reload milestones for the new map cycle (they get removed as they're executed)
-        self.map_settings = Settings().load_map_settings(self.map, 'impoppable')
-        self.milestone_rounds = list(self.map_settings['instructions']['milestones'])
+        self.round_monitor.lives_tracker.reset()
+        self.mark_phase('setup')
+        self._load_map_plan()
+        self._start_steps_done = 0
+        self.save_checkpoint(map=self.map, route=self.route, round=5, in_progress=True, start_done=False,
+                             start_steps_done=0, executed_milestones=[], cash_steps_done=0, emergency_done=[])
+        self._wait('map_start')
+        self._run_start_group()
+
+    def _run_start_group(self):
+        """Run the start instructions that have not run yet, then start the first round on fast forward."""
         instructions = self.map_settings['instructions']['start']
-        time.sleep(3)
+
+        def step_done(instruction):
+            # Checkpointed per instruction: a restart mid-group must not place or upgrade twice
+            self._record_bought([instruction])
+            self._start_steps_done += 1
+            self.save_checkpoint(start_steps_done=self._start_steps_done)
 
         self._store_previous_app()
         self._ensure_focus()
-        self.run_instruction_group(instructions)
-        input_controller.press('space')
-        time.sleep(.5)
-        input_controller.press('space')
+        self.run_instruction_group(instructions[self._start_steps_done:], step_done)
+        self.input.press('space')
+        self._wait('fast_forward')
+        self.input.press('space')
         self._restore_focus()
+        self.save_checkpoint(start_done=True)
+        self.mark_phase('rounds')
+
+    def _load_map_plan(self):
+        """(Re)load the map strategy along with its pending milestones or cash queue."""
+        # Reload milestones for the new map cycle (they get removed as they're executed)
+        self.map_settings = Settings().load_map_settings(self.map, 'impoppable')
+        self.milestone_rounds = list(self.map_settings['instructions']['milestones'])
+        self._emergencies_run = {}
+        self._emergency_done = []
+        self.tower_tiers = {}
+        if self.scheduling == 'cash':
+            # Milestone instructions are released by cash instead of by round
+            self.cash_scheduler = CashScheduler(self.map_settings, self.cost_table)
+            self.milestone_rounds = []
+        else:
+            self.cash_scheduler = None
+
+    def _restore_progress(self, executed_milestones, cash_steps_done, emergency_done=()):
+        """Drop the milestones and cash steps of the freshly loaded plan that already ran."""
+        self.milestone_rounds = [r for r in self.milestone_rounds if r not in executed_milestones]
+        self._emergency_done = list(emergency_done)
+        instructions = self.map_settings['instructions']
+        ran = instructions['start'][:self._start_steps_done] + self._emergency_done
+        if self.cash_scheduler:
+            # Upgrades bought outside the queue still decide the price of the next tiers
+            self._record_bought(ran)
+            for _ in range(min(cash_steps_done, len(self.cash_scheduler.steps))):
+                ran.append(self.cash_scheduler.pop())
+        else:
+            ran += [instruction for round in executed_milestones for instruction in instructions[str(round)]]
+        for instruction in ran:
+            record_tiers(self.tower_tiers, instruction)
+
+    def _record_bought(self, instructions):
+        """Count the upgrades of instructions run outside the cash queue towards its tier prices."""
+        if self.cash_scheduler:
+            for instruction in instructions:
+                self.cash_scheduler.record(instruction)
+
+    def reload_map_plan(self):
+        """Reload the current map's strategy mid-run, keeping what already ran."""
+        with self._action_lock:
+            executed = [r for r in self.map_settings['instructions']['milestones'] if r not in self.milestone_rounds]
+            cash_steps_done = 0
+            if self.cash_scheduler:
+                cash_steps_done = len(CashScheduler(self.map_settings, self.cost_table).steps) - \
+                    len(self.cash_scheduler.steps)
+            emergency_done = self._emergency_done
+            self._load_map_plan()
+            self._restore_progress(executed, cash_steps_done, emergency_done)
+            self.logger.info(f"Reloaded the {self.map} strategy, pending milestones {self.milestone_rounds}")
+
+    def set_delay(self, name, seconds):
+        """Change a named delay of the timing profile for the rest of the session."""
+        if name not in self.timing.delays:
+            raise ValueError(f"Unknown delay {name!r}, expected one of {sorted(self.timing.delays)}")
+        if not 0 <= seconds <= 30:
+            raise ValueError("Delays must be between 0 and 30 seconds")
+        self.timing.delays[name] = seconds
+        if name == 'focus':
+            self.focus_delay = seconds
+
+    def save_checkpoint(self, **changes):
+        """Persist progress to the session state, if one is attached."""
+        if self.session_state:
+            self.session_state.update(**changes)
+
+    def start_route(self, route, points_per_win=None):
+        """
+        Start a new game through a map scheduler route and begin recording the run.
+
+        Returns:
+            bool: False if the game could not be started
+        """
+        self.route = route
+        if points_per_win is not None:
+            self.points_per_run = points_per_win
+        self.begin_run(route)
+        started = getattr(self, ROUTES[route])()
+        if not started:
+            self.finish_run(ABORTED)
+        return started
+
+    def begin_run(self, route, resumed=False):
+        """Start timing a run, in the 'menu' phase until the start instructions run."""
+        self._run = {'route': route, 'started_at': time.time(), 'resumed': resumed, 'phases': {},
+                     'phase': 'rounds' if resumed else 'menu', 'phase_started': self.clock.monotonic()}
+
+    def mark_phase(self, phase):
+        """Close the current phase of the run and start the next one (None to stop timing)."""
+        if self._run is None:
+            return
+        now = self.clock.monotonic()
+        current = self._run['phase']
+        if current:
+            elapsed = now - self._run['phase_started']
+            self._run['phases'][current] = round(self._run['phases'].get(current, 0.0) + elapsed, 2)
+        self._run['phase'], self._run['phase_started'] = phase, now
+
+    def finish_run(self, outcome, points=0):
+        """Record the current run in the run history, if one is attached."""
+        if self._run is None:
+            return
+        self.mark_phase(None)
+        run, self._run = self._run, None
+        self.logger.info(f"Run on {self.map} ({run['route']}) ended: {outcome}, {points} points, {run['phases']}")
+        if self.run_history:
+            self.run_history.record(run['route'], self.map, 'impoppable', self.map_settings.get('hero'),
+                                    run['started_at'], time.time(), outcome, points,
+                                    self.round_monitor.CUR_ROUND, run['resumed'], run['phases'])
+
+    def resume_map(self):
+        """
+        Continue the game recorded in the session state instead of starting a new one.
+        The round counter must be readable, which confirms a game is actually in progress.
+
+        Returns:
+            bool: True if the game was resumed
+        """
+        if not self.session_state or not self.session_state.get('in_progress'):
+            return False
+        state = self.session_state.data
+        positions = self.global_settings['button_positions']
+        text, _ = self.img_reader.extract_text_with_confidence(
+            positions['ROUND_COUNTER'][0], positions['ROUND_COUNTER'][1],
+            positions['ROUND_DIMENSIONS'][0], positions['ROUND_DIMENSIONS'][1], region_name='ROUND_COUNTER')
+        ocr_round = parse_round(text)
+        if ocr_round is None:
+            self.logger.info(f"Session state has {state['map']} in progress but no round counter is visible, not resuming")
+            self.save_checkpoint(in_progress=False)
+            return False
+
+        self.map = state['map']
+        self.route = state.get('route') or self.route
+        self.begin_run(self.route, resumed=True)
+        self._load_map_plan()
+        start = self.map_settings['instructions']['start']
+        self._start_steps_done = len(start) if state['start_done'] else min(state['start_steps_done'], len(start))
+        executed = state['executed_milestones']
+        self._restore_progress(executed, state['cash_steps_done'], state.get('emergency_done', []))
+        if not state['start_done']:
+            self.logger.info(f"Resuming {self.map} before its start instructions finished, "
+                             f"running the {len(start) - self._start_steps_done} that had not run")
+            self.round_monitor.CUR_ROUND = 5
+            self.round_monitor.ROUND_COUNTER_FAILS = 0
+            self.round_monitor.lives_tracker.reset()
+            self.mark_phase('setup')
+            self._run_start_group()
+            return True
+
+        self.logger.info(f"Resuming {self.map} at round {ocr_round} "
+                         f"({len(executed)} milestones already done, saved round {state['round']})")
+        self.round_monitor.CUR_ROUND = ocr_round
+        self.round_monitor.ROUND_COUNTER_FAILS = 0
+        self.round_monitor.lives_tracker.reset()
+        # Catch up on milestones that came due while the bot was down
+        self.handle_round_change(ocr_round)
+        return True
     
     def run_end_map_instructions(self):
         """
@@ -126,52 +507,93 @@ class GameController:
         self._ensure_focus()
 
         self.current_points += self.points_per_run
-        self.click_at_position('END_GAME_NEXT_BUTTON')
-        time.sleep(1)
-        self.click_at_position('END_GAME_NEXT_BUTTON')
-        time.sleep(1)
-        self.click_at_position('END_GAME_HOME_BUTTON')
-        time.sleep(2)
+        self.mark_phase('end')
+        if self.navigator:
+            self.navigator.navigate('HOME')
+        else:
+            self.click_at_position('END_GAME_NEXT_BUTTON')
+            self._wait('screen_transition')
+            self.click_at_position('END_GAME_NEXT_BUTTON')
+            self._wait('screen_transition')
+            self.click_at_position('END_GAME_HOME_BUTTON')
+            self._wait('home_transition')
         if self.current_points >= self.points_to_collect:
-            self.click_at_position('COLLECT_INSTA')
-            time.sleep(1)
-            self.click_at_position('3INSTA1')
-            time.sleep(1)
-            self.click_at_position('3INSTA1')
-            time.sleep(1)
-            self.click_at_position('3INSTA2')
-            time.sleep(1)
-            self.click_at_position('3INSTA2')
-            time.sleep(1)
-            self.click_at_position('3INSTA3')
-            time.sleep(1)
-            self.click_at_position('3INSTA3')
-            time.sleep(1)
-            self.click_at_position('2INSTA1')
-            time.sleep(1)
-            self.click_at_position('2INSTA1')
-            time.sleep(1)
-            self.click_at_position('2INSTA2')
-            time.sleep(1)
-            self.click_at_position('2INSTA2')
-            time.sleep(1)
-            self.click_at_position('INSTASELECTOK')
-            time.sleep(1)
-            self.click_at_position('BACK_BUTTON')
-            time.sleep(2)
+            if self.navigator:
+                self.navigator.navigate('INSTA_COLLECT')
+            else:
+                self.click_at_position('COLLECT_INSTA')
+                self._wait('screen_transition')
+            for position in INSTA_COLLECT_CLICKS:
+                self.click_at_position(position)
+                self._wait('screen_transition')
+            if self.navigator:
+                self.navigator.navigate('HOME')
+            else:
+                self.click_at_position('BACK_BUTTON')
+                self._wait('home_transition')
             self.current_points -= self.points_to_collect
         self.map_ended = True
+        self.save_checkpoint(in_progress=False, points=self.current_points)
+        self.finish_run(VICTORY, self.points_per_run)
 
         self._restore_focus()
 
-    def run_instruction_group(self, instructions):
+    def recover_in_game(self):
+        """
+        Called while the round counter is unreadable. Identifies the screen: popups
+        over the game are dismissed, a finished map is ended and any other screen
+        means the map is over and the game is taken back home.
+
+        Returns:
+            bool: True if the map has ended
+        """
+        with self._action_lock:
+            if self.map_ended:
+                return True
+            screen = self.navigator.identify()
+            if screen == 'IN_GAME':
+                return False
+            self.logger.info(f"Round counter unreadable, game shows {screen or 'an unknown screen'}")
+            if screen in ('VICTORY', 'GAME_OVER'):
+                self.run_end_map_instructions()
+                return True
+
+            self._store_previous_app()
+            self._ensure_focus()
+            if screen is None:
+                screen = self.navigator.recover()
+            if screen is None:
+                self._restore_focus()
+                return False
+            if self.navigator.graph.is_in_game(screen):
+                self.navigator.navigate('IN_GAME')
+                self._restore_focus()
+                return False
+            self.navigator.navigate('HOME')
+            self._restore_focus()
+            self.logger.info(f"Map over ({screen}), back home")
+            self.map_ended = True
+            self.save_checkpoint(in_progress=False)
+            self.finish_run(DEFEAT if screen == 'DEFEAT' else ABORTED)
+            return True
+
+    def run_instruction_group(self, instructions, step_done=None):
         """Run group of instructions.
 
         Args:
             instructions (list): List of instructions to run.
+            step_done (callable): Optional callback given each instruction once it ran.
         """
-        self.logger.info(f"Running instructions: {instructions}")
+        # One line per group; the instructions themselves are logged at debug level as they run
+        kinds = Counter(instruction.split(' ')[0] for instruction in instructions)
+        self.logger.info(f"Running {len(instructions)} instructions "
+                         f"({', '.join(f'{count} {kind}' for kind, count in kinds.items())})")
+        with profiler.section('input'), cpu_governor.input_burst():
+            self._run_instructions(instructions, step_done)
+
+    def _run_instructions(self, instructions, step_done=None):
         for full_instruction in instructions:
+            self.logger.debug(f"Instruction: {full_instruction}")
             instruction = full_instruction.split(' ')
             instruction_type = instruction[0]
 
@@ -181,8 +603,12 @@ class GameController:
                 self.upgrade_tower(instruction[1], instruction[2:])
             elif instruction_type == 'change':
                 self.change_tower_targeting(instruction[1], instruction[2])
+            elif instruction_type == 'ability':
+                self.activate_ability(instruction[1])
 
-            time.sleep(.5) # Wait for the game to catch up
+            self._wait('instruction_gap') # Wait for the game to catch up
+            if step_done:
+                step_done(full_instruction)
     
     def place_tower(self, tower_id):
         """Place a tower on the map.
@@ -190,24 +616,47 @@ class GameController:
         Args:
             tower_name (str): ID of the tower to place.
         """
-        self.logger.info(f"Placing {tower_id}")
+        self.logger.debug(f"Placing {tower_id}")
 
         pos = self.map_settings['towers'][tower_id]['coords']
         tower_type = self.map_settings['towers'][tower_id]['type']
         shortcut = self.global_settings['tower_shortcuts'][tower_type]
-
+        if self.verifier is None:
+            self._place(pos, tower_type, shortcut)
+            return
+
+        before = self.verifier.patch(*pos) if self.verification_park else None
+        cash = self.verifier.cash()
+        cost = self.cost_table.place_cost(tower_type, self.map_settings.get('hero'))
+
+        def placed():
+            sprite = None
+            if self.verification_park:
+                # A placement ghost still held follows the cursor away from the spot
+                self._move_mouse(*self.verification_park)
+                sprite = self.verifier.changed(before, *pos)
+            spent = self.verifier.spent(cash, cost)
+            if sprite or spent:
+                return True
+            # A successful cash read decides on its own, the patch is only checked with a park point
+            return spent if spent is not None else sprite
+
+        self.verifier.run('place', lambda attempt: self._place(pos, tower_type, shortcut), placed,
+                          f"Placing {tower_id}")
+
+    def _place(self, pos, tower_type, shortcut):
         # Move mouse to target position first to ensure game receives keyboard input
         self._move_mouse(pos[0], pos[1])
 
-        input_controller.press(shortcut)
+        self.input.press(shortcut)
         if tower_type == 'HERO':
-            time.sleep(1)  # Hero menu takes longer to load
-            input_controller.press(shortcut)
-            time.sleep(1)
-            input_controller.press(shortcut)
-        time.sleep(1.0)
-        input_controller.press(shortcut)
-        time.sleep(1.0)
+            self._wait('hero_menu')  # Hero menu takes longer to load
+            self.input.press(shortcut)
+            self._wait('hero_menu')
+            self.input.press(shortcut)
+        self._wait('placement_ghost')
+        self.input.press(shortcut)
+        self._wait('placement_ghost')
         self._click(pos[0], pos[1])
 
     def upgrade_tower(self, tower_id, upgrade_paths):
@@ -218,21 +667,35 @@ class GameController:
             upgrade_id (list): List of the upgrades to apply.
                               1 is top path, 2 is middle, 3 is bottom.
         """
-        self.logger.info(f"Upgrading {tower_id} on path {upgrade_paths}")
+        self.logger.debug(f"Upgrading {tower_id} on path {upgrade_paths}")
         pos = self.map_settings['towers'][tower_id]['coords']
-        self._click(pos[0], pos[1])
-        time.sleep(1.0)  # Wait for tower selection UI to appear (longer for VM)
+        tower_type = self.map_settings['towers'][tower_id]['type']
+        tiers = self.tower_tiers.setdefault(tower_id, [0, 0, 0])
+        self._select_tower(tower_id, pos, 'upgrade_panel')  # Wait for tower selection UI to appear
 
         for upgrade_path in upgrade_paths:
-            upgrade_path = int(upgrade_path)
-            upgrade_path = 'UPGRADE_TOP' if upgrade_path == 1 else 'UPGRADE_MIDDLE' if upgrade_path == 2 else 'UPGRADE_BOTTOM'
+            path = path_number(upgrade_path)
+            upgrade_path = 'UPGRADE_TOP' if path == 1 else 'UPGRADE_MIDDLE' if path == 2 else 'UPGRADE_BOTTOM'
 
             upgrade_shortcut = self.global_settings['tower_shortcuts'][upgrade_path]
-            time.sleep(0.5)
-            input_controller.press(upgrade_shortcut)
-            time.sleep(0.5)
-        time.sleep(0.3)
-        input_controller.press('esc')
+            if self.verifier is None:
+                self._wait('upgrade_press')
+                self.input.press(upgrade_shortcut)
+                bought = True
+            else:
+                # Two reads around the wait give the income the check has to allow for
+                earlier = self.verifier.cash()
+                self._wait('upgrade_press')
+                cash = self.verifier.cash()
+                cost = self.cost_table.upgrade_cost(tower_type, path, tiers[path - 1])
+                bought = self.verifier.run('upgrade', lambda attempt: self.input.press(upgrade_shortcut),
+                                           lambda: self.verifier.spent(cash, cost, earlier),
+                                           f"Upgrading {tower_id} ({upgrade_path})") is not False
+            if bought:
+                tiers[path - 1] += 1
+            self._wait('upgrade_press')
+        self._wait('upgrade_close')
+        self.input.press('esc')
 
     def change_tower_targeting(self, tower_id, target_change_times):
         """Change the targeting of a tower on the map.
@@ -241,79 +704,91 @@ class GameController:
             tower_id (str): ID of the tower to upgrade.
             target_change_times (str): Str rep of the number of times to change targeting for a tower.
         """
-        self.logger.info(f"Changing {tower_id} targeting {target_change_times} times")
+        self.logger.debug(f"Changing {tower_id} targeting {target_change_times} times")
         pos = self.map_settings['towers'][tower_id]['coords']
-        self._click(pos[0], pos[1])
-        time.sleep(0.5)  # Wait for tower selection UI to appear
+        self._select_tower(tower_id, pos, 'targeting_panel')  # Wait for tower selection UI to appear
 
         for i in range(int(target_change_times)):
-            input_controller.press('tab')
-            time.sleep(.1)
-        input_controller.press('esc')
+            self.input.press('tab')
+            self._wait('targeting_press')
+        self.input.press('esc')
+
+    def _select_tower(self, tower_id, pos, delay):
+        """Click a tower and wait the named delay for its panel, clicking again if it did not open."""
+        if self.verifier is None:
+            self._click(pos[0], pos[1])
+            self._wait(delay)
+            return
+
+        before = self.verifier.patch(*pos)
+
+        def select(attempt):
+            self._click(pos[0], pos[1])
+            self._wait(delay)
+
+        self.verifier.run('select', select, lambda: self.verifier.changed(before, *pos), f"Selecting {tower_id}")
+
+    def activate_ability(self, ability):
+        """Activate an ability from the ability bar.
+
+        Args:
+            ability (str): Position on the ability bar, 1 is the leftmost.
+        """
+        self.logger.debug(f"Activating ability {ability}")
+        self.input.press(self.global_settings['tower_shortcuts'][f'ABILITY_{ability}'])
 
     def start_dark_dungeons_game(self):
         """
         Starts the dark dungeons game.
+
+        Returns:
+            bool: False if the navigator could not reach the game
         """
+        self.map = 'DARKDUNGEONS'
         self._store_previous_app()
         self._ensure_focus()
+        if self.navigator:
+            started = self.navigator.navigate('IN_GAME')
+            self._restore_focus()
+            return started
         self.click_at_position('HOME_PLAY_BUTTON')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('MAP_GO_LEFT_BUTTON')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('MAP_GO_LEFT_BUTTON')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('MAP_GO_LEFT_BUTTON')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('MAP_SELECT_TOPRIGHT')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('HARD_MODE_SELECT')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('IMPOPPABLE_MODE_SELECT')
-        time.sleep(.3)
+        self._wait('map_select')
         self.click_at_position('MAP_OVERWRITE_SAVE')
-        time.sleep(4)
+        self._wait('map_load')
         self.click_at_position('IMPOPPABLE_GAMESTART_OK')
         self._restore_focus()
+        return True
 
     def start_collection_game(self):
         """
         Checks the collection game mode to determine current map
         Also selects hero and enters into the map.
+
+        Returns:
+            bool: True once the map is started
         """
         self._store_previous_app()
         self._ensure_focus()
 
         self.click_at_position('COLLECTION_EVENT_SELECT')
         self.click_at_position('COLLECTION_EVENT_START')
-        time.sleep(1)
+        self._wait('screen_transition')
 
         # Determine map selection, and update class map variables
         # Note: In background mode, screenshot capture works without focus
-        map_region = self._get_region(
-            self.global_settings['button_positions']['COLLECTION_EVENT_EXPERT_MAP_TOPLEFT'][0],
-            self.global_settings['button_positions']['COLLECTION_EVENT_EXPERT_MAP_TOPLEFT'][1],
-            self.global_settings['button_positions']['COLLECTION_EVENT_EXPER_MAP_DIMENSIONS'][0],
-            self.global_settings['button_positions']['COLLECTION_EVENT_EXPER_MAP_DIMENSIONS'][1]
-        )
-        ocr_map_name = self.img_reader.extract_text_from_region(
-            map_region[0], map_region[1], map_region[2], map_region[3],
-            'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-        )
-        self.logger.info(f"OCR map name: {ocr_map_name}")
-
-        # Use fuzzy matching to find the best map match
-        cutoff = self.global_settings.get('map_match_cutoff', 0.75)
-        matched_map, score = Settings().find_best_map_match(ocr_map_name, cutoff)
-
-        if matched_map:
-            if matched_map != ocr_map_name:
-                self.logger.info(f"Fuzzy matched '{ocr_map_name}' -> '{matched_map}' (score: {score:.2f})")
-            self.map = matched_map
-        else:
-            self.logger.warning(f"No map match found for '{ocr_map_name}' with cutoff {cutoff}. Using raw OCR text.")
-            self.map = ocr_map_name
-
+        self.map = self.identify_collection_map()
         self.map_settings = Settings().load_map_settings(self.map, 'impoppable')
         self.milestone_rounds = self.map_settings['instructions']['milestones']
 
@@ -330,13 +805,70 @@ class GameController:
         self.click_at_position('HARD_MODE_SELECT')
         self.click_at_position('IMPOPPABLE_MODE_SELECT')
         self.click_at_position('MAP_OVERWRITE_SAVE') # In case there's a save file to overwrite
-        time.sleep(4) # Wait for map to load
+        self._wait('map_load') # Wait for map to load
         self.click_at_position('IMPOPPABLE_GAMESTART_OK')
 
         self._restore_focus()
+        return True
+
+    def identify_collection_map(self):
+        """
+        Determine the collection event map from its preview thumbnail,
+        falling back to OCR of the map name when no reference hash matches.
+
+        Returns:
+            str: The map folder name
+        """
+        positions = self.global_settings['button_positions']
+        thumb_region = self._get_region(
+            positions['COLLECTION_EVENT_EXPERT_MAP_THUMB_TOPLEFT'][0],
+            positions['COLLECTION_EVENT_EXPERT_MAP_THUMB_TOPLEFT'][1],
+            positions['COLLECTION_EVENT_EXPERT_MAP_THUMB_DIMENSIONS'][0],
+            positions['COLLECTION_EVENT_EXPERT_MAP_THUMB_DIMENSIONS'][1]
+        )
+        thumbnail = self.img_reader.take_screenshot(*thumb_region)
+        if thumbnail is None:
+            # Window gone or capture failed
+            self.logger.warning("Could not capture the map thumbnail, identifying the map by name")
+            hashed_map, distance = None, None
+        else:
+            hashed_map, distance = self.map_identifier.identify(thumbnail)
+        if hashed_map:
+            self.logger.info(f"Thumbnail matched '{hashed_map}' (distance: {distance})")
+            return hashed_map
+
+        map_region = self._get_region(
+            positions['COLLECTION_EVENT_EXPERT_MAP_TOPLEFT'][0],
+            positions['COLLECTION_EVENT_EXPERT_MAP_TOPLEFT'][1],
+            positions['COLLECTION_EVENT_EXPER_MAP_DIMENSIONS'][0],
+            positions['COLLECTION_EVENT_EXPER_MAP_DIMENSIONS'][1]
+        )
+        ocr_map_name = self.img_reader.extract_text_from_region(
+            map_region[0], map_region[1], map_region[2], map_region[3],
+            'ABCDEFGHIJKLMNOPQRSTUVWXYZ', region_name='MAP_NAME'
+        )
+        self.logger.info(f"No thumbnail match (distance: {distance}), OCR map name: {ocr_map_name}")
+
+        # Use fuzzy matching to find the best map match
+        cutoff = self.global_settings.get('map_match_cutoff', 0.75)
+        matched_map, score = Settings().find_best_map_match(ocr_map_name, cutoff)
+
+        if not matched_map:
+            self.logger.warning(f"No map match found for '{ocr_map_name}' with cutoff {cutoff}. Using raw OCR text.")
+            return ocr_map_name
+
+        if matched_map != ocr_map_name:
+            self.logger.info(f"Fuzzy matched '{ocr_map_name}' -> '{matched_map}' (score: {score:.2f})")
+        # Learn the thumbnail from confident OCR matches so next time hashing is enough
+        if thumbnail is not None and score >= self.global_settings.get('map_thumbnail_learn_score', 0.9) \
+                and not self.map_identifier.has_reference(matched_map):
+            self.map_identifier.add_reference(matched_map, thumbnail)
+            self.logger.info(f"Saved thumbnail reference for '{matched_map}'")
+        return matched_map
 
     def click_at_position(self, selection):
         pos = self.global_settings['button_positions'][selection]
         self.logger.info(f"Clicking {selection} at ({pos[0]}, {pos[1]})")
-        input_controller.click(pos[0], pos[1])
-        time.sleep(.5)
\ No newline at end of file
+        with profiler.section('input'), cpu_governor.input_burst():
+            self._click(pos[0], pos[1])
+            self._wait('menu_click')
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""
+Fast numeric readers for the in-game HUD.
+
+HUD numbers change every tick, so memoizing OCR results helps little. Instead
+each digit glyph is segmented from the preprocessed crop and matched against
+bitmap templates. Templates are learned from Tesseract readings, so after the
+first few ticks the HUD is read with a few NumPy comparisons and Tesseract is
+only used for glyphs that have not been seen yet.
+"""
+from app import cpu_governor
+from app.lazy import LazyModule
+
+np = LazyModule('numpy')
+Image = LazyModule('PIL.Image')
+
+
+class DigitReader:
+    """Template-matching digit recognizer that learns its templates."""
+
+    def __init__(self, glyph_size=(10, 14), max_distance=0.12, templates_per_digit=5):
+        """
+        Args:
+            glyph_size: (width, height) every glyph is normalized to
+            max_distance: Largest fraction of differing pixels accepted as a match
+            templates_per_digit: Templates kept per digit
+        """
+        self.glyph_size = glyph_size
+        self.max_distance = max_distance
+        self.templates_per_digit = templates_per_digit
+        self.templates = {}  # digit -> list of boolean arrays
+
+    def segment(self, image):
+        """
+        Split a preprocessed (dark text on white) image into normalized glyphs,
+        left to right. Ink outside the band shared by most glyphs (comma
+        descenders) is ignored and glyphs much shorter than the band (commas,
+        dots) are dropped.
+        """
+        ink = np.asarray(image.convert('L')) < 128
+        boxes = self._boxes(ink)
+        if not boxes:
+            return []
+        band_top = int(np.median([top for _, _, top, _ in boxes]))
+        band_bottom = int(np.median([bottom for _, _, _, bottom in boxes]))
+        band = ink[band_top:band_bottom]
+
+        glyphs = []
+        for left, right, top, bottom in self._boxes(band):
+            if bottom - top < 0.6 * (band_bottom - band_top):
+                continue
+            glyph = Image.fromarray(band[top:bottom, left:right].astype(np.uint8) * 255)
+            glyph = glyph.resize(self.glyph_size, Image.Resampling.BILINEAR)
+            glyphs.append(np.asarray(glyph) > 127)
+        return glyphs
+
+    @staticmethod
+    def _boxes(ink):
+        """Bounding boxes (left, right, top, bottom) of runs of inked columns."""
+        columns = ink.any(axis=0)
+        spans, start = [], None
+        for x, has_ink in enumerate(columns):
+            if has_ink and start is None:
+                start = x
+            elif not has_ink and start is not None:
+                spans.append((start, x))
+                start = None
+        if start is not None:
+            spans.append((start, len(columns)))
+
+        boxes = []
+        for left, right in spans:
+            rows = np.flatnonzero(ink[:, left:right].any(axis=1))
+            boxes.append((left, right, rows[0], rows[-1] + 1))
+        return boxes
+
+    def read(self, image):
+        """
+        Returns:
+            str: The digits in image, or None if any glyph has no close template
+        """
+        glyphs = self.segment(image)
+        if not glyphs or not self.templates:
+            return None
+        digits = []
+        for glyph in glyphs:
+            best_digit, best_distance = None, 1.0
+            for digit, templates in self.templates.items():
+                for template in templates:
+                    distance = np.count_nonzero(glyph ^ template) / glyph.size
+                    if distance < best_distance:
+                        best_digit, best_distance = digit, distance
+            if best_distance > self.max_distance:
+                return None
+            digits.append(best_digit)
+        return ''.join(digits)
+
+    def learn(self, image, text):
+        """
+        Store the glyphs of image as templates for the digits in text.
+
+        Returns:
+            bool: False if the glyphs could not be lined up with the digits
+        """
+        digits = [c for c in text if c.isdigit()]
+        glyphs = self.segment(image)
+        if not digits or len(glyphs) != len(digits):
+            return False
+        for digit, glyph in zip(digits, glyphs):
+            templates = self.templates.setdefault(digit, [])
+            if all(np.count_nonzero(glyph ^ t) / glyph.size > self.max_distance / 2 for t in templates):
+                templates.append(glyph)
+                del templates[:-self.templates_per_digit]
+        return True
+
+
+class HudReader:
+    """Read numeric HUD values (cash, lives) from their button_positions regions."""
+
+    def __init__(self, img_reader, global_settings):
+        """
+        Args:
+            img_reader: ImageToTextReader used for capture, preprocessing and OCR fallback
+            global_settings: Parsed settings.json with <NAME>_COUNTER/<NAME>_DIMENSIONS positions
+        """
+        self.img_reader = img_reader
+        self.positions = global_settings['button_positions']
+        self._digit_readers = {}
+        self.template_reads = 0
+        self.ocr_reads = 0
+
+    def reset(self):
+        """Forget learned templates, e.g. after the game window was resized."""
+        self._digit_readers = {}
+
+    def read_number(self, name):
+        """
+        Read the number shown in the <name>_COUNTER region.
+
+        Returns:
+            int: The value, or None if it could not be read
+        """
+        x, y = self.positions[f'{name}_COUNTER']
+        width, height = self.positions[f'{name}_DIMENSIONS']
+        return self.img_reader.read_unless_untouched(('HUD', name), x, y, width, height,
+                                                     lambda: self._read_number(name, x, y, width, height))
+
+    def _read_number(self, name, x, y, width, height):
+        profile = self.img_reader.profile_for(f'{name}_COUNTER')
+        try:
+            image = self.img_reader.preprocess_image(self.img_reader.take_screenshot(x, y, width, height), profile)
+        except Exception:
+            return None
+
+        digit_reader = self._digit_readers.setdefault(name, DigitReader())
+        with cpu_governor.stage('hud_match'):
+            text = digit_reader.read(image)
+        if text is not None:
+            self.template_reads += 1
+        else:
+            try:
+                text = self.img_reader.recognize(image, '0123456789', profile)
+            except Exception:
+                return None
+            self.ocr_reads += 1
+            if text and text.isdigit():
+                digit_reader.learn(image, text)
+        return int(text) if text and text.isdigit() else None
+
+    def read_cash(self):
+        return self.read_number('CASH')
+
+    def read_lives(self):
+        return self.read_number('LIVES')
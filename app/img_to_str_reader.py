@@ -1,16 +1,128 @@
-from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageDraw
-import datetime, os, pyautogui, pytesseract
+import importlib.util, logging, os, threading
+from app import cpu_governor
+from app.config import Settings
+from app.lazy import LazyModule
+from app.logger import RateLimiter
+
+Image = LazyModule('PIL.Image')
+ImageDraw = LazyModule('PIL.ImageDraw')
+ImageEnhance = LazyModule('PIL.ImageEnhance')
+ImageFilter = LazyModule('PIL.ImageFilter')
+ImageOps = LazyModule('PIL.ImageOps')
+pyautogui = LazyModule('pyautogui')
+pytesseract = LazyModule('pytesseract')
+tesserocr = LazyModule('tesserocr')
+
+_ocr_errors = RateLimiter(logging.getLogger('btd6.ocr'))
+
+# Preprocessing and recognizer settings of a region without a tuned profile
+# (see app/ocr_tuner.py); median 0 skips the median filter, oem None keeps Tesseract's default
+DEFAULT_OCR_PROFILE = {
+    'engine': 'tesseract',
+    'scale': 1,
+    'contrast': 2.0,
+    'brightness': 1.3,
+    'threshold': 10,
+    'median': 3,
+    'psm': 7,
+    'oem': None,
+}
+
+# Recognizer backend -> module it needs
+OCR_ENGINES = {'tesseract': 'pytesseract', 'tesserocr': 'tesserocr'}
+
+_tesserocr_local = threading.local()
+
+
+def available_engines():
+    """The OCR_ENGINES whose module is installed."""
+    return [engine for engine, module in OCR_ENGINES.items() if importlib.util.find_spec(module)]
+
+
+def _tesserocr_read(image, charwhitelist, profile):
+    """Text and word confidences from the in-process Tesseract API, one instance per thread and mode."""
+    apis = getattr(_tesserocr_local, 'apis', None)
+    if apis is None:
+        apis = _tesserocr_local.apis = {}
+    key = (profile['psm'], profile['oem'])
+    api = apis.get(key)
+    if api is None:
+        oem = tesserocr.OEM.DEFAULT if profile['oem'] is None else profile['oem']
+        api = apis[key] = tesserocr.PyTessBaseAPI(psm=profile['psm'], oem=oem)
+    api.SetVariable('tessedit_char_whitelist', charwhitelist)
+    api.SetImage(image)
+    return api.GetUTF8Text(), api.AllWordConfidences()
+
 
 class ImageToTextReader:
-    def __init__(self, window_capture=None):
+    def __init__(self, window_capture=None, ocr_cache=None, frame_dumper=None, coordinates=None, ocr_profiles=None):
         """
         Initialize ImageToTextReader.
 
         Args:
             window_capture: Optional WindowCapture instance for background capture.
                            If None, falls back to pyautogui screen capture.
+            ocr_cache: Optional OcrCache to memoize results by preprocessed crop.
+            frame_dumper: Optional FrameDumper to hand raw/preprocessed crops to for debugging.
+            coordinates: Optional CoordinateMapper from reference to captured coordinates
+                         (see app/anchors.py). Regions are used as-is without one.
+            ocr_profiles: Optional {region name: profile} overriding DEFAULT_OCR_PROFILE.
+                          Defaults to the profiles tuned for this machine.
         """
         self.window_capture = window_capture
+        self.ocr_cache = ocr_cache
+        self.frame_dumper = frame_dumper
+        self.coordinates = coordinates
+        if ocr_profiles is None:
+            ocr_profiles = Settings().load_machine_settings().get('ocr_profiles', {})
+        self.ocr_profiles = ocr_profiles
+        # (what was read, captured region) -> (damage token, result), for regions nothing repainted since
+        self._region_results = {}
+        self.untouched_reads = 0
+
+    def profile_for(self, region_name):
+        """The OCR profile of a named region, DEFAULT_OCR_PROFILE where it was not tuned."""
+        profile = dict(DEFAULT_OCR_PROFILE)
+        profile.update({key: value for key, value in self.ocr_profiles.get(region_name, {}).items()
+                        if key in DEFAULT_OCR_PROFILE})
+        return profile
+
+    def read_unless_untouched(self, key, x, y, width, height, read):
+        """
+        Return read() for a region, or the result of the last read under key when the capture
+        backend tracks repaints (see app/rfb.py) and none touched the region since.
+
+        Args:
+            key: What is read, e.g. the region name and whitelist
+            read: Callable capturing and reading the region, returning None when it failed
+
+        Returns:
+            The result of read(), possibly from an earlier call
+        """
+        token = self.window_capture.damage_token() if self.window_capture else None
+        if token is None:
+            return read()
+        region = tuple(self.coordinates.region(x, y, width, height)) if self.coordinates else (x, y, width, height)
+        stored = self._region_results.get((key, region))
+        if stored is not None and not self.window_capture.region_changed(*region, stored[0]):
+            self.untouched_reads += 1
+            return stored[1]
+        result = read()
+        if result is not None:
+            self._region_results[(key, region)] = (token, result)
+        return result
+
+    def warm_up(self):
+        """
+        Load the imaging/OCR libraries and run Tesseract once on a blank image,
+        so the first real round counter read doesn't pay the startup cost.
+
+        Returns:
+            str: The Tesseract version
+        """
+        blank = Image.new('L', (32, 16), 255)
+        pytesseract.image_to_string(blank, config="--psm 7")
+        return str(pytesseract.get_tesseract_version())
 
     def take_screenshot(self, x, y, width, height):
         """
@@ -25,50 +137,61 @@ class ImageToTextReader:
         Returns:
             Image: The screenshot of the specified region
         """
-        if self.window_capture:
-            # Use window-specific capture (works in background)
-            screenshot = self.window_capture.capture_region(x, y, width, height)
-            if screenshot is None:
-                # Fallback to pyautogui if window capture fails
+        origin_x, origin_y = 0, 0
+        if self.coordinates:
+            x, y, width, height = self.coordinates.region(x, y, width, height)
+            origin_x, origin_y = self.coordinates.origin
+        with cpu_governor.stage('capture'):
+            if self.window_capture:
+                # Use window-specific capture (works in background)
+                screenshot = self.window_capture.capture_region(x, y, width, height)
+                if screenshot is None and self.window_capture.backend.remote:
+                    raise ConnectionError(f"Remote screen of '{self.window_capture.app_name}' unavailable")
+                if screenshot is None:
+                    # Fallback to pyautogui if window capture fails
+                    screenshot = pyautogui.screenshot(region=(x + origin_x, y + origin_y, width, height))
+            else:
+                # Use pyautogui screen capture (requires focus)
                 screenshot = pyautogui.screenshot(region=(x, y, width, height))
-        else:
-            # Use pyautogui screen capture (requires focus)
-            screenshot = pyautogui.screenshot(region=(x, y, width, height))
-
-        # Save the screenshot to disk for debugging
-        #curtime = datetime.datetime.now()
-        #screenshot.save(f'./screenshot_{curtime}.png')
-        #Image.open(f'./screenshot_{curtime}.png').show()
 
         return screenshot
     
-    def preprocess_image(self, screenshot) -> Image:
+    def preprocess_image(self, screenshot, profile=None) -> Image:
         """
         Preprocess an image before extracting text from it.
         
         Args:
             image (Image): The image to preprocess
+            profile (dict): OCR profile to use, DEFAULT_OCR_PROFILE if not given
         
         Returns:
             Image: The preprocessed image
         """
-        screenshot = screenshot.convert('RGB')
+        profile = profile or DEFAULT_OCR_PROFILE
+        with cpu_governor.stage('preprocess'):
+            screenshot = screenshot.convert('RGB')
+            if profile['scale'] != 1:
+                # Tesseract reads small glyphs better when they are upscaled
+                screenshot = screenshot.resize((round(screenshot.width * profile['scale']),
+                                                round(screenshot.height * profile['scale'])), Image.LANCZOS)
 
-        # Enhance contrast 
-        enhancer = ImageEnhance.Contrast(screenshot)
-        screenshot = enhancer.enhance(2.0)
-        screenshot = ImageOps.invert(screenshot)
+            # Enhance contrast 
+            enhancer = ImageEnhance.Contrast(screenshot)
+            screenshot = enhancer.enhance(profile['contrast'])
+            screenshot = ImageOps.invert(screenshot)
         
-        # Enhance brightness
-        enhancer = ImageEnhance.Brightness(screenshot)
-        screenshot = enhancer.enhance(1.3)
-        screenshot = screenshot.point(lambda x: 0 if x < 10 else 255)
-        screenshot = screenshot.filter(ImageFilter.MedianFilter(size=3))
-        screenshot = screenshot.convert('L')
+            # Enhance brightness
+            enhancer = ImageEnhance.Brightness(screenshot)
+            screenshot = enhancer.enhance(profile['brightness'])
+            threshold = profile['threshold']
+            screenshot = screenshot.point(lambda x: 0 if x < threshold else 255)
+            if profile['median'] > 1:
+                screenshot = screenshot.filter(ImageFilter.MedianFilter(size=profile['median']))
+            screenshot = screenshot.convert('L')
 
         return screenshot
 
-    def extract_text_from_region(self, x, y, width, height, charwhitelist='0123456789/') -> str:
+    def extract_text_from_region(self, x, y, width, height, charwhitelist='0123456789/', region_name=None) -> str:
         """
         Capture a specific region of the screen and extract text from it using OCR.
         
@@ -77,27 +200,141 @@ class ImageToTextReader:
             y (int): The y-coordinate of the top-left corner of the region
             width (int): The width of the region to capture
             height (int): The height of the region to capture
+            region_name (str): Optional name used to label debug frames
         
         Returns:
             str: Extracted text from the captured region
         """
+        return self.read_unless_untouched(
+            (region_name, charwhitelist), x, y, width, height,
+            lambda: self._extract_text(x, y, width, height, charwhitelist, region_name))
+
+    def _extract_text(self, x, y, width, height, charwhitelist, region_name):
         try:
-            screenshot = self.take_screenshot(x, y, width, height)
-            screenshot = self.preprocess_image(screenshot)
-            
-            # Extract text from the image using settings from pytesseract
-            # https://pypi.org/project/pytesseract/
-            text = pytesseract.image_to_string(
-                screenshot, 
-                config=f"-c tessedit_char_whitelist={charwhitelist} --psm 7", 
-                nice=1)
-            
-            return self.text_postprocessing(text.strip())
+            raw = self.take_screenshot(x, y, width, height)
+            profile = self.profile_for(region_name)
+            screenshot = self.preprocess_image(raw, profile)
+            text = self.recognize(screenshot, charwhitelist, profile)
+            if self.frame_dumper:
+                self.frame_dumper.submit(region_name or f'{x}_{y}_{width}_{height}', raw, screenshot, text)
+            return text
         
         except Exception as e:
-            print(f"An error occurred: {str(e)}")
+            _ocr_errors.warning(type(e).__name__, f"OCR failed: {str(e)}")
+            return None
+
+    @staticmethod
+    def _tesseract_config(charwhitelist, profile):
+        config = f"-c tessedit_char_whitelist={charwhitelist} --psm {profile['psm']}"
+        if profile['oem'] is not None:
+            config += f" --oem {profile['oem']}"
+        if profile['engine'] != 'tesseract':
+            # Only part of the cache key, the backends may disagree on the same crop
+            config += f" engine={profile['engine']}"
+        return config
+
+    def recognize(self, screenshot, charwhitelist='0123456789/', profile=None) -> str:
+        """
+        Run OCR on an already preprocessed image, using the OCR cache if set.
+
+        Args:
+            screenshot (Image): Output of preprocess_image
+            charwhitelist (str): Characters Tesseract may return
+            profile (dict): OCR profile (engine, psm, oem), DEFAULT_OCR_PROFILE if not given
+
+        Returns:
+            str: Extracted text
+        """
+        profile = profile or DEFAULT_OCR_PROFILE
+        config = self._tesseract_config(charwhitelist, profile)
+
+        if self.ocr_cache:
+            cache_key = self.ocr_cache.key_for(screenshot, config)
+            text = self.ocr_cache.get(cache_key)
+            if text is not None:
+                return text
+
+        with cpu_governor.stage('ocr'):
+            if profile['engine'] == 'tesserocr':
+                text, _ = _tesserocr_read(screenshot, charwhitelist, profile)
+            else:
+                # Extract text from the image using settings from pytesseract
+                # https://pypi.org/project/pytesseract/
+                text = pytesseract.image_to_string(
+                    screenshot, 
+                    config=config, 
+                    nice=1)
+        text = self.text_postprocessing(text.strip())
+
+        if self.ocr_cache:
+            self.ocr_cache.put(cache_key, text)
+        return text
+
+    def extract_text_with_confidence(self, x, y, width, height, charwhitelist='0123456789/', region_name=None):
+        """
+        Like extract_text_from_region, but also return Tesseract's confidence.
+
+        Args:
+            x (int): The x-coordinate of the top-left corner of the region
+            y (int): The y-coordinate of the top-left corner of the region
+            width (int): The width of the region to capture
+            height (int): The height of the region to capture
+            region_name (str): Optional name used to label debug frames
+
+        Returns:
+            tuple: (text, confidence) with confidence 0.0-1.0 taken from the
+                   least confident recognized word, or (None, 0.0) on error
+        """
+        result = self.read_unless_untouched(
+            (region_name, charwhitelist, 'confidence'), x, y, width, height,
+            lambda: self._extract_text_with_confidence(x, y, width, height, charwhitelist, region_name))
+        return result if result is not None else (None, 0.0)
+
+    def _extract_text_with_confidence(self, x, y, width, height, charwhitelist, region_name):
+        try:
+            raw = self.take_screenshot(x, y, width, height)
+            profile = self.profile_for(region_name)
+            screenshot = self.preprocess_image(raw, profile)
+            text, confidence = self._recognize_with_confidence(screenshot, charwhitelist, profile)
+            if self.frame_dumper:
+                self.frame_dumper.submit(region_name or f'{x}_{y}_{width}_{height}',
+                                         raw, screenshot, text, confidence)
+            return text, confidence
+
+        except Exception as e:
+            _ocr_errors.warning(type(e).__name__, f"OCR failed: {str(e)}")
             return None
 
+    def _recognize_with_confidence(self, screenshot, charwhitelist, profile=None):
+        profile = profile or DEFAULT_OCR_PROFILE
+        config = self._tesseract_config(charwhitelist, profile)
+
+        if self.ocr_cache:
+            cache_key = self.ocr_cache.key_for(screenshot, config + ' data')
+            cached = self.ocr_cache.get(cache_key)
+            if cached is not None:
+                return tuple(cached)
+
+        with cpu_governor.stage('ocr'):
+            if profile['engine'] == 'tesserocr':
+                text, confidences = _tesserocr_read(screenshot, charwhitelist, profile)
+                text = self.text_postprocessing(''.join(text.split()))
+                confidence = min(confidences) / 100 if text and confidences else 0.0
+            else:
+                data = pytesseract.image_to_data(
+                    screenshot,
+                    config=config,
+                    nice=1,
+                    output_type=pytesseract.Output.DICT)
+                words = [(word.strip(), float(conf)) for word, conf in zip(data['text'], data['conf'])
+                         if word.strip() and float(conf) >= 0]
+                text = self.text_postprocessing(''.join(word for word, _ in words))
+                confidence = min(conf for _, conf in words) / 100 if words else 0.0
+
+        if self.ocr_cache:
+            self.ocr_cache.put(cache_key, [text, confidence])
+        return text, confidence
+
     def extract_text_from_screenshot(self, filepath) -> str:
         """
         Helper functiuon to confirm the OCR is working as expected.
@@ -106,11 +343,6 @@ class ImageToTextReader:
             screenshot = Image.open(filepath)
             screenshot = self.preprocess_image(screenshot)
 
-            # Save the screenshot to disk for debugging
-            #curtime = datetime.datetime.now()
-            #screenshot.save(f'./screenshot_{curtime}.png')
-            #Image.open(f'./screenshot_{curtime}.png').show()
-            
             # Extract text from the image using settings from pytesseract
             # https://pypi.org/project/pytesseract/
             text = pytesseract.image_to_string(
@@ -120,7 +352,7 @@ class ImageToTextReader:
 
             return self.text_postprocessing(text.strip())
         except Exception as e:
-            print(f"An error occurred: {str(e)}")
+            _ocr_errors.warning(type(e).__name__, f"OCR of {filepath} failed: {str(e)}")
             return None
 
     def get_text_regions(self, image):
@@ -0,0 +1,469 @@
+"""
+Input backends: pynput, XTest (X11), uinput (Linux kernel) and a recorder.
+
+Every high-level action (click, press, ...) is turned into a batch of
+timestamped low-level events (move, button, key) that the backend sends with
+send(). Events are released on a perf_counter deadline - sleeping until just
+before it and spinning for the rest - so spacing is accurate to well under a
+millisecond instead of depending on the resolution of time.sleep(). The delays
+between events are named in DEFAULT_DELAYS and can be tuned per backend.
+
+RecordingBackend captures the exact event stream on a virtual clock for dry
+runs. Benchmark a backend without the game, e.g. under Xvfb:
+    xvfb-run python -m app.input_backends --backend xtest
+"""
+import argparse
+import os
+import statistics
+import time
+from app.lazy import LazyModule, is_available
+
+_pynput_mouse = LazyModule('pynput.mouse')
+_pynput_keyboard = LazyModule('pynput.keyboard')
+Xdisplay = LazyModule('Xlib.display')
+X = LazyModule('Xlib.X')
+XK = LazyModule('Xlib.XK')
+xtest = LazyModule('Xlib.ext.xtest')
+evdev = LazyModule('evdev')
+
+# Seconds between the events of one action
+DEFAULT_DELAYS = {
+    'settle': 0.05,     # after moving, before pressing a button
+    'click_gap': 0.05,  # after each click
+    'key_hold': 0.1,    # key held down (VMs drop shorter presses)
+}
+
+# Remaining time below which send() spins instead of sleeping
+_SPIN_THRESHOLD = 0.002
+
+# Names of special keys, mapped to pynput Key attributes
+_SPECIAL_KEYS = {
+    'space': 'space',
+    'enter': 'enter',
+    'return': 'enter',
+    'tab': 'tab',
+    'esc': 'esc',
+    'escape': 'esc',
+    'backspace': 'backspace',
+    'delete': 'delete',
+    'up': 'up',
+    'down': 'down',
+    'left': 'left',
+    'right': 'right',
+    'shift': 'shift',
+    'ctrl': 'ctrl',
+    'alt': 'alt',
+    'cmd': 'cmd',
+    'command': 'cmd',
+}
+
+# Special key names mapped to X keysym names
+_X_KEYSYMS = {
+    'space': 'space', 'enter': 'Return', 'tab': 'Tab', 'esc': 'Escape',
+    'backspace': 'BackSpace', 'delete': 'Delete', 'up': 'Up', 'down': 'Down',
+    'left': 'Left', 'right': 'Right', 'shift': 'Shift_L', 'ctrl': 'Control_L',
+    'alt': 'Alt_L', 'cmd': 'Super_L',
+}
+
+
+class InputBackend:
+    """
+    Base class with the input_controller API built on three primitives:
+    _move(x, y), _button(button, down) and _key(key, down).
+    """
+
+    def __init__(self, delays=None):
+        """
+        Args:
+            delays: Overrides for DEFAULT_DELAYS
+        """
+        self.delays = {**DEFAULT_DELAYS, **(delays or {})}
+        self._position = (0, 0)
+
+    # Primitives implemented by each backend
+
+    def _move(self, x, y):
+        raise NotImplementedError
+
+    def _button(self, button, down):
+        raise NotImplementedError
+
+    def _key(self, key, down):
+        raise NotImplementedError
+
+    def _flush(self):
+        """Push buffered events to the window system."""
+
+    def size(self):
+        raise NotImplementedError
+
+    # Timing
+
+    def now(self):
+        return time.perf_counter()
+
+    def wait_until(self, deadline):
+        """Block until deadline (in now() time), spinning for the last couple of milliseconds."""
+        remaining = deadline - time.perf_counter()
+        if remaining > _SPIN_THRESHOLD:
+            time.sleep(remaining - _SPIN_THRESHOLD)
+        while time.perf_counter() < deadline:
+            pass
+
+    def send(self, events):
+        """
+        Send a batch of timestamped events.
+
+        Args:
+            events: List of (offset_seconds, kind, *args) with kind 'move' (x, y),
+                    'button' (button, down) or 'key' (key, down), in offset order
+
+        Returns:
+            list: Lateness of each event in seconds
+        """
+        start = self.now()
+        lateness = []
+        for offset, kind, *args in events:
+            deadline = start + offset
+            if self.now() < deadline:
+                self._flush()
+                self.wait_until(deadline)
+            lateness.append(self.now() - deadline)
+            if kind == 'move':
+                self._move(*args)
+                self._position = tuple(args)
+            elif kind == 'button':
+                self._button(*args)
+            elif kind == 'key':
+                self._key(*args)
+        self._flush()
+        return lateness
+
+    # High-level API (same as input_controller)
+
+    def click(self, x, y, clicks=1, button='left'):
+        settle, gap = self.delays['settle'], self.delays['click_gap']
+        events = [(0.0, 'move', x, y)]
+        for i in range(clicks):
+            t = settle + i * gap
+            events += [(t, 'button', button, True), (t, 'button', button, False)]
+        self.send(events)
+        self.wait_until(self.now() + gap)
+
+    def moveTo(self, x, y):
+        self.send([(0.0, 'move', x, y)])
+
+    def press(self, key):
+        self.send([(0.0, 'key', key, True), (self.delays['key_hold'], 'key', key, False)])
+
+    def typewrite(self, text, interval=0.05):
+        events = []
+        for i, char in enumerate(text):
+            events += [(i * interval, 'key', char, True), (i * interval, 'key', char, False)]
+        self.send(events)
+        self.wait_until(self.now() + interval)
+
+    def mouseDown(self, x=None, y=None, button='left'):
+        self._press_button(x, y, button, True)
+
+    def mouseUp(self, x=None, y=None, button='left'):
+        self._press_button(x, y, button, False)
+
+    def _press_button(self, x, y, button, down):
+        if x is not None and y is not None:
+            self.send([(0.0, 'move', x, y), (self.delays['settle'], 'button', button, down)])
+        else:
+            self.send([(0.0, 'button', button, down)])
+
+    def position(self):
+        return self._position
+
+
+class PynputBackend(InputBackend):
+    """pynput controllers; works on macOS, Windows and X11 including VMs."""
+
+    def __init__(self, delays=None):
+        super().__init__(delays)
+        self._mouse = None
+        self._keyboard = None
+
+    @property
+    def mouse(self):
+        # Controllers are created on first use so constructing the backend needs no display
+        if self._mouse is None:
+            self._mouse = _pynput_mouse.Controller()
+        return self._mouse
+
+    @property
+    def keyboard(self):
+        if self._keyboard is None:
+            self._keyboard = _pynput_keyboard.Controller()
+        return self._keyboard
+
+    def _move(self, x, y):
+        self.mouse.position = (x, y)
+
+    def _button(self, button, down):
+        btn = _pynput_mouse.Button.left if button == 'left' else _pynput_mouse.Button.right
+        if down:
+            self.mouse.press(btn)
+        else:
+            self.mouse.release(btn)
+
+    def _key(self, key, down):
+        if key.lower() in _SPECIAL_KEYS:
+            key = getattr(_pynput_keyboard.Key, _SPECIAL_KEYS[key.lower()])
+        if down:
+            self.keyboard.press(key)
+        else:
+            self.keyboard.release(key)
+
+    def position(self):
+        return self.mouse.position
+
+    def size(self):
+        """
+        Get the screen size.
+
+        Note: This uses Quartz on macOS. Falls back to a default if unavailable.
+        """
+        try:
+            import Quartz
+            main_display = Quartz.CGMainDisplayID()
+            return (Quartz.CGDisplayPixelsWide(main_display), Quartz.CGDisplayPixelsHigh(main_display))
+        except ImportError:
+            # Fallback: try pyautogui just for size (doesn't require input permissions)
+            try:
+                import pyautogui
+                return pyautogui.size()
+            except Exception:
+                return (1920, 1080)  # Default fallback
+
+
+class XTestBackend(InputBackend):
+    """X11 XTEST extension through python-xlib; events are buffered until flushed."""
+
+    def __init__(self, delays=None, display=None):
+        """
+        Args:
+            delays: Overrides for DEFAULT_DELAYS
+            display: X display name (defaults to $DISPLAY)
+        """
+        super().__init__(delays)
+        self.display = Xdisplay.Display(display)
+        if not self.display.has_extension('XTEST'):
+            raise RuntimeError(f"X display {self.display.get_display_name()} has no XTEST extension")
+        self._keycodes = {}
+
+    def _keycode(self, key):
+        if key not in self._keycodes:
+            name = _X_KEYSYMS.get(_SPECIAL_KEYS.get(key.lower(), ''), key)
+            keysym = XK.string_to_keysym(name)
+            self._keycodes[key] = self.display.keysym_to_keycode(keysym)
+        return self._keycodes[key]
+
+    def _move(self, x, y):
+        xtest.fake_input(self.display, X.MotionNotify, x=int(x), y=int(y))
+
+    def _button(self, button, down):
+        xtest.fake_input(self.display, X.ButtonPress if down else X.ButtonRelease, 1 if button == 'left' else 3)
+
+    def _key(self, key, down):
+        xtest.fake_input(self.display, X.KeyPress if down else X.KeyRelease, self._keycode(key))
+
+    def _flush(self):
+        self.display.flush()
+
+    def position(self):
+        pointer = self.display.screen().root.query_pointer()
+        return (pointer.root_x, pointer.root_y)
+
+    def size(self):
+        screen = self.display.screen()
+        return (screen.width_in_pixels, screen.height_in_pixels)
+
+
+class UInputBackend(InputBackend):
+    """
+    Virtual absolute-pointer and keyboard device through /dev/uinput (python-evdev).
+    Works below the display server, so it also drives Wayland sessions; needs
+    write access to /dev/uinput.
+    """
+
+    def __init__(self, delays=None, screen_size=None):
+        """
+        Args:
+            delays: Overrides for DEFAULT_DELAYS
+            screen_size: (width, height) the absolute axes are scaled to, detected from the display if None
+        """
+        super().__init__(delays)
+        screen_size = screen_size or display_size()
+        if not screen_size:
+            # Guessing would put every click in the wrong place
+            raise ValueError("Could not detect the screen size for uinput, set input.screen_size in settings.json")
+        self.screen_size = tuple(screen_size)
+        ecodes = evdev.ecodes
+        capabilities = {
+            ecodes.EV_KEY: [ecodes.BTN_LEFT, ecodes.BTN_RIGHT] + [
+                code for code in ecodes.keys if 0 < code < ecodes.BTN_MISC],
+            ecodes.EV_ABS: [
+                (ecodes.ABS_X, evdev.AbsInfo(0, 0, self.screen_size[0] - 1, 0, 0, 0)),
+                (ecodes.ABS_Y, evdev.AbsInfo(0, 0, self.screen_size[1] - 1, 0, 0, 0)),
+            ],
+        }
+        self.device = evdev.UInput(capabilities, name='hyperpop-input')
+
+    def _keycode(self, key):
+        name = _SPECIAL_KEYS.get(key.lower(), key).upper()
+        name = {'CMD': 'LEFTMETA', 'SHIFT': 'LEFTSHIFT', 'CTRL': 'LEFTCTRL',
+                'ALT': 'LEFTALT'}.get(name, name)
+        return evdev.ecodes.ecodes[f'KEY_{name}']
+
+    def _move(self, x, y):
+        self.device.write(evdev.ecodes.EV_ABS, evdev.ecodes.ABS_X, int(x))
+        self.device.write(evdev.ecodes.EV_ABS, evdev.ecodes.ABS_Y, int(y))
+        self.device.syn()
+
+    def _button(self, button, down):
+        code = evdev.ecodes.BTN_LEFT if button == 'left' else evdev.ecodes.BTN_RIGHT
+        self.device.write(evdev.ecodes.EV_KEY, code, 1 if down else 0)
+        self.device.syn()
+
+    def _key(self, key, down):
+        self.device.write(evdev.ecodes.EV_KEY, self._keycode(key), 1 if down else 0)
+        self.device.syn()
+
+    def size(self):
+        return self.screen_size
+
+
+class RecordingBackend(InputBackend):
+    """
+    Records the exact event stream instead of sending it. With a virtual clock
+    (anything with now and sleep(), e.g. app.simulator.VirtualClock) time is
+    advanced instead of waited for.
+    """
+
+    def __init__(self, clock=None, delays=None, screen_size=(1920, 1080)):
+        """
+        Args:
+            clock: Optional virtual clock; real time is used without one
+            delays: Overrides for DEFAULT_DELAYS
+            screen_size: Value returned by size()
+        """
+        super().__init__(delays)
+        self.clock = clock
+        self.screen_size = tuple(screen_size)
+        self.events = []  # (time, kind, *args)
+
+    def now(self):
+        return self.clock.now if self.clock else super().now()
+
+    def wait_until(self, deadline):
+        if self.clock:
+            self.clock.sleep(max(0.0, deadline - self.clock.now))
+        else:
+            super().wait_until(deadline)
+
+    def _move(self, x, y):
+        self.events.append((self.now(), 'move', x, y))
+
+    def _button(self, button, down):
+        self.events.append((self.now(), 'button', button, down))
+
+    def _key(self, key, down):
+        self.events.append((self.now(), 'key', key, down))
+
+    def size(self):
+        return self.screen_size
+
+
+def display_size():
+    """
+    Returns:
+        tuple: (width, height) of the X display or main macOS display, None if neither can be queried
+    """
+    if os.environ.get('DISPLAY') and is_available('Xlib'):
+        try:
+            screen = Xdisplay.Display().screen()
+            return (screen.width_in_pixels, screen.height_in_pixels)
+        except Exception:
+            pass
+    if is_available('Quartz'):
+        import Quartz
+        main_display = Quartz.CGMainDisplayID()
+        return (Quartz.CGDisplayPixelsWide(main_display), Quartz.CGDisplayPixelsHigh(main_display))
+    return None
+
+
+BACKENDS = {
+    'pynput': PynputBackend,
+    'xtest': XTestBackend,
+    'uinput': UInputBackend,
+    'recording': RecordingBackend,
+}
+
+
+def create_backend(name='pynput', **options):
+    """
+    Args:
+        name: Key of BACKENDS
+        options: Backend constructor arguments (e.g. delays)
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown input backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+
+def backend_from_settings(input_settings):
+    """
+    Args:
+        input_settings: The input section of settings.json
+
+    Returns:
+        InputBackend: The configured backend with its delays (and screen size for uinput)
+    """
+    name = input_settings.get('backend', 'pynput')
+    options = {'delays': input_settings.get('delays')}
+    if name == 'uinput':
+        # Absolute axes are scaled to the real screen; None detects it from the display
+        options['screen_size'] = input_settings.get('screen_size')
+    return create_backend(name, **options)
+
+
+def benchmark(backend, events=1000, spacing=0.001):
+    """
+    Send a batch of pointer moves at a fixed spacing and measure how late each one was.
+
+    Returns:
+        dict: Event count, mean/p99/max lateness in milliseconds and events per second
+    """
+    width, height = backend.size()
+    batch = [(i * spacing, 'move', i % width, (i * 7) % height) for i in range(events)]
+    began = time.perf_counter()
+    lateness = sorted(backend.send(batch))
+    elapsed = time.perf_counter() - began
+    return {
+        'events': events,
+        'mean_ms': round(statistics.mean(lateness) * 1000, 4),
+        'p99_ms': round(lateness[int(len(lateness) * 0.99) - 1] * 1000, 4),
+        'max_ms': round(lateness[-1] * 1000, 4),
+        'events_per_second': round(events / elapsed, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure input backend timing precision')
+    parser.add_argument('--backend', default='xtest', choices=sorted(BACKENDS))
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--spacing', type=float, default=0.001, help='Seconds between events')
+    args = parser.parse_args(argv)
+
+    result = benchmark(create_backend(args.backend), args.events, args.spacing)
+    print(f"{args.backend}: {result['events']} events, lateness mean {result['mean_ms']}ms "
+          f"p99 {result['p99_ms']}ms max {result['max_ms']}ms, {result['events_per_second']} events/s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
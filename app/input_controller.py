@@ -1,35 +1,32 @@
 """
-Input controller using pynput for mouse and keyboard operations.
-This replaces pyautogui for input in VM environments where pyautogui doesn't work.
+Module-level input API used by GameController.
+
+This replaces pyautogui for input in VM environments where pyautogui doesn't
+work. Calls are forwarded to an InputBackend from app/input_backends.py
+(pynput unless set_backend() picked another one, e.g. from the "input"
+section of settings.json).
 """
-import time
-from pynput.mouse import Controller as MouseController, Button
-from pynput.keyboard import Controller as KeyboardController, Key
-
-# Global controllers
-_mouse = MouseController()
-_keyboard = KeyboardController()
-
-# Mapping of string key names to pynput Key objects
-_SPECIAL_KEYS = {
-    'space': Key.space,
-    'enter': Key.enter,
-    'return': Key.enter,
-    'tab': Key.tab,
-    'esc': Key.esc,
-    'escape': Key.esc,
-    'backspace': Key.backspace,
-    'delete': Key.delete,
-    'up': Key.up,
-    'down': Key.down,
-    'left': Key.left,
-    'right': Key.right,
-    'shift': Key.shift,
-    'ctrl': Key.ctrl,
-    'alt': Key.alt,
-    'cmd': Key.cmd,
-    'command': Key.cmd,
-}
+from app.input_backends import PynputBackend, create_backend
+
+_backend = None
+
+
+def get_backend():
+    """The active backend, created on first use so importing this module needs no display."""
+    global _backend
+    if _backend is None:
+        _backend = PynputBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Args:
+        backend: InputBackend instance, or a name accepted by create_backend()
+    """
+    global _backend
+    _backend = create_backend(backend) if isinstance(backend, str) else backend
+    return _backend
 
 
 def click(x, y, clicks=1, button='left'):
@@ -42,13 +39,7 @@ def click(x, y, clicks=1, button='left'):
         clicks: Number of clicks (default 1)
         button: 'left' or 'right' (default 'left')
     """
-    _mouse.position = (x, y)
-    time.sleep(0.05)  # Small delay to ensure position is set
-
-    btn = Button.left if button == 'left' else Button.right
-    for _ in range(clicks):
-        _mouse.click(btn)
-        time.sleep(0.05)
+    get_backend().click(x, y, clicks, button)
 
 
 def moveTo(x, y):
@@ -59,7 +50,7 @@ def moveTo(x, y):
         x: X coordinate
         y: Y coordinate
     """
-    _mouse.position = (x, y)
+    get_backend().moveTo(x, y)
 
 
 def press(key):
@@ -70,16 +61,7 @@ def press(key):
         key: Key to press (string). Can be a single character or special key name
              like 'space', 'esc', 'tab', 'enter', etc.
     """
-    # Check if it's a special key
-    if key.lower() in _SPECIAL_KEYS:
-        pynput_key = _SPECIAL_KEYS[key.lower()]
-    else:
-        # Single character key
-        pynput_key = key
-
-    _keyboard.press(pynput_key)
-    time.sleep(0.1)  # Longer hold for VM to register
-    _keyboard.release(pynput_key)
+    get_backend().press(key)
 
 
 def typewrite(text, interval=0.05):
@@ -90,10 +72,7 @@ def typewrite(text, interval=0.05):
         text: String to type
         interval: Delay between keystrokes (default 0.05)
     """
-    for char in text:
-        _keyboard.press(char)
-        _keyboard.release(char)
-        time.sleep(interval)
+    get_backend().typewrite(text, interval)
 
 
 def mouseDown(x=None, y=None, button='left'):
@@ -105,12 +84,7 @@ def mouseDown(x=None, y=None, button='left'):
         y: Optional Y coordinate to move to first
         button: 'left' or 'right' (default 'left')
     """
-    if x is not None and y is not None:
-        _mouse.position = (x, y)
-        time.sleep(0.05)
-
-    btn = Button.left if button == 'left' else Button.right
-    _mouse.press(btn)
+    get_backend().mouseDown(x, y, button)
 
 
 def mouseUp(x=None, y=None, button='left'):
@@ -122,12 +96,7 @@ def mouseUp(x=None, y=None, button='left'):
         y: Optional Y coordinate to move to first
         button: 'left' or 'right' (default 'left')
     """
-    if x is not None and y is not None:
-        _mouse.position = (x, y)
-        time.sleep(0.05)
-
-    btn = Button.left if button == 'left' else Button.right
-    _mouse.release(btn)
+    get_backend().mouseUp(x, y, button)
 
 
 def position():
@@ -137,28 +106,14 @@ def position():
     Returns:
         tuple: (x, y) coordinates
     """
-    return _mouse.position
+    return get_backend().position()
 
 
 def size():
     """
     Get the screen size.
 
-    Note: This uses Quartz on macOS. Falls back to a default if unavailable.
-
     Returns:
         tuple: (width, height)
     """
-    try:
-        import Quartz
-        main_display = Quartz.CGMainDisplayID()
-        width = Quartz.CGDisplayPixelsWide(main_display)
-        height = Quartz.CGDisplayPixelsHigh(main_display)
-        return (width, height)
-    except ImportError:
-        # Fallback: try pyautogui just for size (doesn't require input permissions)
-        try:
-            import pyautogui
-            return pyautogui.size()
-        except:
-            return (1920, 1080)  # Default fallback
+    return get_backend().size()
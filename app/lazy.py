@@ -0,0 +1,31 @@
+"""
+Deferred imports for heavy or platform-specific dependencies.
+
+pyautogui, pytesseract, PIL, numpy, pynput and Quartz are slow to import and
+some of them need a display, so modules reference them through LazyModule and
+the import only happens the first time an attribute is used.
+"""
+import importlib
+import importlib.util
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule '{self._name}' ({state})>"
+
+
+def is_available(name):
+    """Check whether a top-level module can be imported, without importing it."""
+    return importlib.util.find_spec(name) is not None
@@ -0,0 +1,61 @@
+"""
+Lives tracking from the HUD lives counter.
+
+RoundMonitor reads the lives counter along with the round counter. A single
+reading is not trusted: a new value is only confirmed once confirm_reads
+consecutive readings agree on it, so one misread digit neither triggers the
+strategy's emergency instructions nor ends a run. Unreadable readings (menus,
+popups over the HUD) are skipped without breaking the streak. Zero lives only
+ends the map after a nonzero value was confirmed on it, so a misplaced
+LIVES_COUNTER region that reads 0 can never end a healthy run.
+"""
+
+
+class LivesTracker:
+    """Confirm lives counter readings and report drops."""
+
+    DROPPED = 'dropped'  # fewer lives than the last confirmed value
+    ZERO = 'zero'        # no lives left, the map is lost
+
+    def __init__(self, confirm_reads=2):
+        """
+        Args:
+            confirm_reads: Consecutive agreeing readings needed to confirm a new value
+        """
+        self.confirm_reads = confirm_reads
+        self.reset()
+
+    def reset(self):
+        """Forget the confirmed lives, e.g. for a new map."""
+        self.lives = None
+        self.previous = None
+        self._candidate = None
+        self._count = 0
+
+    def update(self, lives):
+        """
+        Args:
+            lives: Lives read from the HUD, or None if it was unreadable
+
+        Returns:
+            str: DROPPED or ZERO when a drop was confirmed, else None
+        """
+        if lives is None:
+            return None
+        if lives == self.lives:
+            self._candidate, self._count = None, 0
+            return None
+        if lives == self._candidate:
+            self._count += 1
+        else:
+            self._candidate, self._count = lives, 1
+        if self._count < self.confirm_reads:
+            return None
+
+        self.previous, self.lives = self.lives, lives
+        self._candidate, self._count = None, 0
+        if lives == 0:
+            return self.ZERO if self.previous is not None and self.previous > 0 else None
+        if self.previous is not None and lives < self.previous:
+            return self.DROPPED
+        return None
@@ -0,0 +1,175 @@
+"""
+Logging pipeline for long unattended sessions.
+
+Callers only ever touch a QueueHandler, so a slow disk never blocks the input
+or monitor threads; a QueueListener thread does the actual writing to a
+rotating (optionally gzip-compressed) log file and stdout. Repetitive per-tick
+messages go through a RateLimiter so they cannot flood the log.
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+DEFAULT_LOG_SETTINGS = {
+    'file': 'log.txt',
+    'level': 'DEBUG',
+    'console_level': 'DEBUG',
+    'rotation': 'size',         # 'size', 'time' or 'none'
+    'max_bytes': 10 * 1024 * 1024,
+    'when': 'midnight',
+    'backup_count': 10,
+    'compress': True,
+    'json': False,
+}
+
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry)
+
+
+def _gzip_namer(name):
+    return name + '.gz'
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _build_file_handler(log_settings):
+    path = log_settings['file']
+    rotation = log_settings['rotation']
+    if rotation == 'size':
+        handler = logging.handlers.RotatingFileHandler(
+            path, mode='a', maxBytes=log_settings['max_bytes'],
+            backupCount=log_settings['backup_count'])
+    elif rotation == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=log_settings['when'], backupCount=log_settings['backup_count'])
+    else:
+        handler = logging.FileHandler(path, mode='a')
+
+    if rotation in ('size', 'time') and log_settings['compress']:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def setup_logger(name, log_settings=None):
+    """
+    Configure a logger whose handlers run on a background QueueListener.
+
+    Args:
+        name: Logger name (child loggers like 'btd6.ocr' share the pipeline)
+        log_settings: Optional overrides for DEFAULT_LOG_SETTINGS (the
+                      "logging" section of settings.json)
+
+    Returns:
+        logging.Logger: The configured logger
+    """
+    global _listener
+    log_settings = {**DEFAULT_LOG_SETTINGS, **(log_settings or {})}
+
+    if log_settings['json']:
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(fmt='%(asctime)s %(levelname)-8s %(message)s',
+                                      datefmt='%Y-%m-%d %H:%M:%S')
+
+    file_handler = _build_file_handler(log_settings)
+    file_handler.setFormatter(formatter)
+    file_handler.setLevel(log_settings['level'])
+    screen_handler = logging.StreamHandler(stream=sys.stdout)
+    screen_handler.setFormatter(formatter)
+    screen_handler.setLevel(log_settings['console_level'])
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    stop_logging()
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, screen_handler, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+class RateLimiter:
+    """
+    Throttle repetitive log messages.
+
+    Each message key is logged at most once per interval; when it is logged
+    again the number of suppressed occurrences is appended, so nothing is
+    silently lost.
+    """
+
+    def __init__(self, logger, interval=30.0):
+        """
+        Args:
+            logger: Logger to emit to
+            interval: Minimum seconds between two messages with the same key
+        """
+        self.logger = logger
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last = {}        # key -> time of last emitted message
+        self._suppressed = {}  # key -> count suppressed since then
+
+    def log(self, key, level, msg):
+        """Log msg under key unless a message with that key was logged recently."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            suppressed = self._suppressed.pop(key, 0)
+            self._last[key] = now
+        if suppressed:
+            msg = f"{msg} ({suppressed} similar messages suppressed)"
+        self.logger.log(level, msg)
+
+    def debug(self, key, msg):
+        self.log(key, logging.DEBUG, msg)
+
+    def warning(self, key, msg):
+        self.log(key, logging.WARNING, msg)
@@ -0,0 +1,126 @@
+"""
+Identify the current map from its preview thumbnail using perceptual hashes.
+
+Each map folder under app/config/maps can hold a thumbnail.png reference. The
+difference hash (dHash) of every thumbnail is computed once and cached on disk,
+so identifying a map is a 64-bit Hamming distance against a handful of ints.
+Thumbnails are added automatically the first time the OCR fallback confidently
+recognises a map that has none.
+"""
+import json
+import os
+from app.lazy import LazyModule
+
+Image = LazyModule('PIL.Image')
+
+THUMBNAIL_FILE = 'thumbnail.png'
+
+
+def dhash(image, hash_size=8):
+    """
+    Compute the difference hash of an image.
+
+    Args:
+        image: PIL Image
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        int: The hash as an integer
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class MapIdentifier:
+    """Match map thumbnails against a cached index of reference hashes."""
+
+    def __init__(self, maps_dir=None, cache_path=None, max_distance=10):
+        """
+        Args:
+            maps_dir: Directory containing one folder per map
+            cache_path: Where to cache the hash index (default: <maps_dir>/.thumbnail_hashes.json)
+            max_distance: Largest Hamming distance (out of 64 bits) accepted as a match
+        """
+        self.maps_dir = maps_dir or os.path.join(os.getcwd(), 'app', 'config', 'maps')
+        self.cache_path = cache_path or os.path.join(self.maps_dir, '.thumbnail_hashes.json')
+        self.max_distance = max_distance
+        self._index = None  # map name -> hash
+
+    def _thumbnail_path(self, map_name):
+        return os.path.join(self.maps_dir, map_name, THUMBNAIL_FILE)
+
+    def load_index(self):
+        """
+        Build the hash index, reusing cached hashes for unchanged thumbnails.
+
+        Returns:
+            dict: Map name to thumbnail hash
+        """
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+        index, updated_cache = {}, {}
+        for map_name in sorted(os.listdir(self.maps_dir)):
+            path = self._thumbnail_path(map_name)
+            if not os.path.isfile(path):
+                continue
+            mtime = os.path.getmtime(path)
+            entry = cache.get(map_name)
+            if not entry or entry['mtime'] != mtime:
+                with Image.open(path) as thumbnail:
+                    entry = {'hash': format(dhash(thumbnail), 'x'), 'mtime': mtime}
+            updated_cache[map_name] = entry
+            index[map_name] = int(entry['hash'], 16)
+
+        if updated_cache != cache:
+            with open(self.cache_path, 'w') as f:
+                json.dump(updated_cache, f, indent=2)
+        self._index = index
+        return index
+
+    def has_reference(self, map_name):
+        if self._index is None:
+            self.load_index()
+        return map_name in self._index
+
+    def identify(self, image):
+        """
+        Find the map whose reference thumbnail is closest to image.
+
+        Args:
+            image: PIL Image of the map preview thumbnail
+
+        Returns:
+            Tuple of (map_name, distance), map_name is None if nothing is within max_distance
+        """
+        if self._index is None:
+            self.load_index()
+        if not self._index:
+            return (None, None)
+
+        image_hash = dhash(image)
+        best_map, best_distance = min(
+            ((map_name, hamming_distance(image_hash, ref_hash))
+             for map_name, ref_hash in self._index.items()),
+            key=lambda match: match[1])
+        if best_distance > self.max_distance:
+            return (None, best_distance)
+        return (best_map, best_distance)
+
+    def add_reference(self, map_name, image):
+        """Save image as the reference thumbnail for map_name and refresh the index."""
+        image.save(self._thumbnail_path(map_name))
+        self.load_index()
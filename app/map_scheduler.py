@@ -0,0 +1,108 @@
+"""
+Choose the next map route by expected collection points per hour.
+
+A route is a way of starting a game that GameController knows (the fixed Dark
+Dungeons flow, or whatever map the collection event offers), configured in the
+"map_scheduler" section of settings.json with the points a win is worth and a
+prior run length. From the run history each route gets
+
+    points/hour = P(win) * points per win / expected hours per attempt
+
+where the win rate and the attempt length (defeats included, so a strategy that
+loses late costs a lot) are smoothed towards the configured priors with
+prior_runs pseudo-runs. Routes with fewer than min_runs recorded runs are tried
+first so every enabled route gets measured.
+
+Show the current estimates:
+    python -m app.map_scheduler
+"""
+import argparse
+from .config import Settings
+from .run_history import RunHistory
+
+DEFAULT_ROUTES = {
+    'dark_dungeons': {'enabled': True, 'points': 14, 'expected_minutes': 25},
+}
+
+
+class MapScheduler:
+    """Rank routes by expected reward per hour from the run history."""
+
+    def __init__(self, history, global_settings, logger=None):
+        """
+        Args:
+            history: RunHistory
+            global_settings: Parsed settings.json with a "map_scheduler" section
+            logger: Optional logger for the decision
+        """
+        settings = global_settings.get('map_scheduler', {})
+        self.history = history
+        self.logger = logger
+        self.routes = {name: route for name, route in settings.get('routes', DEFAULT_ROUTES).items()
+                       if route.get('enabled', True)}
+        self.min_runs = settings.get('min_runs', 3)
+        self.prior_runs = settings.get('prior_runs', 2)
+        self.prior_win_rate = settings.get('prior_win_rate', 0.8)
+        self.window = settings.get('window', 50)
+
+    def estimate(self, route):
+        """
+        Returns:
+            dict: runs, win_rate, minutes per attempt and points_per_hour for one route
+        """
+        config = self.routes[route]
+        stats = self.history.route_stats(route, self.window)
+        prior = self.prior_runs
+        win_rate = (stats['wins'] + self.prior_win_rate * prior) / (stats['runs'] + prior)
+        seconds = (stats['total_seconds'] + config.get('expected_minutes', 25) * 60 * prior) / (stats['runs'] + prior)
+        points = stats['victory_points'] / stats['wins'] if stats['wins'] else config.get('points', 0)
+        return {
+            'runs': stats['runs'],
+            'win_rate': round(win_rate, 3),
+            'minutes': round(seconds / 60, 1),
+            'points_per_hour': round(win_rate * points * 3600 / seconds, 2) if seconds else 0.0,
+        }
+
+    def rank(self):
+        """[(route, estimate)] best first."""
+        estimates = [(route, self.estimate(route)) for route in self.routes]
+        return sorted(estimates, key=lambda item: item[1]['points_per_hour'], reverse=True)
+
+    def next_route(self):
+        """The least measured route while any is below min_runs, else the best points per hour."""
+        ranking = self.rank()
+        if not ranking:
+            raise ValueError('No enabled routes in map_scheduler.routes')
+        unmeasured = [item for item in ranking if item[1]['runs'] < self.min_runs]
+        route, estimate = min(unmeasured, key=lambda item: item[1]['runs']) if unmeasured else ranking[0]
+        if self.logger:
+            reason = 'exploring' if unmeasured else 'best points/hour'
+            self.logger.info(f"Next route {route} ({reason}): {estimate}")
+        return route
+
+    def points_per_win(self, route):
+        return self.routes[route].get('points', 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the route estimates of the map scheduler')
+    parser.add_argument('--history', default=None, help='Run history database (default from settings.json)')
+    parser.add_argument('--recent', type=int, default=10, help='Also list this many recent runs')
+    args = parser.parse_args(argv)
+
+    global_settings = Settings().load_global_settings()
+    history = RunHistory(args.history or global_settings.get('map_scheduler', {}).get(
+        'history_path', 'run_history.sqlite3'))
+    scheduler = MapScheduler(history, global_settings)
+    for route, estimate in scheduler.rank():
+        print(f"{route:<16} {estimate['points_per_hour']:7.2f} pts/h  win {estimate['win_rate']:.0%}  "
+              f"{estimate['minutes']:5.1f} min/attempt  {estimate['runs']} runs")
+    for run in history.recent(limit=args.recent):
+        minutes = (run['ended_at'] - run['started_at']) / 60
+        print(f"  #{run['id']} {run['route']} {run['map']} {run['outcome']} {run['points']} pts "
+              f"{minutes:.1f} min round {run['final_round']} {run['phases']}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,229 @@
+"""
+Memory footprint instrumentation for long sessions.
+
+A background thread samples the process RSS every interval seconds and logs
+the current, peak and steady-state (median of the newer half of the samples)
+values along with the growth trend in MB/hour over the last trend_window
+samples. With trace enabled, tracemalloc snapshots are diffed between samples
+and the call sites that grew the most are reported per round monitor tick
+(RoundMonitor calls tick() every poll), which is what points at a leak in the
+capture/preprocess path. Tracing costs CPU and memory itself, so it is opt-in.
+
+When RSS exceeds ceiling_mb, the report and the current tracemalloc snapshot
+are written to snapshot_dir and on_ceiling is called (the bot restarts itself
+at a safe point, resuming from the session state). Compare dumped snapshots
+offline with:
+    python -m app.memory_monitor memory_snapshots/a.snapshot memory_snapshots/b.snapshot
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from . import cpu_governor
+
+MB = 1024 * 1024
+
+_active = None
+
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def tick():
+    """Count one unit of work (a round monitor poll) for per-tick allocation figures."""
+    if _active is not None:
+        _active.ticks += 1
+
+
+def rss_bytes():
+    """Current resident set size, or the peak where the current value is not available."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes on Linux
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def growth_rate(samples):
+    """Least-squares slope in bytes/second of [(t, bytes)] samples."""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_v = sum(v for _, v in samples) / len(samples)
+    variance = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not variance:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in samples) / variance
+
+
+class MemoryMonitor:
+    """Periodic RSS/tracemalloc reports with a memory ceiling."""
+
+    def __init__(self, logger, interval=60.0, trace=False, frames=10, top=10, ceiling_mb=None,
+                 snapshot_dir='memory_snapshots', on_ceiling=None, trend_window=60, clock=time.monotonic):
+        """
+        Args:
+            logger: Logger for reports
+            interval: Seconds between samples
+            trace: Enable tracemalloc for per-call-site allocation growth
+            frames: Stack frames tracemalloc keeps per allocation
+            top: Number of call sites reported
+            ceiling_mb: RSS that triggers a dump and on_ceiling (None disables)
+            snapshot_dir: Where ceiling dumps are written
+            on_ceiling: Callable run once RSS exceeds the ceiling
+            trend_window: Number of recent samples the growth trend is fitted over
+            clock: Time source
+        """
+        self.logger = logger
+        self.interval = interval
+        self.trace = trace
+        self.frames = frames
+        self.top = top
+        self.ceiling = ceiling_mb * MB if ceiling_mb else None
+        self.snapshot_dir = snapshot_dir
+        self.on_ceiling = on_ceiling
+        self.clock = clock
+        self.ticks = 0
+        self.peak_rss = 0
+        self._samples = deque(maxlen=trend_window)
+        self._all_rss = deque(maxlen=10 * trend_window)
+        self._snapshot = None
+        self._snapshot_ticks = 0
+        self._over_ceiling = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        global _active
+        _active = self
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._snapshot = self._take_snapshot()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='MemoryMonitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        global _active
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        if _active is self:
+            _active = None
+        if self.trace and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _run(self):
+        next_sample = self.clock() + self.interval
+        while self._running:
+            # Snapshots are slow, so they wait for input bursts to finish
+            if self.clock() >= next_sample and not cpu_governor.in_burst():
+                next_sample += self.interval
+                try:
+                    self.sample()
+                except Exception as e:
+                    self.logger.exception(f"Memory sample failed: {e}")
+            time.sleep(min(1.0, self.interval))
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+
+    def sample(self):
+        """
+        Take one sample, log the report and enforce the ceiling.
+
+        Returns:
+            dict: The report
+        """
+        now = self.clock()
+        rss = rss_bytes()
+        self.peak_rss = max(self.peak_rss, rss)
+        self._samples.append((now, rss))
+        self._all_rss.append(rss)
+        newer_half = list(self._all_rss)[len(self._all_rss) // 2:]
+        report = {
+            't': time.time(),
+            'rss_mb': round(rss / MB, 1),
+            'peak_rss_mb': round(self.peak_rss / MB, 1),
+            'steady_rss_mb': round(statistics.median(newer_half) / MB, 1),
+            'trend_mb_per_hour': round(growth_rate(list(self._samples)) * 3600 / MB, 2),
+            'ticks': self.ticks,
+        }
+
+        snapshot = None
+        if self.trace and tracemalloc.is_tracing():
+            snapshot = self._take_snapshot()
+            ticks = max(1, self.ticks - self._snapshot_ticks)
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            report['traced_mb'] = round(traced / MB, 1)
+            report['traced_peak_mb'] = round(traced_peak / MB, 1)
+            report['growth_per_tick'] = [
+                {'site': str(stat.traceback[0]), 'bytes_per_tick': round(stat.size_diff / ticks),
+                 'count_per_tick': round(stat.count_diff / ticks, 2), 'total_kb': round(stat.size / 1024)}
+                for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top] if stat.size_diff]
+            self._snapshot, self._snapshot_ticks = snapshot, self.ticks
+
+        self._log(report)
+        if self.ceiling and rss > self.ceiling:
+            if not self._over_ceiling:
+                self._over_ceiling = True
+                self._hit_ceiling(report, snapshot)
+        else:
+            self._over_ceiling = False
+        return report
+
+    def _log(self, report):
+        self.logger.info(f"Memory: RSS {report['rss_mb']}MB (peak {report['peak_rss_mb']}MB, steady "
+                         f"{report['steady_rss_mb']}MB, trend {report['trend_mb_per_hour']:+}MB/h, "
+                         f"{report['ticks']} ticks)")
+        for growth in report.get('growth_per_tick', []):
+            self.logger.debug(f"  {growth['site']}: {growth['bytes_per_tick']:+}B/tick "
+                              f"({growth['count_per_tick']:+} blocks/tick, {growth['total_kb']}KB live)")
+
+    def _hit_ceiling(self, report, snapshot):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        base = os.path.join(self.snapshot_dir, time.strftime('%Y%m%d-%H%M%S'))
+        with open(base + '.json', 'w') as f:
+            json.dump(report, f, indent=2)
+        if snapshot is not None:
+            snapshot.dump(base + '.snapshot')
+        self.logger.error(f"RSS {report['rss_mb']}MB over the {self.ceiling // MB}MB ceiling, "
+                          f"report written to {base}.json")
+        if self.on_ceiling:
+            self.on_ceiling()
+
+
+def compare_snapshots(old_path, new_path, top=20):
+    """Lines of the call sites that grew the most between two dumped snapshots."""
+    old = tracemalloc.Snapshot.load(old_path)
+    new = tracemalloc.Snapshot.load(new_path)
+    return [str(stat) for stat in new.compare_to(old, 'lineno')[:top]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two tracemalloc snapshots dumped at the memory ceiling')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+    for line in compare_snapshots(args.old, args.new, args.top):
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
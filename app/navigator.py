@@ -0,0 +1,301 @@
+"""
+Menu navigation over a declarative screen graph.
+
+app/config/screens.json lists the game's screens and the clicks/key presses
+that lead from one to another. Each screen is identified by the colors at a
+few reference points (its pixel signature), recorded once per screen with the
+game showing it. The Navigator identifies the current screen from a single
+capture, follows the shortest path (BFS over the edges) to a target screen and
+re-identifies after every edge, so an unexpected popup just means replanning
+from wherever the game ended up. Screens it cannot identify are left through
+the generic recovery actions (OK, back, esc).
+
+Record signatures with the game showing each screen, then check them:
+    python -m app.navigator record HOME
+    python -m app.navigator identify
+    python -m app.navigator path VICTORY IN_GAME
+"""
+import argparse
+import json
+import logging
+import os
+from collections import deque
+from app.lazy import LazyModule
+from .config import Settings
+from .supervisor import heartbeat
+
+ImageStat = LazyModule('PIL.ImageStat')
+
+SCREENS_PATH = os.path.join('app', 'config', 'screens.json')
+
+
+class ScreenGraph:
+    """Screens with pixel signatures and the actions connecting them."""
+
+    def __init__(self, screens, edges, recovery=None):
+        """
+        Args:
+            screens: {name: {"points": [[x, y], ...], "colors": [[r, g, b], ...], "in_game": bool}}
+            edges: [{"from": name, "to": name, "actions": [...], "timeout": seconds}, ...]
+            recovery: Actions tried in order when the current screen is unknown
+        """
+        self.screens = screens
+        self.edges = {}
+        for edge in edges:
+            self.edges.setdefault(edge['from'], []).append(edge)
+        self.recovery = recovery or []
+
+    @classmethod
+    def load(cls, path=SCREENS_PATH):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['screens'], data['edges'], data.get('recovery'))
+
+    def save(self, path=SCREENS_PATH):
+        data = {'screens': self.screens,
+                'edges': [edge for edges in self.edges.values() for edge in edges],
+                'recovery': self.recovery}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def recorded(self):
+        """Names of the screens that have a recorded signature."""
+        return [name for name, screen in self.screens.items() if screen.get('colors')]
+
+    def is_in_game(self, name):
+        return bool(name and self.screens.get(name, {}).get('in_game'))
+
+    def shortest_path(self, start, goal):
+        """
+        Fewest edges from start to goal. Ties go to the edge listed first.
+
+        Returns:
+            list: Edges to follow, [] if already there, None if goal is unreachable
+        """
+        if start == goal:
+            return []
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            screen = queue.popleft()
+            for edge in self.edges.get(screen, []):
+                if edge['to'] in previous:
+                    continue
+                previous[edge['to']] = edge
+                if edge['to'] == goal:
+                    path = []
+                    while edge:
+                        path.append(edge)
+                        edge = previous[edge['from']]
+                    return path[::-1]
+                queue.append(edge['to'])
+        return None
+
+
+def sample_colors(frame, points, reference_resolution, radius=2):
+    """
+    Mean RGB around each reference point of a frame covering the reference area.
+
+    Args:
+        frame: PIL Image of the reference area at any scale
+        points: [[x, y], ...] in reference coordinates
+        reference_resolution: (width, height) the points are measured in
+        radius: Half-size of the averaged patch in frame pixels
+    """
+    frame = frame.convert('RGB')
+    scale_x = frame.width / reference_resolution[0]
+    scale_y = frame.height / reference_resolution[1]
+    colors = []
+    for x, y in points:
+        fx, fy = int(x * scale_x), int(y * scale_y)
+        patch = frame.crop((max(0, fx - radius), max(0, fy - radius),
+                            min(frame.width, fx + radius + 1), min(frame.height, fy + radius + 1)))
+        colors.append([round(c) for c in ImageStat.Stat(patch).mean])
+    return colors
+
+
+def signature_distance(colors, expected, tolerance):
+    """Mean per-point color distance, or None if any point is further than tolerance."""
+    distances = [max(abs(a - b) for a, b in zip(color, reference)) for color, reference in zip(colors, expected)]
+    if not distances or max(distances) > tolerance:
+        return None
+    return sum(distances) / len(distances)
+
+
+class Navigator:
+    """Identify the current screen and walk the screen graph to a target."""
+
+    def __init__(self, game_controller, graph, global_settings, logger):
+        """
+        Args:
+            game_controller: GameController whose img_reader, clicks and timing profile are used
+            graph: ScreenGraph
+            global_settings: Parsed settings.json with a "navigation" section
+            logger: Logger for progress messages
+        """
+        settings = global_settings.get('navigation', {})
+        self.controller = game_controller
+        self.graph = graph
+        self.logger = logger
+        self.reference_resolution = global_settings['reference_resolution']
+        self.tolerance = settings.get('color_tolerance', 24)
+        self.poll_interval = settings.get('poll_interval', 0.25)
+        self.transition_timeout = settings.get('transition_timeout', 5.0)
+        self.max_steps = settings.get('max_steps', 12)
+
+    def capture(self):
+        width, height = self.reference_resolution
+        return self.controller.img_reader.take_screenshot(0, 0, width, height)
+
+    def identify(self, frame=None):
+        """
+        Returns:
+            str: The recorded screen whose signature matches best, or None
+        """
+        frame = frame if frame is not None else self.capture()
+        if frame is None:
+            return None
+        best, best_distance = None, None
+        for name in self.graph.recorded():
+            screen = self.graph.screens[name]
+            colors = sample_colors(frame, screen['points'], self.reference_resolution)
+            distance = signature_distance(colors, screen['colors'], self.tolerance)
+            if distance is not None and (best_distance is None or distance < best_distance):
+                best, best_distance = name, distance
+        return best
+
+    def perform(self, action):
+        """Run one {"click": position name} or {"press": key} action, then its "wait" delay if any."""
+        if 'click' in action:
+            self.controller.click_at_position(action['click'])
+        elif 'press' in action:
+            self.controller.input.press(action['press'])
+        if 'wait' in action:
+            self.controller._wait(action['wait'])
+
+    def wait_for(self, expected, timeout, leaving=None):
+        """
+        Poll until expected is shown, or another known screen is shown twice in a row
+        (an unplanned popup), or timeout. The screen being left is still shown until
+        the game reacts, so it only counts at the timeout.
+
+        Returns:
+            str: The screen reached, None if nothing recognisable was shown
+        """
+        clock = self.controller.clock
+        deadline = clock.monotonic() + timeout
+        last = None
+        while True:
+            screen = self.identify()
+            if screen is not None and screen != leaving and screen in (expected, last):
+                return screen
+            last = screen
+            if clock.monotonic() >= deadline:
+                return screen
+            heartbeat(expected=self.poll_interval)
+            clock.sleep(self.poll_interval)
+
+    def recover(self):
+        """Try the recovery actions until a known screen shows up."""
+        for action in self.graph.recovery:
+            self.logger.info(f"Unknown screen, trying recovery action {action}")
+            self.perform(action)
+            screen = self.wait_for(None, self.transition_timeout)
+            if screen:
+                return screen
+        return None
+
+    def navigate(self, target):
+        """
+        Go to target from whatever screen is shown, replanning after every edge.
+
+        Returns:
+            bool: True once target is identified
+        """
+        screen = self.identify()
+        for _ in range(self.max_steps):
+            if screen == target:
+                return True
+            if screen is None:
+                screen = self.recover()
+                continue
+            path = self.graph.shortest_path(screen, target)
+            if path is None:
+                # E.g. still in game while the victory screen comes up, wait for the screen to change
+                self.logger.info(f"No path from {screen} to {target}, waiting for another screen")
+                screen = self.wait_for(target, self.transition_timeout, screen)
+                continue
+            edge = path[0]
+            self.logger.info(f"Navigating {screen} -> {edge['to']} (target {target}, {len(path)} steps)")
+            for action in edge['actions']:
+                self.perform(action)
+            screen = self.wait_for(edge['to'], edge.get('timeout', self.transition_timeout), screen)
+            if screen != edge['to']:
+                self.logger.warning(f"Expected {edge['to']} after {edge['actions']}, found {screen}")
+        if screen == target:
+            return True
+        self.logger.error(f"Gave up navigating to {target} after {self.max_steps} steps (last screen: {screen})")
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record screen signatures and test menu navigation')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record = subparsers.add_parser('record', help='Store the signature of the screen currently shown')
+    record.add_argument('screen')
+    record.add_argument('--image', help='Screenshot to record from (defaults to a screenshot)')
+    identify = subparsers.add_parser('identify', help='Print the screen currently shown')
+    identify.add_argument('--image', help='Screenshot to identify (defaults to a screenshot)')
+    path = subparsers.add_parser('path', help='Print the shortest path between two screens')
+    path.add_argument('start')
+    path.add_argument('goal')
+    goto = subparsers.add_parser('goto', help='Navigate the running game to a screen')
+    goto.add_argument('screen')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('btd6.navigator')
+    global_settings = Settings().load_global_settings()
+    graph = ScreenGraph.load()
+
+    if args.command == 'path':
+        steps = graph.shortest_path(args.start, args.goal)
+        if steps is None:
+            logger.error(f"No path from {args.start} to {args.goal}")
+            return 1
+        for edge in steps:
+            print(f"{edge['from']} -> {edge['to']}: {edge['actions']}")
+        return 0
+
+    if args.command == 'goto':
+        # Imported here so the offline commands need no display
+        from .game_controller import GameController
+        from .round_monitor import RoundMonitor
+        controller = GameController(RoundMonitor(logger), logger, global_settings.get('background_mode', True))
+        navigator = Navigator(controller, graph, global_settings, logger)
+        return 0 if navigator.navigate(args.screen) else 1
+
+    if args.image:
+        from PIL import Image
+        frame = Image.open(args.image).convert('RGB')
+    else:
+        import pyautogui
+        frame = pyautogui.screenshot(region=(0, 0, *global_settings['reference_resolution']))
+
+    if args.command == 'record':
+        if args.screen not in graph.screens:
+            logger.error(f"Unknown screen {args.screen}, add it to {SCREENS_PATH} first")
+            return 1
+        screen = graph.screens[args.screen]
+        screen['colors'] = sample_colors(frame, screen['points'], global_settings['reference_resolution'])
+        graph.save()
+        logger.info(f"Recorded {args.screen}: {screen['colors']}")
+        return 0
+
+    navigator = Navigator(None, graph, global_settings, logger)
+    print(navigator.identify(frame))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
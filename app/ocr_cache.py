@@ -0,0 +1,110 @@
+"""
+Content-addressed memo of OCR results.
+
+The round counter and map name crops come from a small set of distinct images,
+so after preprocessing the same pixels are seen over and over. Results are
+keyed by a hash of the preprocessed crop plus the Tesseract config, kept in an
+LRU with a size cap, and persisted to disk between sessions.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from . import cpu_governor
+
+
+class OcrCache:
+    """Thread-safe LRU cache from crop hash to recognized text."""
+
+    def __init__(self, path='ocr_cache.json', max_entries=5000, save_every=50):
+        """
+        Args:
+            path: JSON file to persist the cache to (None keeps it in memory only)
+            max_entries: Least recently used entries are evicted beyond this size
+            save_every: Persist after this many new entries (0 saves only on save())
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Saves come from the monitor thread, the main thread and restart paths, and share one tmp file
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self.load()
+
+    @staticmethod
+    def key_for(image, config=''):
+        """Hash the pixels, mode and size of image together with the OCR config."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{image.mode}{image.size}{config}'.encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached text for key, or None on a miss."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            # Deferred while input is sent; the next put after the burst saves instead
+            should_save = self.save_every and self._unsaved >= self.save_every and not cpu_governor.in_burst()
+        if should_save:
+            self.save()
+
+    def load(self):
+        """Load persisted entries, ignoring a missing or corrupt file."""
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._entries = OrderedDict(list(entries.items())[-self.max_entries:])
+
+    def save(self):
+        """Atomically write the cache to disk, oldest entries first."""
+        if not self.path:
+            return
+        with self._save_lock:
+            # Snapshotted under the save lock, so the last writer also publishes the newest entries
+            with self._lock:
+                snapshot = dict(self._entries)
+                self._unsaved = 0
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+
+    def stats(self):
+        """
+        Returns:
+            dict: entries, hits, misses, evictions and hit_rate (0.0-1.0)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,242 @@
+"""
+Per-region OCR profile tuning from labeled crops.
+
+Every OCR read goes through a profile: preprocessing (upscale factor,
+contrast, brightness, threshold, median filter), Tesseract page segmentation
+and engine mode, and the recognizer backend. Without tuning all regions use
+DEFAULT_OCR_PROFILE. The tuner sweeps the candidates of ocr_tuning.grid in
+settings.json over labeled raw crops of each region, and stores the fastest
+profile that reads at least accuracy_target of them exactly in
+app/config/machine/<hostname>.json, where ImageToTextReader picks it up.
+
+Candidates are abandoned as soon as they miss more crops than the target, or
+the most accurate candidate so far, allows, so hopeless settings cost only a
+few reads. Preprocessed crops are shared between candidates that only differ
+in recognizer settings.
+
+Labels are JSON lines of {"region", "image", "text"} with image paths relative
+to the labels file (app/test_screenshots/labels.jsonl is a starter set).
+Collect more crops with debug capture in 'always' mode, then import and
+correct them:
+    python -m app.ocr_tuner import debug_frames --labels ocr_labels/labels.jsonl
+    python -m app.ocr_tuner tune --labels ocr_labels/labels.jsonl
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import shutil
+import time
+from app.lazy import LazyModule
+from .config import Settings
+from .img_to_str_reader import DEFAULT_OCR_PROFILE, ImageToTextReader, available_engines
+
+Image = LazyModule('PIL.Image')
+
+# Characters each region is read with (see the extract_text_* and HudReader callers)
+REGION_WHITELISTS = {
+    'ROUND_COUNTER': '0123456789/',
+    'MAP_NAME': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'CASH_COUNTER': '0123456789',
+    'LIVES_COUNTER': '0123456789',
+}
+
+PREPROCESS_KEYS = ('scale', 'contrast', 'brightness', 'threshold', 'median')
+
+DEFAULT_GRID = {
+    'engine': ['tesseract', 'tesserocr'],
+    'scale': [1, 2],
+    'contrast': [1.5, 2.0, 3.0],
+    'brightness': [1.0, 1.3],
+    'threshold': [10, 60, 128],
+    'median': [0, 3],
+    'psm': [7, 8, 13],
+    'oem': [None, 1],
+}
+
+
+def load_labels(path):
+    """
+    Returns:
+        dict: {region: [(image path, expected text, whitelist)]}
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    samples = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            label = json.loads(line)
+            region = label['region']
+            whitelist = label.get('whitelist') or REGION_WHITELISTS.get(region, '0123456789/')
+            samples.setdefault(region, []).append((os.path.join(base, label['image']), label['text'], whitelist))
+    return samples
+
+
+def import_debug_frames(directory, labels_path, region=None):
+    """
+    Copy the raw crops of a debug capture archive next to labels_path, labeled with what OCR read.
+    The labels are only a starting point and need to be checked by hand.
+
+    Returns:
+        int: Number of crops imported
+    """
+    base = os.path.dirname(os.path.abspath(labels_path))
+    os.makedirs(base, exist_ok=True)
+    imported = 0
+    with open(os.path.join(directory, 'index.jsonl'), 'r') as index, open(labels_path, 'a') as labels:
+        for line in index:
+            entry = json.loads(line)
+            if not entry.get('raw') or (region and entry['region'] != region):
+                continue
+            source = os.path.join(directory, entry['raw'])
+            if not os.path.exists(source):
+                continue
+            shutil.copy2(source, os.path.join(base, entry['raw']))
+            labels.write(json.dumps({'region': entry['region'], 'image': entry['raw'],
+                                     'text': entry['text'] or ''}) + '\n')
+            imported += 1
+    return imported
+
+
+class OcrTuner:
+    """Sweep OCR profiles over labeled crops and pick the fastest accurate one."""
+
+    def __init__(self, grid=None, accuracy_target=0.98, logger=None, clock=time.perf_counter):
+        """
+        Args:
+            grid: {profile key: [candidate values]}, DEFAULT_GRID where a key is missing
+            accuracy_target: Fraction of crops that must be read exactly
+            logger: Optional logger for progress
+            clock: Time source for measuring reads
+        """
+        self.grid = {**DEFAULT_GRID, **(grid or {})}
+        engines = available_engines()
+        self.grid['engine'] = [engine for engine in self.grid['engine'] if engine in engines]
+        self.accuracy_target = accuracy_target
+        self.logger = logger
+        self.clock = clock
+        # No cache or tuned profiles, every read has to run the recognizer
+        self.reader = ImageToTextReader(ocr_profiles={})
+
+    def candidates(self):
+        """Every profile of the grid, DEFAULT_OCR_PROFILE first, grouped by preprocessing."""
+        keys = list(DEFAULT_OCR_PROFILE)
+        profiles = [dict(zip(keys, values)) for values in itertools.product(*(self.grid[key] for key in keys))]
+        profiles.sort(key=lambda profile: tuple(str(profile[key]) for key in PREPROCESS_KEYS))
+        if DEFAULT_OCR_PROFILE in profiles:
+            profiles.remove(DEFAULT_OCR_PROFILE)
+        return [dict(DEFAULT_OCR_PROFILE)] + profiles
+
+    def evaluate(self, profile, samples, max_misses, preprocessed):
+        """
+        Read every sample with profile, giving up after more than max_misses wrong reads.
+
+        Args:
+            preprocessed: {(preprocessing, sample index): (image, seconds)} shared between candidates
+
+        Returns:
+            dict: accuracy, ms per read and misses, or None if the candidate was abandoned
+        """
+        preprocessing = tuple(profile[key] for key in PREPROCESS_KEYS)
+        misses, seconds = 0, 0.0
+        for index, (path, expected, whitelist) in enumerate(samples):
+            cached = preprocessed.get((preprocessing, index))
+            if cached is None:
+                started = self.clock()
+                image = self.reader.preprocess_image(Image.open(path), profile)
+                cached = preprocessed[(preprocessing, index)] = (image, self.clock() - started)
+            image, preprocess_seconds = cached
+            started = self.clock()
+            try:
+                text = self.reader.recognize(image, whitelist, profile)
+            except Exception:
+                text = None
+            seconds += preprocess_seconds + self.clock() - started
+            if text != expected:
+                misses += 1
+                if misses > max_misses:
+                    return None
+        return {'accuracy': round(1 - misses / len(samples), 4), 'ms': round(seconds * 1000 / len(samples), 2),
+                'misses': misses}
+
+    def tune(self, region, samples):
+        """
+        Returns:
+            tuple: (best profile, its result, result of DEFAULT_OCR_PROFILE)
+        """
+        allowed = int((1 - self.accuracy_target) * len(samples) + 1e-9)
+        preprocessed = {}
+        best = best_result = baseline = None
+        candidates = self.candidates()
+        for number, profile in enumerate(candidates, 1):
+            # Keep the most accurate candidate measurable while nothing reaches the target
+            limit = allowed if best_result is None or best_result['misses'] <= allowed \
+                else best_result['misses']
+            result = self.evaluate(profile, samples, len(samples) if baseline is None else limit, preprocessed)
+            if baseline is None:
+                baseline = result
+            if result is not None and (best_result is None or self._better(result, best_result, allowed)):
+                best, best_result = profile, result
+            if self.logger and number % 50 == 0:
+                self.logger.info(f"{region}: {number}/{len(candidates)} candidates, best so far {best_result}")
+        return best, best_result, baseline
+
+    @staticmethod
+    def _better(result, best, allowed):
+        if (result['misses'] <= allowed) != (best['misses'] <= allowed):
+            return result['misses'] <= allowed
+        if result['misses'] <= allowed:
+            return (result['ms'], result['misses']) < (best['ms'], best['misses'])
+        return (result['misses'], result['ms']) < (best['misses'], best['ms'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune the OCR profile of each region from labeled crops')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    tune = subparsers.add_parser('tune', help='Sweep profiles and store the fastest accurate one per region')
+    tune.add_argument('--labels', default=None, help='Labels file (default from settings.json)')
+    tune.add_argument('--region', action='append', help='Only tune this region (repeatable)')
+    tune.add_argument('--target', type=float, default=None, help='Accuracy target (default from settings.json)')
+    tune.add_argument('--dry-run', action='store_true', help='Show the results without saving them')
+    imports = subparsers.add_parser('import', help='Add the raw crops of a debug capture archive to a labels file')
+    imports.add_argument('directory')
+    imports.add_argument('--labels', required=True)
+    imports.add_argument('--region', default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('btd6.ocr_tuner')
+
+    if args.command == 'import':
+        count = import_debug_frames(args.directory, args.labels, args.region)
+        logger.info(f"Imported {count} crops into {args.labels}, check their labels before tuning")
+        return 0
+
+    settings = Settings()
+    tuning = settings.load_global_settings().get('ocr_tuning', {})
+    target = args.target if args.target is not None else tuning.get('accuracy_target', 0.98)
+    tuner = OcrTuner(tuning.get('grid'), target, logger)
+    if not tuner.grid['engine']:
+        logger.error("No OCR backend of the grid is installed (pytesseract or tesserocr)")
+        return 1
+    samples = load_labels(args.labels or tuning.get('labels', 'app/test_screenshots/labels.jsonl'))
+    machine_settings = settings.load_machine_settings()
+    profiles = machine_settings.setdefault('ocr_profiles', {})
+    for region, region_samples in sorted(samples.items()):
+        if args.region and region not in args.region:
+            continue
+        profile, result, baseline = tuner.tune(region, region_samples)
+        logger.info(f"{region}: default profile {baseline}, best {result} with {profile}")
+        if result['accuracy'] < target:
+            logger.warning(f"{region}: no profile reaches {target:.0%}, keeping the most accurate one")
+        profiles[region] = {**profile, 'tuned': {**result, 'samples': len(region_samples),
+                                                 'default': baseline, 'at': time.strftime('%Y-%m-%d %H:%M')}}
+    if not args.dry_run:
+        logger.info(f"Saved OCR profiles to {settings.save_machine_settings(machine_settings)}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,177 @@
+"""
+Per-thread profiling for long-running sessions.
+
+Each profiled thread gets its own cProfile instance, and a background sampler
+records collapsed stacks (flamegraph.pl / speedscope compatible) grouped by
+thread name, or by section name while a thread is inside a marked section such
+as input execution. Results are written on exit or when a dump is requested
+(e.g. via SIGUSR1).
+
+The module-level helpers are no-ops unless a SessionProfiler is active, so the
+hot paths can call them unconditionally.
+"""
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_active = None
+
+
+def get_active():
+    """Return the active SessionProfiler, or None when profiling is off."""
+    return _active
+
+
+def profile_thread(name=None):
+    """Profile the calling thread with cProfile for the duration of the block."""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.profile_thread(name)
+
+
+def section(name):
+    """Attribute stack samples taken inside the block to a named section."""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.section(name)
+
+
+def checkpoint():
+    """Safe point for a profiled thread to service pending dump requests."""
+    if _active is not None:
+        _active.checkpoint()
+
+
+class SessionProfiler:
+    """Collects cProfile stats and sampled stacks for every profiled thread."""
+
+    def __init__(self, output_dir, sample_interval=0.01, logger=None):
+        """
+        Args:
+            output_dir: Directory to write .pstats and .collapsed files into
+            sample_interval: Seconds between stack samples (0 disables sampling)
+            logger: Optional logger for dump notifications
+        """
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._profiles = {}       # thread name -> cProfile.Profile
+        self._sections = {}       # thread ident -> stack of section names
+        self._stacks = {}         # bucket name -> Counter of collapsed stacks
+        self._dump_generation = 0
+        self._thread_generation = {}
+        self._sampled_generation = 0
+        self._sampler = None
+        self._running = False
+
+    def start(self):
+        """Activate the profiler and start the stack sampler."""
+        global _active
+        _active = self
+        self._running = True
+        if self.sample_interval > 0:
+            self._sampler = threading.Thread(target=self._sample_loop,
+                                             name='ProfilerSampler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        """Stop sampling and write final results."""
+        global _active
+        self._running = False
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+        self.dump()
+        if _active is self:
+            _active = None
+
+    def request_dump(self):
+        """
+        Ask every profiled thread to flush its stats at its next checkpoint.
+        Safe to call from a signal handler.
+        """
+        self._dump_generation += 1
+
+    @contextlib.contextmanager
+    def profile_thread(self, name=None):
+        name = name or threading.current_thread().name
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles[name] = profile
+            self._thread_generation[name] = self._dump_generation
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            self._write_pstats(name, profile)
+
+    @contextlib.contextmanager
+    def section(self, name):
+        ident = threading.get_ident()
+        stack = self._sections.setdefault(ident, [])
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def checkpoint(self):
+        name = threading.current_thread().name
+        profile = self._profiles.get(name)
+        if profile is None or self._thread_generation.get(name) == self._dump_generation:
+            return
+        self._thread_generation[name] = self._dump_generation
+        # A cProfile instance can only be toggled from the thread it profiles
+        profile.disable()
+        self._write_pstats(name, profile)
+        profile.enable()
+
+    def dump(self):
+        """Write the collapsed stacks sampled so far, one file per bucket."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self._lock:
+            stacks = {bucket: Counter(counts) for bucket, counts in self._stacks.items()}
+        for bucket, counts in stacks.items():
+            path = os.path.join(self.output_dir, f'{bucket}.collapsed')
+            with open(path, 'w') as f:
+                for stack, count in counts.most_common():
+                    f.write(f'{stack} {count}\n')
+        if self.logger:
+            self.logger.info(f"Profile written to {os.path.abspath(self.output_dir)}")
+
+    def _write_pstats(self, name, profile):
+        os.makedirs(self.output_dir, exist_ok=True)
+        profile.dump_stats(os.path.join(self.output_dir, f'{name}.pstats'))
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while self._running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                sections = self._sections.get(ident)
+                bucket = sections[-1] if sections else names.get(ident, str(ident))
+                stack = self._collapse(frame)
+                with self._lock:
+                    self._stacks.setdefault(bucket, Counter())[stack] += 1
+            if self._sampled_generation != self._dump_generation:
+                self._sampled_generation = self._dump_generation
+                self.dump()
+            time.sleep(self.sample_interval)
+
+    @staticmethod
+    def _collapse(frame):
+        """Render a frame chain root-first as 'func (file:firstline);...'."""
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(parts))
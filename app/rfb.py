@@ -0,0 +1,655 @@
+"""
+RFB (VNC) capture: the game's screen read from a VNC server instead of the local display.
+
+Runners play inside VMs whose screens are reachable over VNC. RFBClient keeps one
+persistent connection, asks for the pixel format the bot uses (32 bit BGRX), and
+keeps an incremental framebuffer update request outstanding. A reader thread applies
+only the dirty rectangles of each update (Raw and CopyRect encodings, DesktopSize
+for resolution changes) into a preallocated NumPy framebuffer, so a capture is a
+slice of memory that is already up to date.
+
+Every update bumps a damage sequence number and records its rectangles. Consumers
+remember the sequence they read a region at and ask region_changed() later: when
+no rectangle touched the region since, ImageToTextReader reuses its last result and
+skips capture, preprocessing and OCR entirely.
+
+RFBBackend exposes the remote screen as the game "window" to WindowCapture (the
+game runs full screen in the VM). Select it with capture.backend "rfb" in
+settings.json. Input still goes through the configured input backend.
+
+MockRFBServer serves frames pushed with update(), sending dirty tiles only, for
+testing without a VNC server:
+    python -m app.fake_game --snapshot home.png && python -m app.rfb serve --image home.png --port 5901
+    python -m app.fake_game --rfb-port 5901
+    python -m app.rfb probe 127.0.0.1:5901
+"""
+import argparse
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from app.lazy import LazyModule, is_available
+from . import cpu_governor
+from .window_capture import CaptureBackend
+
+np = LazyModule('numpy')
+Image = LazyModule('PIL.Image')
+DES = LazyModule('Crypto.Cipher.DES')
+
+RAW = 0
+COPY_RECT = 1
+DESKTOP_SIZE = -223
+
+SECURITY_NONE = 1
+SECURITY_VNC = 2
+
+# 32 bits per pixel, depth 24, little endian true colour with red/green/blue at 16/8/0: BGRX bytes
+PIXEL_FORMAT = struct.pack('>BBBBHHHBBB3x', 32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
+
+# X keysyms of the non-character keys the bot presses
+KEYSYMS = {0x20: 'space', 0xff1b: 'esc', 0xff09: 'tab', 0xff0d: 'enter'}
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by the peer")
+        data += chunk
+    return bytes(data)
+
+
+def _read_reason(sock):
+    length, = struct.unpack('>I', _recv_exact(sock, 4))
+    return _recv_exact(sock, length).decode('utf-8', 'replace')
+
+
+def vnc_auth_response(password, challenge):
+    """DES-encrypt the server's challenge with the password, as VNC authentication expects."""
+    if not is_available('Crypto.Cipher.DES'):
+        raise ConnectionError("VNC password authentication needs pycryptodome: pip install pycryptodome")
+    # VNC uses the password's bits in reverse order within each byte as the DES key
+    key = bytes(int(f'{byte:08b}'[::-1], 2) for byte in password.encode('latin-1')[:8].ljust(8, b'\0'))
+    return DES.new(key, DES.MODE_ECB).encrypt(challenge)
+
+
+def _intersects(rect, x, y, width, height):
+    rx, ry, rw, rh = rect
+    return rx < x + width and x < rx + rw and ry < y + height and y < ry + rh
+
+
+class RFBClient:
+    """Persistent RFB connection mirroring the remote screen into a NumPy framebuffer."""
+
+    def __init__(self, host='127.0.0.1', port=5900, password=None, timeout=5.0, min_interval=0.0,
+                 damage_history=4096, logger=None):
+        """
+        Args:
+            host: VNC server host
+            port: VNC server port (5900 + display number)
+            password: Password for VNC authentication, None for servers without security
+            timeout: Seconds allowed for connecting and the handshake
+            min_interval: Seconds between update requests (0 asks again as soon as an update arrived),
+                          stretched while the CPU governor throttles
+            damage_history: Updates whose rectangles are kept for region_changed()
+            logger: Optional logger for connection problems
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.logger = logger
+        self.name = None
+        self.width = self.height = 0
+        self.framebuffer = None
+        self.connected = False
+        # Bumped by every applied update; tokens at or below forgotten have lost their damage history
+        self.sequence = 0
+        self.updates = 0
+        self.dirty_pixels = 0
+        self._forgotten = 0
+        self._damage = deque(maxlen=damage_history)
+        self._lock = threading.Condition()
+        self._socket = None
+        self._send_lock = threading.Lock()
+        self._thread = None
+
+    def connect(self):
+        """Connect, negotiate the pixel format and start receiving updates, waiting for the first one."""
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        try:
+            sock.settimeout(self.timeout)
+            self._handshake(sock)
+            sock.settimeout(None)
+        except BaseException:
+            sock.close()
+            raise
+        self._socket = sock
+        encodings = (RAW, COPY_RECT, DESKTOP_SIZE)
+        self._send(b'\x00\x00\x00\x00' + PIXEL_FORMAT)
+        self._send(struct.pack(f'>BxH{len(encodings)}i', 2, len(encodings), *encodings))
+        self.connected = True
+        self.request_update(incremental=False)
+        self._thread = threading.Thread(target=self._read_loop, name='RFBClient', daemon=True)
+        self._thread.start()
+        # The first update fills the whole framebuffer
+        self.wait_update(self._forgotten, self.timeout)
+
+    def _handshake(self, sock):
+        version = _recv_exact(sock, 12)
+        if not version.startswith(b'RFB '):
+            raise ConnectionError(f"Not a VNC server: {version!r}")
+        minor = min(int(version[8:11]), 8) if int(version[4:7]) == 3 else 8
+        minor = 3 if minor < 7 else minor
+        sock.sendall(f'RFB 003.{minor:03d}\n'.encode())
+
+        if minor == 3:
+            security, = struct.unpack('>I', _recv_exact(sock, 4))
+            if security == 0:
+                raise ConnectionError(f"VNC server refused the connection: {_read_reason(sock)}")
+        else:
+            count, = _recv_exact(sock, 1)
+            if count == 0:
+                raise ConnectionError(f"VNC server refused the connection: {_read_reason(sock)}")
+            offered = _recv_exact(sock, count)
+            if SECURITY_VNC in offered and self.password:
+                security = SECURITY_VNC
+            elif SECURITY_NONE in offered:
+                security = SECURITY_NONE
+            else:
+                raise ConnectionError(f"No supported VNC security type among {list(offered)}"
+                                      f"{'' if self.password else ' (is a password needed?)'}")
+            sock.sendall(bytes([security]))
+
+        if security == SECURITY_VNC:
+            if not self.password:
+                raise ConnectionError("VNC server requires a password")
+            sock.sendall(vnc_auth_response(self.password, _recv_exact(sock, 16)))
+        elif security != SECURITY_NONE:
+            raise ConnectionError(f"Unsupported VNC security type {security}")
+        if security == SECURITY_VNC or minor >= 8:
+            result, = struct.unpack('>I', _recv_exact(sock, 4))
+            if result != 0:
+                reason = _read_reason(sock) if minor >= 8 else 'authentication failed'
+                raise ConnectionError(f"VNC authentication failed: {reason}")
+
+        sock.sendall(b'\x01')  # Shared, other viewers stay connected
+        width, height = struct.unpack('>HH', _recv_exact(sock, 4))
+        _recv_exact(sock, 16)  # The server's pixel format, replaced by ours
+        self.name = _read_reason(sock)
+        self._resize(width, height)
+
+    def _resize(self, width, height):
+        with self._lock:
+            self.width, self.height = width, height
+            self.framebuffer = np.zeros((height, width, 4), dtype=np.uint8)
+            self.sequence += 1
+            self._forgotten = self.sequence
+            self._damage.clear()
+
+    def close(self):
+        self.connected = False
+        if self._socket:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.timeout)
+        self._thread = None
+
+    def _send(self, data):
+        with self._send_lock:
+            self._socket.sendall(data)
+
+    def request_update(self, incremental=True):
+        self._send(struct.pack('>BBHHHH', 3, int(incremental), 0, 0, self.width, self.height))
+
+    def _read_loop(self):
+        try:
+            while self.connected:
+                self._read_message()
+        except (OSError, ConnectionError, ValueError) as e:
+            if self.connected and self.logger:
+                self.logger.warning(f"VNC connection to {self.host}:{self.port} lost: {e}")
+        finally:
+            self.connected = False
+            with self._lock:
+                self._lock.notify_all()
+
+    def _read_message(self):
+        sock = self._socket
+        message_type, = _recv_exact(sock, 1)
+        if message_type == 0:
+            self._read_update(sock)
+            if self.min_interval:
+                time.sleep(self.min_interval * cpu_governor.throttle())
+            self.request_update()
+        elif message_type == 1:
+            _, count = struct.unpack('>xHH', _recv_exact(sock, 5))
+            _recv_exact(sock, count * 6)  # Colour map entries, unused with a true colour format
+        elif message_type == 2:
+            pass  # Bell
+        elif message_type == 3:
+            length, = struct.unpack('>3xI', _recv_exact(sock, 7))
+            _recv_exact(sock, length)  # Server clipboard
+        else:
+            raise ConnectionError(f"Unsupported VNC server message {message_type}")
+
+    def _read_update(self, sock):
+        count, = struct.unpack('>xH', _recv_exact(sock, 3))
+        rects = []
+        for _ in range(count):
+            x, y, width, height, encoding = struct.unpack('>HHHHi', _recv_exact(sock, 12))
+            if encoding == DESKTOP_SIZE:
+                self._resize(width, height)
+                rects.append((0, 0, width, height))
+                continue
+            if x + width > self.width or y + height > self.height:
+                raise ConnectionError(f"Rectangle {x},{y} {width}x{height} outside the "
+                                      f"{self.width}x{self.height} framebuffer")
+            if encoding == RAW:
+                # Received outside the lock, so captures never wait on the network
+                pixels = np.frombuffer(_recv_exact(sock, width * height * 4), dtype=np.uint8)
+                with self._lock:
+                    self.framebuffer[y:y + height, x:x + width] = pixels.reshape(height, width, 4)
+            elif encoding == COPY_RECT:
+                source_x, source_y = struct.unpack('>HH', _recv_exact(sock, 4))
+                with self._lock:
+                    self.framebuffer[y:y + height, x:x + width] = \
+                        self.framebuffer[source_y:source_y + height, source_x:source_x + width].copy()
+            else:
+                raise ConnectionError(f"Unsupported VNC encoding {encoding}")
+            rects.append((x, y, width, height))
+            self.dirty_pixels += width * height
+        with self._lock:
+            self.sequence += 1
+            self.updates += 1
+            if len(self._damage) == self._damage.maxlen:
+                self._forgotten = self._damage[0][0]
+            self._damage.append((self.sequence, rects))
+            self._lock.notify_all()
+
+    def region_changed(self, since, x, y, width, height):
+        """
+        Returns:
+            bool: Whether an update touched the region after sequence number since (True when unknown)
+        """
+        with self._lock:
+            if since is None or since < self._forgotten:
+                return True
+            for sequence, rects in reversed(self._damage):
+                if sequence <= since:
+                    return False
+                if any(_intersects(rect, x, y, width, height) for rect in rects):
+                    return True
+            return False
+
+    def wait_update(self, since, timeout):
+        """Block until an update after sequence number since arrived. Returns whether one did."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self.sequence > since or not self.connected, timeout) \
+                and self.sequence > since
+
+    def snapshot(self, x=0, y=0, width=None, height=None):
+        """
+        Returns:
+            ndarray: RGB copy of a region of the framebuffer, clipped to the screen
+        """
+        with self._lock:
+            width = self.width - x if width is None else width
+            height = self.height - y if height is None else height
+            return self.framebuffer[y:y + height, x:x + width, 2::-1].copy()
+
+
+class RFBBackend(CaptureBackend):
+    """The remote screen of a VNC server as the single window WindowCapture tracks."""
+
+    WINDOW_ID = 1
+    region_grabs = True
+    remote = True
+
+    def __init__(self, app_name, host='127.0.0.1', port=5900, password=None, timeout=5.0, min_interval=0.0,
+                 logger=None):
+        """
+        Args:
+            app_name: Name the remote screen is listed under, so the window tracker matches it
+            host, port, password, timeout, min_interval: See RFBClient
+            logger: Optional logger for connection problems
+        """
+        self.app_name = app_name
+        self.options = {'host': host, 'port': port, 'password': password, 'timeout': timeout,
+                        'min_interval': min_interval, 'logger': logger}
+        self.logger = logger
+        self.client = None
+        self._size = None
+
+    @classmethod
+    def from_settings(cls, rfb_settings, app_name, logger=None):
+        """Build from the capture.rfb section of settings.json."""
+        password = os.environ.get(rfb_settings.get('password_env', 'BTD6_VNC_PASSWORD')) \
+            or rfb_settings.get('password')
+        return cls(app_name, rfb_settings.get('host', '127.0.0.1'), rfb_settings.get('port', 5900), password,
+                   rfb_settings.get('timeout', 5.0), rfb_settings.get('min_interval', 0.0), logger)
+
+    def _connected(self):
+        if self.client and self.client.connected:
+            return True
+        if self.client:
+            self.client.close()
+        self.client = RFBClient(**self.options)
+        try:
+            self.client.connect()
+        except (OSError, ConnectionError) as e:
+            if self.logger:
+                self.logger.warning(f"Could not connect to VNC server {self.options['host']}:"
+                                    f"{self.options['port']}: {e}")
+            self.client = None
+            return False
+        self._size = (self.client.width, self.client.height)
+        return True
+
+    def _bounds(self):
+        return {'X': 0, 'Y': 0, 'Width': self.client.width, 'Height': self.client.height}
+
+    def list_windows(self):
+        if not self._connected():
+            return []
+        return [(self.WINDOW_ID, self.app_name, self.client.name, self._bounds())]
+
+    def window_bounds(self, window_id):
+        if window_id != self.WINDOW_ID or not (self.client and self.client.connected):
+            return None
+        return self._bounds()
+
+    def grab(self, window_id, bounds):
+        if not (self.client and self.client.connected):
+            return None
+        return Image.fromarray(self.client.snapshot())
+
+    def grab_region(self, window_id, bounds, x, y, width, height):
+        if not (self.client and self.client.connected):
+            return None
+        return Image.fromarray(self.client.snapshot(x, y, width, height))
+
+    def pending_changes(self, window_id):
+        if not (self.client and self.client.connected):
+            # Lost, the tracker rescans (and reconnects) with backoff
+            return [None]
+        size = (self.client.width, self.client.height)
+        if size == self._size:
+            return []
+        self._size = size
+        return [self._bounds()]
+
+    def damage_token(self, window_id):
+        return self.client.sequence if self.client and self.client.connected else None
+
+    def region_changed(self, window_id, since, x, y, width, height):
+        if not (self.client and self.client.connected):
+            return True
+        return self.client.region_changed(since, x, y, width, height)
+
+    def close(self):
+        if self.client:
+            self.client.close()
+            self.client = None
+
+
+class MockRFBServer:
+    """Minimal VNC server for tests: serves pushed frames as dirty tiles, without security."""
+
+    def __init__(self, host='127.0.0.1', port=0, name='BloonsTD6', tile=32, on_key=None, on_click=None,
+                 copy_rect=False):
+        """
+        Args:
+            host: Interface to listen on
+            port: Port to listen on, 0 picks a free one (see self.port)
+            name: Desktop name sent to clients
+            tile: Side of the tiles frames are compared in
+            on_key: Optional callback(key name) for key presses
+            on_click: Optional callback(x, y) for left clicks
+            copy_rect: Send tiles identical to the tile above them in the previous frame as CopyRect
+        """
+        self.name = name
+        self.tile = tile
+        self.on_key = on_key
+        self.on_click = on_click
+        self.copy_rect = copy_rect
+        self.updates_sent = 0
+        self.rects_sent = 0
+        self._frame = None
+        self._version = 0
+        self._changed = threading.Condition()
+        self._running = False
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self.port = self._socket.getsockname()[1]
+        self._thread = None
+
+    def update(self, image):
+        """Replace the served frame with a PIL Image or an RGB array."""
+        rgb = np.asarray(image.convert('RGB') if hasattr(image, 'convert') else image, dtype=np.uint8)
+        frame = np.zeros(rgb.shape[:2] + (4,), dtype=np.uint8)
+        frame[..., :3] = rgb[..., ::-1]
+        with self._changed:
+            self._frame = frame
+            self._version += 1
+            self._changed.notify_all()
+
+    def start(self):
+        self._socket.listen(2)
+        self._socket.settimeout(0.5)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, name='MockRFBServer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._changed:
+            self._changed.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._socket.close()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(connection,), name='MockRFBClient', daemon=True).start()
+
+    def _serve(self, connection):
+        state = {'request': None, 'open': True}
+        try:
+            connection.settimeout(None)
+            self._handshake(connection)
+            sender = threading.Thread(target=self._send_loop, args=(connection, state), daemon=True)
+            sender.start()
+            self._read_loop(connection, state)
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            state['open'] = False
+            with self._changed:
+                self._changed.notify_all()
+            connection.close()
+
+    def _handshake(self, connection):
+        connection.sendall(b'RFB 003.008\n')
+        minor = int(_recv_exact(connection, 12)[8:11])
+        if minor < 7:
+            connection.sendall(struct.pack('>I', SECURITY_NONE))
+        else:
+            connection.sendall(bytes([1, SECURITY_NONE]))
+            _recv_exact(connection, 1)
+            if minor >= 8:
+                connection.sendall(struct.pack('>I', 0))
+        _recv_exact(connection, 1)  # ClientInit
+        with self._changed:
+            self._changed.wait_for(lambda: self._frame is not None or not self._running)
+            height, width = self._frame.shape[:2]
+        name = self.name.encode()
+        connection.sendall(struct.pack('>HH', width, height) + PIXEL_FORMAT + struct.pack('>I', len(name)) + name)
+
+    def _read_loop(self, connection, state):
+        buttons = 0
+        while self._running:
+            message_type, = _recv_exact(connection, 1)
+            if message_type == 0:
+                _recv_exact(connection, 19)  # Only the BGRX format announced in ServerInit is served
+            elif message_type == 2:
+                count, = struct.unpack('>xH', _recv_exact(connection, 3))
+                _recv_exact(connection, count * 4)
+            elif message_type == 3:
+                incremental = _recv_exact(connection, 9)[0]
+                with self._changed:
+                    state['request'] = bool(incremental)
+                    self._changed.notify_all()
+            elif message_type == 4:
+                down, key = struct.unpack('>Bxxi', _recv_exact(connection, 7))
+                if down and self.on_key:
+                    self.on_key(KEYSYMS.get(key, chr(key) if key < 0x100 else hex(key)))
+            elif message_type == 5:
+                mask, x, y = struct.unpack('>BHH', _recv_exact(connection, 5))
+                if buttons & 1 and not mask & 1 and self.on_click:
+                    self.on_click(x, y)
+                buttons = mask
+            elif message_type == 6:
+                length, = struct.unpack('>3xI', _recv_exact(connection, 7))
+                _recv_exact(connection, length)
+            else:
+                raise ConnectionError(f"Unsupported VNC client message {message_type}")
+
+    def _send_loop(self, connection, state):
+        sent, sent_version = None, 0
+        while self._running and state['open']:
+            with self._changed:
+                self._changed.wait_for(lambda: not self._running or not state['open'] or (
+                    state['request'] is not None and (state['request'] is False or self._version != sent_version)),
+                    timeout=0.5)
+                if not self._running or not state['open'] or state['request'] is None:
+                    continue
+                incremental = state['request'] and sent is not None
+                if incremental and self._version == sent_version:
+                    continue
+                frame, sent_version = self._frame, self._version
+                state['request'] = None
+            message = self._encode(sent if incremental else None, frame)
+            if message is None:
+                # Identical frame pushed again, keep the request outstanding
+                with self._changed:
+                    if state['request'] is None:
+                        state['request'] = True
+                continue
+            try:
+                connection.sendall(message)
+            except OSError:
+                return
+            sent = frame
+
+    def _encode(self, previous, frame):
+        height, width = frame.shape[:2]
+        rects = []
+        if previous is None or previous.shape != frame.shape:
+            if previous is not None:
+                rects.append(struct.pack('>HHHHi', 0, 0, width, height, DESKTOP_SIZE))
+            rects.append(struct.pack('>HHHHi', 0, 0, width, height, RAW) + frame.tobytes())
+        else:
+            for x, y, w, h in self.dirty_rects(previous, frame):
+                if self.copy_rect and y >= h and np.array_equal(previous[y - h:y, x:x + w], frame[y:y + h, x:x + w]):
+                    # Content that scrolled down by one tile row
+                    rects.append(struct.pack('>HHHHiHH', x, y, w, h, COPY_RECT, x, y - h))
+                else:
+                    rects.append(struct.pack('>HHHHi', x, y, w, h, RAW) + frame[y:y + h, x:x + w].tobytes())
+        if not rects:
+            return None
+        self.updates_sent += 1
+        self.rects_sent += len(rects)
+        return struct.pack('>BxH', 0, len(rects)) + b''.join(rects)
+
+    def dirty_rects(self, previous, frame):
+        """Changed tiles, merged into runs along each tile row."""
+        height, width = frame.shape[:2]
+        tile = self.tile
+        changed = (previous != frame).any(axis=2)
+        rects = []
+        for y in range(0, height, tile):
+            row = changed[y:y + tile]
+            run_start = None
+            for x in range(0, width + tile, tile):
+                dirty = x < width and row[:, x:x + tile].any()
+                if dirty and run_start is None:
+                    run_start = x
+                elif not dirty and run_start is not None:
+                    rects.append((run_start, y, min(x, width) - run_start, min(tile, height - y)))
+                    run_start = None
+        return rects
+
+
+def probe(host, port, password=None, seconds=10.0):
+    """
+    Connect to a VNC server and measure its update stream.
+
+    Returns:
+        dict: Desktop name and size, updates per second and the dirty share of the screen
+    """
+    client = RFBClient(host, port, password)
+    client.connect()
+    try:
+        updates, dirty = client.updates, client.dirty_pixels
+        time.sleep(seconds)
+        updates, dirty = client.updates - updates, client.dirty_pixels - dirty
+        return {'name': client.name, 'size': [client.width, client.height],
+                'updates_per_second': round(updates / seconds, 2),
+                'dirty_fraction_per_update': round(dirty / updates / (client.width * client.height), 4)
+                if updates else 0.0}
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='VNC capture tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help='Serve an image with the mock VNC server')
+    serve.add_argument('--image', required=True)
+    serve.add_argument('--port', type=int, default=5901)
+    probe_parser = subparsers.add_parser('probe', help='Measure the update stream of a VNC server')
+    probe_parser.add_argument('address', help='host:port')
+    probe_parser.add_argument('--seconds', type=float, default=10.0)
+    probe_parser.add_argument('--password', default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('btd6.rfb')
+    if args.command == 'serve':
+        server = MockRFBServer(port=args.port)
+        server.update(Image.open(args.image))
+        server.start()
+        logger.info(f"Serving {args.image} on port {server.port}, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+
+    host, _, port = args.address.rpartition(':')
+    logger.info(str(probe(host or '127.0.0.1', int(port), args.password, args.seconds)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
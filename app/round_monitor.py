@@ -1,6 +1,12 @@
+import json
 import threading
 import time
+from . import cpu_governor, memory_monitor, profiler
+from .supervisor import heartbeat
 from .config import Settings
+from .lives_tracker import LivesTracker
+from .logger import RateLimiter
+from .round_tracker import RoundTracker
 from app.img_to_str_reader import ImageToTextReader
 
 class RoundMonitor:
@@ -10,10 +16,19 @@ class RoundMonitor:
     It notifies listeners when the round changes but doesn't know about specific actions.
     """
     def __init__(self, logger, img_reader=None, window_capture=None):
+        settings = Settings().load_global_settings()
+        self.round_tracker = RoundTracker(round_durations=settings.get('round_durations'))
         self.CUR_ROUND = 5 # Impoppable mode starts at round 6
         self.ROUND_COUNTER_FAILS = 0
+        # Optional JSON lines log of every reading, replayable with app/round_tracker.py
+        self.readings_log = settings.get('round_readings_log')
+        self.dump_after_fails = settings.get('debug_capture', {}).get('dump_after_fails', 10)
+        # Seconds between reads, stretched by the CPU governor; the main loop's thresholds use failing_for()
+        self.poll_interval = settings.get('poll_interval', 0.5)
         self._running = False
         self._thread = None
+        # Bumped when the supervisor replaces a stalled thread, so the old one exits once it wakes up
+        self._generation = 0
         self.logger = logger
         # Use provided img_reader (for background capture) or create default
         self.img_reader = img_reader if img_reader else ImageToTextReader()
@@ -21,6 +36,53 @@ class RoundMonitor:
         self.window_capture = window_capture
         # List to store callback functions that want to be notified of round changes
         self._round_change_callbacks = []
+        # The same rejected reading repeats every tick, keep it out of the log
+        self._rejected_reads = RateLimiter(logger, interval=30.0)
+        self._loop_errors = RateLimiter(logger, interval=30.0)
+        # Lives are read every lives_every polls while the round counter is readable, and for
+        # lives_grace seconds after it was last read, to catch the counter reaching 0 on defeat
+        lives_settings = settings.get('lives_monitor', {})
+        self.lives_every = lives_settings.get('every_polls', 1) if lives_settings.get('enabled', True) else 0
+        self.lives_grace = lives_settings.get('grace', 5.0)
+        self.lives_tracker = LivesTracker(lives_settings.get('confirm_reads', 2))
+        # HudReader to read the lives with, attached by GameController
+        self.lives_reader = None
+        self._lives_change_callbacks = []
+        self._polls = 0
+
+    @property
+    def CUR_ROUND(self):
+        """The last confirmed round."""
+        return self.round_tracker.round
+
+    @CUR_ROUND.setter
+    def CUR_ROUND(self, value):
+        # Setting the round (e.g. for a new map) restarts the tracker from there
+        self.round_tracker.reset(value)
+
+    @property
+    def ROUND_COUNTER_FAILS(self):
+        """Consecutive polls without a plausible round counter reading."""
+        return self._fails
+
+    @ROUND_COUNTER_FAILS.setter
+    def ROUND_COUNTER_FAILS(self, value):
+        # Resetting (a good reading, a new map, resuming) restarts the failure clock
+        if value == 0:
+            self._last_good = time.monotonic()
+        self._fails = value
+
+    def failing_for(self):
+        """
+        Seconds since the round counter was last read, 0 while it is readable. Unlike the fail
+        count, this does not depend on the poll interval, which the CPU governor stretches.
+        """
+        return time.monotonic() - self._last_good if self._fails else 0.0
+
+    def _record_reading(self, text, confidence):
+        if self.readings_log:
+            with open(self.readings_log, 'a') as f:
+                f.write(json.dumps({'t': time.time(), 'text': text, 'conf': confidence}) + '\n')
 
     def _get_region(self, x, y, width, height):
         """Return region coordinates as-is."""
@@ -33,6 +95,13 @@ class RoundMonitor:
         """
         self._round_change_callbacks.append(callback)
 
+    def add_lives_change_listener(self, callback):
+        """
+        Register a function to be called when a lives drop is confirmed.
+        The callback receives the event (LivesTracker.DROPPED or ZERO), the lives and the previous lives.
+        """
+        self._lives_change_callbacks.append(callback)
+
     def _notify_round_change(self):
         """
         Notify all registered listeners about the round change.
@@ -46,51 +115,90 @@ class RoundMonitor:
         Main counter function that runs in its own thread.
         Only responsible for incrementing the round and notifying listeners.
         """
-        while self._running:
-            settings = Settings().load_global_settings()
-            # Get the round counter region
-            region = self._get_region(
-                settings['button_positions']['ROUND_COUNTER'][0],
-                settings['button_positions']['ROUND_COUNTER'][1],
-                settings['button_positions']['ROUND_DIMENSIONS'][0],
-                settings['button_positions']['ROUND_DIMENSIONS'][1]
-            )
-            round_counter = self.img_reader.extract_text_from_region(
-                region[0], region[1], region[2], region[3]
-            )
-
-            if round_counter is not None:
-                round_counter = round_counter.split('/')
-
-            # Run validation for round counter since OCR can be unreliable
-            if (round_counter is not None 
-                and len(round_counter) > 1 # ensure we have a fraction
-                and round_counter[0].isdigit() # ensure the cur round is a number
-                and int(round_counter[0]) <= 100 # ensure the cur round is within bounds
-                and round_counter[1].isdigit() # ensure the total rounds is a number
-                and int(round_counter[1]) == 100 # ensure the total rounds is 100
-                and int(round_counter[0]) > self.CUR_ROUND # ensure the round has changed...
-                and int(round_counter[0]) < self.CUR_ROUND + 6 # ...but not by too much (max 5 ahead)
-                and int(round_counter[0]) != self.CUR_ROUND + 10
-                and int(round_counter[0]) != self.CUR_ROUND + 11
-                and int(round_counter[0]) != self.CUR_ROUND + 12): # special cases for Ravine/Workshop
-                self.CUR_ROUND = int(round_counter[0])
-                self._notify_round_change()
-                self.ROUND_COUNTER_FAILS = 0
-            else:
+        cpu_governor.lower_thread_priority()
+        with profiler.profile_thread():
+            self._poll_loop(self._generation)
+
+    def _poll_loop(self, generation):
+        while self._running and self._generation == generation:
+            profiler.checkpoint()
+            heartbeat()
+            memory_monitor.tick()
+            try:
+                self._poll_once()
+            except Exception as e:
+                # e.g. settings.json caught mid-save; count it as a failed read instead of dying
                 self.ROUND_COUNTER_FAILS += 1
+                self._loop_errors.warning(type(e).__name__, f"Round monitor error: {e!r}")
+            # Stretched while the bot is over its CPU budget
+            time.sleep(self.poll_interval * cpu_governor.throttle())
+
+    def _poll_once(self):
+        settings = Settings().load_global_settings()
+        # Get the round counter region
+        region = self._get_region(
+            settings['button_positions']['ROUND_COUNTER'][0],
+            settings['button_positions']['ROUND_COUNTER'][1],
+            settings['button_positions']['ROUND_DIMENSIONS'][0],
+            settings['button_positions']['ROUND_DIMENSIONS'][1]
+        )
+        text, confidence = self.img_reader.extract_text_with_confidence(
+            region[0], region[1], region[2], region[3], region_name='ROUND_COUNTER'
+        )
+        self._record_reading(text, confidence)
+
+        # OCR can be unreliable, so readings are voted on over time rather than trusted individually
+        status = self.round_tracker.update(text, confidence)
+        if status == RoundTracker.ADVANCED:
+            self._notify_round_change()
+            self.ROUND_COUNTER_FAILS = 0
+        elif status == RoundTracker.CONSISTENT:
+            self.ROUND_COUNTER_FAILS = 0
+        else:
+            self.ROUND_COUNTER_FAILS += 1
+            self._rejected_reads.debug(
+                status, f"Round counter reading {text!r} {status} (fails: {self.ROUND_COUNTER_FAILS})")
+            # Keep the frames leading up to an OCR stall for offline analysis
+            if self.img_reader.frame_dumper and self.ROUND_COUNTER_FAILS == self.dump_after_fails:
+                self.img_reader.frame_dumper.dump_recent(f'round counter stalled at {self.CUR_ROUND}')
+
+        self._polls += 1
+        if (self.lives_reader and self.lives_every and self._polls % self.lives_every == 0
+                and self.failing_for() <= self.lives_grace and not cpu_governor.in_burst()):
+            self._poll_lives()
 
-            time.sleep(.5)
+    def _poll_lives(self):
+        lives = self.lives_reader.read_lives()
+        event = self.lives_tracker.update(lives)
+        if event is None:
+            return
+        previous = self.lives_tracker.previous
+        self.logger.info(f"Lives {event}: {previous} -> {lives} at round {self.CUR_ROUND}")
+        for callback in self._lives_change_callbacks:
+            callback(event, lives, previous)
 
     def start_monitoring(self):
         """Start the round counter in a separate thread."""
         if not self._running:
             self._running = True
-            self._thread = threading.Thread(target=self.round_counter)
-            self._thread.start()
+            self._start_thread()
+
+    def restart_monitoring(self):
+        """
+        Replace a dead or stalled monitor thread. A stalled thread cannot be killed,
+        it exits on its own once whatever blocked it returns.
+        """
+        self._generation += 1
+        self._running = True
+        self._start_thread()
+
+    def _start_thread(self):
+        # Daemon, so a thread stuck in a blocking call cannot keep the process alive
+        self._thread = threading.Thread(target=self.round_counter, name='RoundMonitor', daemon=True)
+        self._thread.start()
 
     def stop_monitoring(self):
         """Safely stop the round counter."""
         self._running = False
         if self._thread:
-            self._thread.join()
\ No newline at end of file
+            self._thread.join(timeout=5)
\ No newline at end of file
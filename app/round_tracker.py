@@ -0,0 +1,204 @@
+"""
+Temporal round tracking from noisy round counter readings.
+
+Instead of accepting or rejecting each OCR reading on its own, readings are
+weighted by their OCR confidence and by how plausible the round is given the
+time since the last confirmed round, then voted on over a short window. The
+next round is confirmed from a single confident reading, larger jumps need
+agreeing readings, and misreads that never repeat are simply outvoted.
+
+Readings can be recorded as JSON lines ({"t": ..., "text": ..., "conf": ...})
+and replayed offline:
+    python -m app.round_tracker readings.jsonl
+"""
+import argparse
+import json
+import math
+import time
+from collections import deque
+
+# Approximate fast-forward durations of impoppable rounds in seconds, used when
+# settings.json has no "round_durations" override. Later rounds have more and
+# tougher bloons so they take longer to clear.
+DEFAULT_ROUND_DURATIONS = ((40, 10.0), (60, 14.0), (80, 18.0), (100, 22.0))
+
+
+def expected_round_duration(round, overrides=None):
+    """
+    Expected duration of a round in seconds.
+
+    Args:
+        round: Round number
+        overrides: Optional {round: seconds} mapping (keys may be strings)
+    """
+    if overrides and str(round) in overrides:
+        return overrides[str(round)]
+    for last_round, seconds in DEFAULT_ROUND_DURATIONS:
+        if round <= last_round:
+            return seconds
+    return DEFAULT_ROUND_DURATIONS[-1][1]
+
+
+def parse_round(text, final_round=100):
+    """Parse 'N/100' into N, or None if the text is not a valid round counter."""
+    if not text:
+        return None
+    parts = text.split('/')
+    if (len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit()
+            or int(parts[1]) != final_round or not 0 < int(parts[0]) <= final_round):
+        return None
+    return int(parts[0])
+
+
+class RoundTracker:
+    """Fuse consecutive round counter readings into a confirmed round."""
+
+    ADVANCED = 'advanced'      # a new round was confirmed
+    CONSISTENT = 'consistent'  # reading agrees with, or plausibly leads, the confirmed round
+    REJECTED = 'rejected'      # readable but implausible (e.g. 17 read as 27)
+    UNREADABLE = 'unreadable'  # no round counter in the reading
+
+    def __init__(self, start_round=5, window=6, confirm_score=1.2, fast_confirm=0.6,
+                 max_jump=20, default_confidence=0.7, round_durations=None, clock=time.monotonic):
+        """
+        Args:
+            start_round: Round to start from (impoppable starts at round 6)
+            window: Number of recent readings that vote
+            confirm_score: Summed weight needed to confirm a round
+            fast_confirm: Weight at which a single reading of the next round is enough
+            max_jump: Rounds ahead beyond which a reading is never accepted
+            default_confidence: Confidence assumed when the reader gives none
+            round_durations: Optional per-round duration overrides in seconds
+            clock: Time source, replaced when replaying recorded readings
+        """
+        self.window = window
+        self.confirm_score = confirm_score
+        self.fast_confirm = fast_confirm
+        self.max_jump = max_jump
+        self.default_confidence = default_confidence
+        self.round_durations = round_durations
+        self.clock = clock
+        self.stats = {self.ADVANCED: 0, self.CONSISTENT: 0, self.REJECTED: 0, self.UNREADABLE: 0}
+        self.reset(start_round)
+
+    def reset(self, round):
+        """Forget pending readings and treat round as confirmed as of now."""
+        self.round = round
+        self.confirmed_at = self.clock()
+        self._readings = deque(maxlen=self.window)
+
+    def expected_advance(self, now):
+        """How many rounds the game has likely progressed since the confirmed round."""
+        elapsed = now - self.confirmed_at
+        advance, round = 0.0, self.round
+        while elapsed > 0 and round < 100:
+            duration = expected_round_duration(round, self.round_durations)
+            step = min(1.0, elapsed / duration)
+            advance += step
+            elapsed -= duration
+            round += 1
+        return advance
+
+    def plausibility(self, candidate, now):
+        """
+        Prior weight (0-1) for a reading of candidate given the elapsed time.
+        Rounds up to one past the expected advance are fully plausible, further
+        jumps decay exponentially.
+        """
+        jump = candidate - self.round
+        if jump <= 0 or jump > self.max_jump:
+            return 0.0
+        allowed = max(1.0, self.expected_advance(now) + 1.0)
+        if jump <= allowed:
+            return 1.0
+        return math.exp(-(jump - allowed))
+
+    def update(self, text, confidence=None, now=None):
+        """
+        Feed one reading.
+
+        Args:
+            text: Raw round counter text ('12/100'), or None if OCR failed
+            confidence: OCR confidence 0-1, or None if unknown
+            now: Timestamp of the reading (defaults to the tracker clock)
+
+        Returns:
+            str: ADVANCED, CONSISTENT, REJECTED or UNREADABLE
+        """
+        now = self.clock() if now is None else now
+        candidate = parse_round(text)
+        if candidate is None:
+            return self._count(self.UNREADABLE)
+        if candidate == self.round:
+            return self._count(self.CONSISTENT)
+
+        confidence = self.default_confidence if confidence is None else confidence
+        weight = confidence * self.plausibility(candidate, now)
+        if weight <= 0:
+            return self._count(self.REJECTED)
+        self._readings.append((now, candidate, weight))
+
+        if candidate == self.round + 1 and weight >= self.fast_confirm:
+            return self._advance(candidate, now)
+
+        scores = {}
+        for _, round, round_weight in self._readings:
+            scores[round] = scores.get(round, 0.0) + round_weight
+        best = max(scores, key=scores.get)
+        if best > self.round and scores[best] >= self.confirm_score:
+            return self._advance(best, now)
+        if weight < 0.1:
+            return self._count(self.REJECTED)
+        return self._count(self.CONSISTENT)
+
+    def _advance(self, round, now):
+        self.round = round
+        self.confirmed_at = now
+        # Drop readings that can no longer win (at or below the new round)
+        self._readings = deque((r for r in self._readings if r[1] > round), maxlen=self.window)
+        return self._count(self.ADVANCED)
+
+    def _count(self, status):
+        self.stats[status] += 1
+        return status
+
+
+def replay(path, start_round=5, round_durations=None, region='ROUND_COUNTER'):
+    """
+    Replay recorded readings through a fresh tracker.
+
+    Args:
+        path: JSON lines file with "t", "text" and optional "conf" per reading
+              (a FrameDumper index.jsonl works too, lines for other regions are skipped)
+        start_round: Round confirmed before the first reading
+        region: Region to replay when lines carry a "region" field
+
+    Returns:
+        Tuple of (list of (t, round) confirmations, tracker stats)
+    """
+    readings = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                reading = json.loads(line)
+                if reading.get('region', region) == region:
+                    readings.append(reading)
+    start_time = readings[0]['t'] if readings else 0.0
+    tracker = RoundTracker(start_round, round_durations=round_durations, clock=lambda: start_time)
+    confirmations = []
+    for reading in readings:
+        if tracker.update(reading.get('text'), reading.get('conf'), reading['t']) == RoundTracker.ADVANCED:
+            confirmations.append((reading['t'], tracker.round))
+    return confirmations, tracker.stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded round counter readings')
+    parser.add_argument('readings', help='JSON lines file written by RoundMonitor or a FrameDumper index.jsonl')
+    parser.add_argument('--start-round', type=int, default=5)
+    args = parser.parse_args()
+
+    confirmations, stats = replay(args.readings, args.start_round)
+    for t, round in confirmations:
+        print(f"{t:10.2f}  round {round}")
+    print(f"Stats: {stats}")
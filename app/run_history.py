@@ -0,0 +1,113 @@
+"""
+Local SQLite store of every run the bot played.
+
+Each run records the route it was started through (see app/map_scheduler.py),
+the map, difficulty and hero, wall-clock start and end, the seconds spent in
+each phase (menu navigation, start instructions, rounds, end of map), the
+outcome and the points earned. The map scheduler derives win rates and run
+durations per route from it. A connection is opened per call, so runs can be
+recorded from the round monitor thread as well as the main loop.
+"""
+import json
+import sqlite3
+from contextlib import closing
+
+VICTORY = 'victory'
+DEFEAT = 'defeat'
+ABORTED = 'aborted'  # left without a win or a defeat screen (e.g. the game was closed)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    route TEXT NOT NULL,
+    map TEXT,
+    difficulty TEXT,
+    hero TEXT,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    final_round INTEGER,
+    resumed INTEGER NOT NULL DEFAULT 0,
+    phases TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS runs_route ON runs (route, id);
+"""
+
+
+class RunHistory:
+    """Append-only run log."""
+
+    def __init__(self, path='run_history.sqlite3'):
+        """
+        Args:
+            path: SQLite database file, created on first use
+        """
+        self.path = path
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def record(self, route, map_name, difficulty, hero, started_at, ended_at, outcome, points=0,
+               final_round=None, resumed=False, phases=None):
+        """
+        Store one finished run.
+
+        Args:
+            route: Scheduler route the run was started through
+            started_at, ended_at: Wall-clock timestamps (time.time())
+            outcome: VICTORY, DEFEAT or ABORTED
+            points: Collection points earned
+            final_round: Last confirmed round
+            resumed: The run was resumed after a restart, so its phases are incomplete
+            phases: {phase: seconds}
+
+        Returns:
+            int: Row id of the run
+        """
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                'INSERT INTO runs (route, map, difficulty, hero, started_at, ended_at, outcome, points,'
+                ' final_round, resumed, phases) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (route, map_name, difficulty, hero, started_at, ended_at, outcome, points,
+                 final_round, int(resumed), json.dumps(phases or {})))
+            return cursor.lastrowid
+
+    def recent(self, route=None, limit=50):
+        """
+        The most recent runs, newest first.
+
+        Returns:
+            list: One dict per run with phases parsed
+        """
+        query = 'SELECT * FROM runs'
+        args = []
+        if route is not None:
+            query += ' WHERE route = ?'
+            args.append(route)
+        query += ' ORDER BY id DESC LIMIT ?'
+        args.append(limit)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, args).fetchall()
+        return [{**dict(row), 'phases': json.loads(row['phases'])} for row in rows]
+
+    def route_stats(self, route, window=50):
+        """
+        Aggregates over the last window complete (not resumed) runs of a route.
+
+        Returns:
+            dict: runs, wins, defeats, total_seconds, victory_points
+        """
+        runs = [run for run in self.recent(route, window) if not run['resumed']]
+        wins = [run for run in runs if run['outcome'] == VICTORY]
+        return {
+            'runs': len(runs),
+            'wins': len(wins),
+            'defeats': sum(1 for run in runs if run['outcome'] == DEFEAT),
+            'total_seconds': sum(run['ended_at'] - run['started_at'] for run in runs),
+            'victory_points': sum(run['points'] for run in wins),
+        }
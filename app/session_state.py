@@ -0,0 +1,66 @@
+"""
+Durable session state for resuming after a crash or restart.
+
+The current map, confirmed round, executed milestones, cash steps taken,
+emergency instructions run and collection points are written to a small JSON file on every change. Writes go
+to a temporary file that is fsynced and then renamed over the old one, so a
+crash mid-write leaves the previous state intact.
+"""
+import json
+import os
+import threading
+import time
+
+DEFAULT_STATE = {
+    'map': None,
+    'route': None,
+    'round': None,
+    'in_progress': False,
+    'start_done': False,
+    'start_steps_done': 0,
+    'executed_milestones': [],
+    'cash_steps_done': 0,
+    'emergency_done': [],
+    'points': None,
+}
+
+
+class SessionState:
+    """Atomically persisted key/value state of the current run."""
+
+    def __init__(self, path='session_state.json'):
+        """
+        Args:
+            path: JSON file to persist the state to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = dict(DEFAULT_STATE)
+        self.load()
+
+    def load(self):
+        """Load the persisted state, keeping defaults for a missing or corrupt file."""
+        try:
+            with open(self.path, 'r') as f:
+                self.data = {**DEFAULT_STATE, **json.load(f)}
+        except (OSError, ValueError):
+            self.data = dict(DEFAULT_STATE)
+        return self.data
+
+    def get(self, key, default=None):
+        value = self.data.get(key)
+        return default if value is None else value
+
+    def update(self, **changes):
+        """Apply changes and persist them if anything changed."""
+        with self._lock:
+            if all(self.data.get(key) == value for key, value in changes.items()):
+                return
+            self.data.update(changes)
+            self.data['updated'] = time.time()
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
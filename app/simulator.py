@@ -0,0 +1,129 @@
+"""
+Dry-run strategies on a virtual clock to check their timing budgets.
+
+A GameController is driven through a whole map with a recording input backend
+and a virtual clock, so every hard-coded sleep is accounted for without
+actually sleeping. For each milestone the time its actions take is compared
+with how long the game takes to reach the next milestone round.
+
+Usage (from the repository root):
+    python -m app.simulator                 # all maps
+    python -m app.simulator RAVINE OUCH     # selected maps
+    python -m app.simulator --fail-on-overlap
+"""
+import argparse
+import json
+import logging
+import sys
+from .config import Settings
+from .game_controller import GameController
+from .input_backends import RecordingBackend
+from .round_monitor import RoundMonitor
+from .round_tracker import expected_round_duration
+
+
+class VirtualClock:
+    """Drop-in for the time module that advances instead of sleeping."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def simulate_map(map_name, global_settings, logger=None):
+    """
+    Run one map's strategy on a virtual clock.
+
+    Args:
+        map_name: Map folder name under app/config/maps
+        global_settings: Parsed settings.json
+        logger: Optional logger (defaults to a silent one)
+
+    Returns:
+        dict: Start phase time, per-milestone timings and overlap summary
+    """
+    logger = logger or logging.getLogger('btd6.simulator')
+    clock = VirtualClock()
+    recorder = RecordingBackend(clock)
+    round_monitor = RoundMonitor(logger)
+    controller = GameController(round_monitor, logger, background_mode=False,
+                                input_backend=recorder, clock=clock)
+    controller.map = map_name
+    controller.scheduling = 'milestones'
+    durations = global_settings.get('round_durations')
+
+    controller.run_start_map_instructions()
+    start_time = clock.now
+
+    map_settings = controller.map_settings
+    milestones = list(map_settings['instructions']['milestones'])
+    results = []
+    for index, milestone in enumerate(milestones):
+        next_round = milestones[index + 1] if index + 1 < len(milestones) else 100
+        budget = sum(expected_round_duration(r, durations) for r in range(milestone, next_round))
+        began, events_before = clock.now, len(recorder.events)
+        controller.handle_round_change(milestone)
+        action_time = clock.now - began
+        results.append({
+            'round': milestone,
+            'instructions': map_settings['instructions'][str(milestone)],
+            'events': len(recorder.events) - events_before,
+            'action_time': round(action_time, 2),
+            'budget': round(budget, 2),
+            'overlap': round(max(0.0, action_time - budget), 2),
+        })
+
+    return {
+        'map': map_name,
+        'start_time': round(start_time, 2),
+        'milestones': results,
+        'total_action_time': round(sum(r['action_time'] for r in results), 2),
+        'overlaps': [r['round'] for r in results if r['overlap'] > 0],
+    }
+
+
+def format_report(report):
+    lines = [f"{report['map']}: start {report['start_time']:.1f}s, "
+             f"milestones {report['total_action_time']:.1f}s total, "
+             f"{len(report['overlaps'])} overlaps"]
+    for r in report['milestones']:
+        flag = f"  OVERLAP +{r['overlap']:.1f}s" if r['overlap'] else ''
+        lines.append(f"  round {r['round']:>3}: {r['action_time']:6.1f}s of "
+                     f"{r['budget']:6.1f}s budget ({r['events']} events){flag}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dry-run map strategies on a virtual clock')
+    parser.add_argument('maps', nargs='*', help='Map folders to simulate (default: all)')
+    parser.add_argument('--json', action='store_true', help='Print reports as JSON')
+    parser.add_argument('--fail-on-overlap', action='store_true',
+                        help='Exit with status 1 if any milestone overruns its budget')
+    args = parser.parse_args(argv)
+
+    settings = Settings()
+    global_settings = settings.load_global_settings()
+    map_names = args.maps or sorted(settings.get_available_maps())
+    reports = [simulate_map(map_name, global_settings) for map_name in map_names]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print(format_report(report))
+
+    if args.fail_on_overlap and any(report['overlaps'] for report in reports):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
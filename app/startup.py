@@ -0,0 +1,81 @@
+"""
+Concurrent warm-up run once before the first map.
+
+Warming the OCR engine, loading/validating every strategy and locating the
+game window are independent and mostly I/O bound, so they run in parallel and
+the total is checked against the configured startup budget.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import Settings
+
+
+def _timed(task, *args):
+    start = time.perf_counter()
+    result = task(*args)
+    return result, time.perf_counter() - start
+
+
+def _load_and_validate_strategies(global_settings):
+    settings = Settings()
+    all_map_settings = settings.load_all_map_settings()
+    return {map_name: settings.validate_map_settings(map_settings, global_settings)
+            for map_name, map_settings in all_map_settings.items()}
+
+
+def warm_start(logger, global_settings, img_reader, window_capture=None):
+    """
+    Warm up OCR, validate strategies and locate the game window concurrently.
+
+    Args:
+        logger: Logger to report results to
+        global_settings: Parsed settings.json
+        img_reader: ImageToTextReader to warm up
+        window_capture: Optional WindowCapture to locate the game window with
+
+    Returns:
+        dict: Strategy problems keyed by map name (maps without problems omitted)
+    """
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix='Startup') as pool:
+        ocr = pool.submit(_timed, img_reader.warm_up)
+        strategies = pool.submit(_timed, _load_and_validate_strategies, global_settings)
+        window = pool.submit(_timed, window_capture.find_window) if window_capture else None
+
+        try:
+            version, elapsed = ocr.result()
+            logger.info(f"OCR warmed up in {elapsed:.2f}s (Tesseract {version})")
+        except Exception as e:
+            logger.error(f"OCR warm-up failed: {e}")
+
+        problems = {}
+        try:
+            results, elapsed = strategies.result()
+            problems = {map_name: errors for map_name, errors in results.items() if errors}
+            logger.info(f"Loaded {len(results)} strategies in {elapsed:.2f}s")
+            for map_name, errors in problems.items():
+                for error in errors:
+                    logger.warning(f"Strategy {map_name}: {error}")
+        except Exception as e:
+            logger.error(f"Loading strategies failed: {e}")
+
+        if window:
+            try:
+                (window_id, bounds), elapsed = window.result()
+                if window_id:
+                    logger.info(f"Found game window {window_id} in {elapsed:.2f}s: {bounds}")
+                else:
+                    logger.warning(f"Game window not found ({elapsed:.2f}s)")
+            except Exception as e:
+                logger.error(f"Locating game window failed: {e}")
+
+    return problems
+
+
+def report_startup_time(logger, start_time, budget):
+    """Log how long startup took against the configured budget (seconds)."""
+    elapsed = time.perf_counter() - start_time
+    if budget is not None and elapsed > budget:
+        logger.warning(f"Startup took {elapsed:.2f}s, over the {budget:.2f}s budget")
+    else:
+        logger.info(f"Startup took {elapsed:.2f}s" + (f" (budget {budget}s)" if budget is not None else ""))
+    return elapsed
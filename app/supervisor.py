@@ -0,0 +1,199 @@
+"""
+Watchdog for the worker threads of an unattended session.
+
+Every supervised thread calls heartbeat() from its loop, announcing long
+sleeps with heartbeat(expected=seconds). A supervisor thread checks each
+component every check_interval seconds. A thread that died, or that has not
+beaten for stall_timeout seconds beyond what it announced, is restarted with
+exponential backoff. The round monitor gets a fresh thread; the main loop
+cannot be replaced in-process, so its restart re-executes the bot, which then
+resumes the game from the session state. Every incident, including the stack
+the stalled thread was stuck in, is appended to a JSON lines file.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+_active = None
+
+
+def heartbeat(expected=0.0):
+    """
+    Mark the calling thread as alive.
+
+    Args:
+        expected: Seconds the thread may stay silent beyond the stall timeout
+                  before its next beat (e.g. before a long sleep)
+    """
+    if _active is not None:
+        _active.beat(threading.current_thread().name, expected)
+
+
+def restart_process(logger=None):
+    """Replace this process with a fresh run of the same command line."""
+    if logger:
+        logger.critical(f"Restarting the bot: {sys.executable} {' '.join(sys.argv)}")
+    from .logger import stop_logging
+    stop_logging()
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+class _Component:
+    def __init__(self, name, thread, restart, stall_timeout, now):
+        self.name = name
+        self.thread = thread
+        self.restart = restart
+        self.stall_timeout = stall_timeout
+        self.last_beat = now
+        self.expected = 0.0
+        self.restarts = 0
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        self.healthy_since = now
+
+
+class Supervisor:
+    """Detect dead or stalled threads and restart them with backoff."""
+
+    DEAD = 'dead'
+    STALLED = 'stalled'
+
+    def __init__(self, logger, incidents_path='incidents.jsonl', check_interval=1.0, stall_timeout=15.0,
+                 min_backoff=1.0, max_backoff=60.0, clock=time.monotonic):
+        """
+        Args:
+            logger: Logger for incidents
+            incidents_path: JSON lines file incidents are appended to (None to only log them)
+            check_interval: Seconds between checks
+            stall_timeout: Default seconds without a heartbeat before a thread counts as stalled
+            min_backoff, max_backoff: Bounds of the delay between restarts of the same component;
+                                      the delay resets once it has been healthy for max_backoff
+            clock: Time source
+        """
+        self.logger = logger
+        self.incidents_path = incidents_path
+        self.check_interval = check_interval
+        self.stall_timeout = stall_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.incidents = 0
+        self._components = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def watch(self, name, thread, restart, stall_timeout=None):
+        """
+        Args:
+            name: Thread name the component beats under
+            thread: Callable returning the component's current Thread (or None)
+            restart: Callable that replaces the thread
+            stall_timeout: Override of the default stall timeout
+        """
+        with self._lock:
+            self._components[name] = _Component(name, thread, restart, stall_timeout or self.stall_timeout,
+                                                 self.clock())
+
+    def beat(self, name, expected=0.0):
+        component = self._components.get(name)
+        if component is not None:
+            component.last_beat = self.clock()
+            component.expected = expected
+
+    def start(self):
+        global _active
+        _active = self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='Supervisor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        global _active
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if _active is self:
+            _active = None
+
+    def _run(self):
+        while self._running:
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.exception(f"Supervisor check failed: {e}")
+            time.sleep(self.check_interval)
+
+    def check(self):
+        """
+        Check every component once, restarting the failed ones whose backoff has elapsed.
+
+        Returns:
+            list: Incidents handled during this check
+        """
+        handled = []
+        now = self.clock()
+        with self._lock:
+            components = list(self._components.values())
+        for component in components:
+            thread = component.thread()
+            silent = now - component.last_beat
+            if thread is None or not thread.is_alive():
+                kind = self.DEAD
+            elif silent > component.stall_timeout + component.expected:
+                kind = self.STALLED
+            else:
+                if component.backoff and now - component.healthy_since >= self.max_backoff:
+                    component.backoff = 0.0
+                continue
+            if now < component.retry_at:
+                continue
+            handled.append(self._handle(component, kind, thread, silent, now))
+        return handled
+
+    def _handle(self, component, kind, thread, silent, now):
+        component.restarts += 1
+        component.backoff = min(self.max_backoff, component.backoff * 2 if component.backoff else self.min_backoff)
+        component.retry_at = now + component.backoff
+        incident = {
+            't': time.time(),
+            'component': component.name,
+            'kind': kind,
+            'silent_for': round(silent, 2),
+            'restarts': component.restarts,
+            'next_backoff': component.backoff,
+            'stack': self._stack(thread) if kind == self.STALLED else None,
+        }
+        self.incidents += 1
+        self.logger.error(f"{component.name} {kind} (no heartbeat for {silent:.1f}s), "
+                          f"restart #{component.restarts}")
+        if incident['stack']:
+            self.logger.error(f"{component.name} was stuck in:\n{incident['stack']}")
+        # Recorded first, restarting the main loop replaces the process
+        self._record(incident)
+        try:
+            component.restart()
+        except Exception as e:
+            self.logger.exception(f"Restarting {component.name} failed: {e}")
+        # Give the new thread a full timeout to produce its first beat
+        component.last_beat = component.healthy_since = self.clock()
+        component.expected = 0.0
+        return incident
+
+    @staticmethod
+    def _stack(thread):
+        frame = sys._current_frames().get(thread.ident) if thread else None
+        return ''.join(traceback.format_stack(frame)) if frame else None
+
+    def _record(self, incident):
+        if not self.incidents_path:
+            return
+        try:
+            with open(self.incidents_path, 'a') as f:
+                f.write(json.dumps(incident) + '\n')
+        except OSError as e:
+            self.logger.error(f"Could not record incident: {e}")
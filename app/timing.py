@@ -0,0 +1,241 @@
+"""
+Per-machine UI timing profile and its calibration.
+
+GameController waits a named delay after each interaction instead of a
+hard-coded sleep. Without a profile the delays are the values the bot was
+tuned with on one VM (DEFAULT_DELAYS). Calibration measures how long the game
+actually takes to react on this machine - key press to placement ghost, click
+to upgrade panel, click to screen transition - by diffing frames of the
+affected region until they change, and stores the results in
+app/config/machine/<hostname>.json. The calibrated delays are the slowest
+measured reaction times scaled by a safety margin.
+
+Calibrate with the game open on the home screen:
+    python -m app.timing --calibrate
+"""
+import argparse
+import logging
+import statistics
+import time
+from app.lazy import LazyModule
+from .config import Settings
+
+np = LazyModule('numpy')
+
+# Seconds waited after each interaction when there is no calibration
+DEFAULT_DELAYS = {
+    'focus': 0.3,               # after bringing the game to the front
+    'menu_click': 0.5,          # after clicking a menu button
+    'instruction_gap': 0.5,     # between strategy instructions
+    'hero_menu': 1.0,           # hero placement menu
+    'placement_ghost': 1.0,     # tower shortcut until the placement ghost follows the cursor
+    'upgrade_panel': 1.0,       # click on a tower until its upgrade panel is shown
+    'upgrade_press': 0.5,       # around each upgrade shortcut
+    'upgrade_close': 0.3,       # before closing the upgrade panel
+    'targeting_panel': 0.5,     # click on a tower before changing targeting
+    'targeting_press': 0.1,     # between targeting changes
+    'screen_transition': 1.0,   # end of game and insta collection screens
+    'home_transition': 2.0,     # back to the home screen
+    'map_select': 0.3,          # map and difficulty selection screens
+    'map_load': 4.0,            # map loading
+    'map_start': 3.0,           # before the start instructions of a map
+    'fast_forward': 0.5,        # between the two presses that start the game on fast forward
+}
+
+# Measured interaction -> delays it determines
+CALIBRATED_DELAYS = {
+    'placement_ghost': ('placement_ghost', 'hero_menu'),
+    'upgrade_panel': ('upgrade_panel', 'targeting_panel'),
+    'screen_transition': ('screen_transition', 'map_select', 'menu_click'),
+}
+
+
+class TimingProfile:
+    """Named UI delays, calibrated ones scaled by a safety margin."""
+
+    def __init__(self, measurements=None, margin=0.5, padding=0.05, overrides=None):
+        """
+        Args:
+            measurements: {interaction: {'max': seconds, ...}} from calibrate()
+            margin: Fraction added to a measured reaction time
+            padding: Seconds added on top of the margin
+            overrides: {delay name: seconds} applied before calibration (e.g. focus_delay)
+        """
+        self.delays = {**DEFAULT_DELAYS, **(overrides or {})}
+        self.measurements = measurements or {}
+        for interaction, names in CALIBRATED_DELAYS.items():
+            if interaction in self.measurements:
+                measured = self.measurements[interaction]['max'] * (1 + margin) + padding
+                for name in names:
+                    self.delays[name] = round(measured, 3)
+
+    def delay(self, name):
+        return self.delays[name]
+
+    def scale(self, names, factor):
+        """Multiply the named delays by factor."""
+        for name in names:
+            self.delays[name] = round(self.delays[name] * factor, 3)
+
+    @classmethod
+    def for_machine(cls, global_settings):
+        """Load the timing profile of this machine, or the defaults if it was never calibrated."""
+        calibration = global_settings.get('calibration', {})
+        overrides = {'focus': global_settings['focus_delay']} if 'focus_delay' in global_settings else None
+        machine_settings = Settings().load_machine_settings()
+        return cls(machine_settings.get('timing'), calibration.get('margin', 0.5),
+                   calibration.get('padding', 0.05), overrides)
+
+
+def frame_difference(before, after):
+    """Mean absolute grayscale difference of two equally sized images (0-255)."""
+    a = np.asarray(before.convert('L'), dtype=np.int16)
+    b = np.asarray(after.convert('L'), dtype=np.int16)
+    return float(np.abs(a - b).mean())
+
+
+def measure_reaction(capture, action, threshold=8.0, timeout=5.0, clock=time.perf_counter):
+    """
+    Time from an action until the captured region changes.
+
+    Args:
+        capture: Callable returning a PIL Image of the watched region
+        action: Callable performing the interaction
+        threshold: Mean pixel difference that counts as a reaction
+        timeout: Seconds to wait before giving up
+
+    Returns:
+        float: Reaction time in seconds, or None on timeout
+    """
+    baseline = capture()
+    started = clock()
+    action()
+    while clock() - started < timeout:
+        if frame_difference(baseline, capture()) >= threshold:
+            return clock() - started
+    return None
+
+
+def summarize(samples):
+    """Median/max/count of the successful samples, or None if all timed out."""
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    return {'median': round(statistics.median(samples), 4), 'max': round(max(samples), 4),
+            'samples': len(samples)}
+
+
+class Calibrator:
+    """Measure the game's reaction times through a GameController."""
+
+    def __init__(self, game_controller, global_settings, logger):
+        """
+        Args:
+            game_controller: GameController with a working img_reader and input
+            global_settings: Parsed settings.json with a "calibration" section
+            logger: Logger for progress
+        """
+        self.controller = game_controller
+        self.settings = global_settings.get('calibration', {})
+        self.positions = global_settings['button_positions']
+        self.shortcuts = global_settings['tower_shortcuts']
+        self.logger = logger
+        self.samples = self.settings.get('samples', 5)
+        self.threshold = self.settings.get('diff_threshold', 8.0)
+        self.timeout = self.settings.get('timeout', 5.0)
+
+    def _capture(self, x, y, width, height):
+        return lambda: self.controller.img_reader.take_screenshot(x, y, width, height)
+
+    def _measure(self, name, capture, action, reset):
+        samples = []
+        for i in range(self.samples):
+            samples.append(measure_reaction(capture, action, self.threshold, self.timeout))
+            self.logger.info(f"{name} sample {i + 1}/{self.samples}: {samples[-1]}")
+            reset()
+            time.sleep(DEFAULT_DELAYS['screen_transition'])
+        return summarize(samples)
+
+    def calibrate_screen_transition(self):
+        """Home screen -> map selection and back. The game must be on the home screen."""
+        width, height = self.controller.global_settings['reference_resolution']
+        play = self.positions['HOME_PLAY_BUTTON']
+        return self._measure('screen_transition', self._capture(0, 0, width, height),
+                             lambda: self.controller._click(*play),
+                             lambda: self.controller.click_at_position('BACK_BUTTON'))
+
+    def calibrate_placement_ghost(self):
+        """Tower shortcut -> ghost under the cursor. A map must be open."""
+        x, y = self.settings.get('placement_point', [700, 500])
+        size = self.settings.get('placement_region_size', 160)
+        shortcut = self.shortcuts[self.settings.get('placement_tower', 'DART')]
+        self.controller._move_mouse(x, y)
+        return self._measure('placement_ghost', self._capture(x - size // 2, y - size // 2, size, size),
+                             lambda: self.controller.input.press(shortcut),
+                             lambda: self.controller.input.press('esc'))
+
+    def calibrate_upgrade_panel(self):
+        """Click on a tower -> upgrade panel. Places the calibration tower first."""
+        x, y = self.settings.get('placement_point', [700, 500])
+        shortcut = self.shortcuts[self.settings.get('placement_tower', 'DART')]
+        self.controller._move_mouse(x, y)
+        self.controller.input.press(shortcut)
+        time.sleep(DEFAULT_DELAYS['placement_ghost'])
+        self.controller._click(x, y)
+        time.sleep(DEFAULT_DELAYS['instruction_gap'])
+        panel = self.settings.get('upgrade_panel_region', [1150, 200, 330, 600])
+        return self._measure('upgrade_panel', self._capture(*panel),
+                             lambda: self.controller._click(x, y),
+                             lambda: self.controller.input.press('esc'))
+
+    def calibrate(self):
+        """
+        Run every measurement: screen transitions on the home screen, then start
+        a map for the in-game ones.
+
+        Returns:
+            dict: {interaction: summary} for the interactions that reacted in time
+        """
+        results = {'screen_transition': self.calibrate_screen_transition()}
+        self.controller.start_dark_dungeons_game()
+        time.sleep(DEFAULT_DELAYS['map_start'])
+        results['placement_ghost'] = self.calibrate_placement_ghost()
+        results['upgrade_panel'] = self.calibrate_upgrade_panel()
+        for name, summary in results.items():
+            if summary is None:
+                self.logger.warning(f"No reaction measured for {name}, keeping the default delay")
+        return {name: summary for name, summary in results.items() if summary}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show or calibrate the UI timing profile of this machine')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='Measure reaction times (game open on the home screen)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logger = logging.getLogger('btd6.timing')
+    settings = Settings()
+    global_settings = settings.load_global_settings()
+
+    if args.calibrate:
+        # Imported here so showing the profile needs no display
+        from .game_controller import GameController
+        from .round_monitor import RoundMonitor
+        controller = GameController(RoundMonitor(logger), logger, global_settings.get('background_mode', True))
+        measurements = Calibrator(controller, global_settings, logger).calibrate()
+        machine_settings = settings.load_machine_settings()
+        machine_settings['timing'] = {**machine_settings.get('timing', {}), **measurements}
+        path = settings.save_machine_settings(machine_settings)
+        logger.info(f"Saved timing profile to {path}")
+
+    profile = TimingProfile.for_machine(global_settings)
+    for name, seconds in profile.delays.items():
+        source = 'calibrated' if any(name in names and interaction in profile.measurements
+                                     for interaction, names in CALIBRATED_DELAYS.items()) else 'default'
+        print(f"{name:<20} {seconds:6.3f}s  {source}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
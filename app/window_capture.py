@@ -1,125 +1,120 @@
 """
-Window-specific screenshot capture for macOS using Quartz APIs.
+Window-specific screenshot capture using Quartz (macOS) or X11 (Linux).
 Allows capturing a window even when it's not in the foreground.
+
+Finding the game window means enumerating every window on screen, so the
+window is looked up once and tracked by a WindowTracker: its bounds are
+revalidated cheaply at most every revalidate_interval, failed lookups back off
+exponentially instead of rescanning every poll tick, and listeners are told
+when the window moves, is resized or closes.
 """
 import subprocess
+import sys
+import threading
 import time
-import numpy as np
-from PIL import Image
-
-try:
-    import Quartz
-    from Quartz import (
-        CGWindowListCopyWindowInfo,
-        kCGWindowListOptionAll,
-        kCGWindowListOptionOnScreenOnly,
-        kCGNullWindowID,
-    )
-    import Quartz.CoreGraphics as CG
-    QUARTZ_AVAILABLE = True
-except ImportError:
-    QUARTZ_AVAILABLE = False
-
-
-class WindowCapture:
-    """Capture screenshots from a specific window without requiring focus."""
-
-    def __init__(self, app_name="BloonsTD6"):
-        """
-        Initialize WindowCapture for a specific application.
+from app.lazy import LazyModule, is_available
+
+np = LazyModule('numpy')
+Image = LazyModule('PIL.Image')
+# Quartz and Xlib are only imported once a window is actually looked up or captured
+Quartz = LazyModule('Quartz')
+CG = LazyModule('Quartz.CoreGraphics')
+QUARTZ_AVAILABLE = is_available('Quartz')
+Xdisplay = LazyModule('Xlib.display')
+X = LazyModule('Xlib.X')
+Xerror = LazyModule('Xlib.error')
+Xevent = LazyModule('Xlib.protocol.event')
+XLIB_AVAILABLE = sys.platform.startswith('linux') and is_available('Xlib')
+CAPTURE_AVAILABLE = QUARTZ_AVAILABLE or XLIB_AVAILABLE
+
+
+class CaptureBackend:
+    """
+    Platform interface used by WindowTracker and WindowCapture.
 
-        Args:
-            app_name: Name of the application to capture (partial match supported)
-        """
-        self.app_name = app_name
-        self._window_id = None
-        self._window_bounds = None
+    Bounds are dicts with 'X', 'Y', 'Width' and 'Height' in screen points.
+    """
 
-        if not QUARTZ_AVAILABLE:
-            raise ImportError(
-                "Quartz framework not available. Install with: "
-                "pip install pyobjc-framework-Quartz"
-            )
+    # Whether grab_region() captures regions directly instead of cropping grab()
+    region_grabs = False
+    # Whether the captured screen is another machine's, so the local screen is no fallback
+    remote = False
 
-    def find_window(self):
+    def list_windows(self):
         """
-        Find the window ID and bounds for the target application.
+        Enumerate on-screen windows (the expensive call).
 
         Returns:
-            tuple: (window_id, bounds_dict) or (None, None) if not found
+            list: (window_id, owner, name, bounds) tuples
         """
-        window_list = CGWindowListCopyWindowInfo(
-            kCGWindowListOptionOnScreenOnly,
-            kCGNullWindowID
-        )
+        raise NotImplementedError
 
-        for window in window_list:
-            owner = window.get('kCGWindowOwnerName', '')
-            name = window.get('kCGWindowName', '')
+    def window_bounds(self, window_id):
+        """Current bounds of one window, or None if it is gone or off screen."""
+        raise NotImplementedError
 
-            # Match by owner name or window name (case-insensitive partial match)
-            if (self.app_name.lower() in owner.lower() or
-                self.app_name.lower() in name.lower()):
-                window_id = window.get('kCGWindowNumber')
-                bounds = window.get('kCGWindowBounds')
+    def grab(self, window_id, bounds):
+        """Capture a window as a PIL Image, or None if the capture failed."""
+        raise NotImplementedError
 
-                if window_id and bounds:
-                    self._window_id = window_id
-                    self._window_bounds = bounds
-                    return window_id, bounds
+    def grab_region(self, window_id, bounds, x, y, width, height):
+        """Capture a region of a window as a PIL Image, for backends with region_grabs."""
+        raise NotImplementedError
 
-        return None, None
+    def damage_token(self, window_id):
+        """Marker of the window contents seen so far, or None if the backend does not track repaints."""
+        return None
 
-    def get_window_id(self):
-        """Get cached window ID, refreshing if necessary."""
-        if self._window_id is None:
-            self.find_window()
-        return self._window_id
+    def region_changed(self, window_id, since, x, y, width, height):
+        """Whether the region was repainted after damage_token() returned since (True when unknown)."""
+        return True
 
-    def get_window_bounds(self):
-        """Get cached window bounds, refreshing if necessary."""
-        if self._window_bounds is None:
-            self.find_window()
-        return self._window_bounds
+    def watch(self, window_id):
+        """Start delivering change events for window_id (no-op without an event source)."""
 
-    def capture_window(self):
+    def pending_changes(self, window_id):
         """
-        Capture the entire window as a PIL Image.
+        Changes reported by the window system since the last call.
 
         Returns:
-            PIL.Image: Screenshot of the window, or None if capture failed
-                       Image is scaled to match logical points (for Retina compatibility)
+            None if the backend has no event source (bounds are polled instead),
+            otherwise a possibly empty list of new bounds, with None meaning closed
         """
-        window_id = self.get_window_id()
-        if window_id is None:
-            # Try to find the window again
-            self.find_window()
-            window_id = self._window_id
-            if window_id is None:
-                return None
+        return None
+
 
-        # Capture the window
+class QuartzBackend(CaptureBackend):
+    """macOS capture through CGWindowList, polled for changes."""
+
+    def list_windows(self):
+        window_list = Quartz.CGWindowListCopyWindowInfo(
+            Quartz.kCGWindowListOptionOnScreenOnly,
+            Quartz.kCGNullWindowID
+        )
+        return [(window.get('kCGWindowNumber'), window.get('kCGWindowOwnerName', ''),
+                 window.get('kCGWindowName', ''), window.get('kCGWindowBounds'))
+                for window in window_list]
+
+    def window_bounds(self, window_id):
+        # Asking for a single window avoids enumerating the whole screen
+        window_list = Quartz.CGWindowListCopyWindowInfo(
+            Quartz.kCGWindowListOptionIncludingWindow,
+            window_id
+        )
+        for window in window_list or ():
+            if window.get('kCGWindowNumber') == window_id and window.get('kCGWindowIsOnscreen', False):
+                return window.get('kCGWindowBounds')
+        return None
+
+    def grab(self, window_id, bounds):
         image_ref = CG.CGWindowListCreateImage(
             CG.CGRectNull,  # Capture entire window
             CG.kCGWindowListOptionIncludingWindow,
             window_id,
             CG.kCGWindowImageBoundsIgnoreFraming
         )
-
         if image_ref is None:
-            # Window might have closed, clear cache and retry once
-            self._window_id = None
-            self._window_bounds = None
-            self.find_window()
-            if self._window_id:
-                image_ref = CG.CGWindowListCreateImage(
-                    CG.CGRectNull,
-                    CG.kCGWindowListOptionIncludingWindow,
-                    self._window_id,
-                    CG.kCGWindowImageBoundsIgnoreFraming
-                )
-            if image_ref is None:
-                return None
+            return None
 
         # Convert CGImage to PIL Image
         width = CG.CGImageGetWidth(image_ref)
@@ -142,7 +137,6 @@ class WindowCapture:
 
         # Handle Retina scaling: scale down to match logical points
         # Quartz returns physical pixels, but coordinates are in logical points
-        bounds = self.get_window_bounds()
         if bounds:
             logical_width = int(bounds['Width'])
             logical_height = int(bounds['Height'])
@@ -153,6 +147,293 @@ class WindowCapture:
 
         return image
 
+
+class X11Backend(CaptureBackend):
+    """Linux capture through python-xlib, with StructureNotify events for changes."""
+
+    def __init__(self, display=None):
+        """
+        Args:
+            display: X display name (defaults to $DISPLAY), opened on first use
+        """
+        self.display_name = display
+        self._display = None
+        self._watched = None
+
+    @property
+    def display(self):
+        if self._display is None:
+            self._display = Xdisplay.Display(self.display_name)
+        return self._display
+
+    @property
+    def root(self):
+        return self.display.screen().root
+
+    def list_windows(self):
+        client_list = self.root.get_full_property(
+            self.display.intern_atom('_NET_CLIENT_LIST'), X.AnyPropertyType)
+        windows = []
+        for window_id in (client_list.value if client_list else ()):
+            window = self.display.create_resource_object('window', window_id)
+            try:
+                wm_class = window.get_wm_class() or ('', '')
+                name = window.get_wm_name() or ''
+            except Xerror.XError:
+                continue
+            bounds = self.window_bounds(window_id)
+            if bounds:
+                windows.append((window_id, wm_class[-1], name, bounds))
+        return windows
+
+    def window_bounds(self, window_id):
+        window = self.display.create_resource_object('window', window_id)
+        try:
+            if window.get_attributes().map_state != X.IsViewable:
+                return None
+            geometry = window.get_geometry()
+            origin = self.root.translate_coords(window, 0, 0)
+        except Xerror.XError:
+            return None
+        return {'X': origin.x, 'Y': origin.y, 'Width': geometry.width, 'Height': geometry.height}
+
+    def grab(self, window_id, bounds):
+        window = self.display.create_resource_object('window', window_id)
+        try:
+            raw = window.get_image(0, 0, int(bounds['Width']), int(bounds['Height']), X.ZPixmap, 0xffffffff)
+        except Xerror.XError:
+            return None
+        return Image.frombytes('RGB', (int(bounds['Width']), int(bounds['Height'])), raw.data, 'raw', 'BGRX')
+
+    def watch(self, window_id):
+        window = self.display.create_resource_object('window', window_id)
+        try:
+            window.change_attributes(event_mask=X.StructureNotifyMask)
+        except Xerror.XError:
+            return
+        self._watched = window_id
+
+    def pending_changes(self, window_id):
+        if self._watched != window_id:
+            return None
+        changes = []
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if getattr(event, 'window', None) is None or event.window.id != window_id:
+                continue
+            if event.type in (X.DestroyNotify, X.UnmapNotify):
+                self._watched = None
+                changes.append(None)
+            elif event.type == X.ConfigureNotify:
+                # Event coordinates are relative to the window manager frame, query absolute ones
+                changes.append(self.window_bounds(window_id))
+        return changes
+
+
+def default_backend():
+    """The capture backend for this platform, or None if none is installed."""
+    if QUARTZ_AVAILABLE:
+        return QuartzBackend()
+    if XLIB_AVAILABLE:
+        return X11Backend()
+    return None
+
+
+class WindowTracker:
+    """Cached game window lookup with negative caching and change notification."""
+
+    FOUND = 'found'
+    MOVED = 'moved'
+    RESIZED = 'resized'
+    CLOSED = 'closed'
+
+    def __init__(self, backend, app_name, revalidate_interval=1.0, min_backoff=0.5, max_backoff=30.0,
+                 clock=time.monotonic):
+        """
+        Args:
+            backend: CaptureBackend to query
+            app_name: Name of the application to track (case-insensitive partial match)
+            revalidate_interval: Seconds between bounds checks of a found window
+            min_backoff: Seconds to wait after the first failed lookup
+            max_backoff: Longest wait between lookups while the window is missing
+            clock: Time source
+        """
+        self.backend = backend
+        self.app_name = app_name
+        self.revalidate_interval = revalidate_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.window_id = None
+        self.bounds = None
+        self.scans = 0
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._validated_at = 0.0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(event, old_bounds, new_bounds) on FOUND, MOVED, RESIZED and CLOSED."""
+        self._listeners.append(callback)
+
+    def get(self):
+        """
+        The tracked window, revalidated if due. While the window is missing this
+        only rescans once the backoff has elapsed.
+
+        Returns:
+            tuple: (window_id, bounds) or (None, None)
+        """
+        now = self.clock()
+        if self.window_id is not None:
+            changes = self.backend.pending_changes(self.window_id)
+            if changes is not None:
+                for bounds in changes:
+                    self._apply(bounds)
+                    if self.window_id is None:
+                        break
+            elif now - self._validated_at >= self.revalidate_interval:
+                self._validated_at = now
+                self._apply(self.backend.window_bounds(self.window_id))
+            if self.window_id is not None:
+                return self.window_id, self.bounds
+        if now < self._retry_at:
+            return None, None
+        return self.scan()
+
+    def scan(self):
+        """Enumerate windows now, regardless of backoff."""
+        self.scans += 1
+        now = self.clock()
+        name = self.app_name.lower()
+        for window_id, owner, title, bounds in self.backend.list_windows():
+            # Match by owner name or window name (case-insensitive partial match)
+            if window_id and bounds and (name in (owner or '').lower() or name in (title or '').lower()):
+                self._backoff = 0.0
+                self._retry_at = 0.0
+                self._validated_at = now
+                self.window_id, self.bounds = window_id, bounds
+                self.backend.watch(window_id)
+                self._notify(self.FOUND, None, bounds)
+                return window_id, bounds
+
+        self._backoff = min(self.max_backoff, self._backoff * 2 if self._backoff else self.min_backoff)
+        self._retry_at = now + self._backoff
+        return None, None
+
+    def lost(self):
+        """Forget the window (e.g. after a failed capture); the next get() rescans."""
+        if self.window_id is not None:
+            self._apply(None)
+
+    def _apply(self, bounds):
+        old_bounds = self.bounds
+        if bounds is None:
+            self.window_id, self.bounds = None, None
+            self._notify(self.CLOSED, old_bounds, None)
+            return
+        self.bounds = bounds
+        if (bounds['Width'], bounds['Height']) != (old_bounds['Width'], old_bounds['Height']):
+            self._notify(self.RESIZED, old_bounds, bounds)
+        elif (bounds['X'], bounds['Y']) != (old_bounds['X'], old_bounds['Y']):
+            self._notify(self.MOVED, old_bounds, bounds)
+
+    def _notify(self, event, old_bounds, new_bounds):
+        for callback in self._listeners:
+            callback(event, old_bounds, new_bounds)
+
+
+class WindowCapture:
+    """Capture screenshots from a specific window without requiring focus."""
+
+    def __init__(self, app_name="BloonsTD6", backend=None, **tracker_options):
+        """
+        Initialize WindowCapture for a specific application.
+
+        Args:
+            app_name: Name of the application to capture (partial match supported)
+            backend: CaptureBackend to use (defaults to the platform's backend)
+            tracker_options: WindowTracker options (revalidate_interval, min_backoff, max_backoff)
+        """
+        self.app_name = app_name
+        if backend is None:
+            if not CAPTURE_AVAILABLE:
+                raise ImportError(
+                    "No window capture backend available. Install with: "
+                    "pip install pyobjc-framework-Quartz (macOS) or pip install python-xlib (Linux)"
+                )
+            backend = default_backend()
+        self.backend = backend
+        self.tracker = WindowTracker(backend, app_name, **tracker_options)
+        # Seconds a full window grab may be reused by capture_region, so the regions read in one
+        # poll (round counter, lives) share a grab; 0 grabs for every region
+        self.max_frame_age = 0.0
+        self._last_frame = (None, None)
+
+    def add_listener(self, callback):
+        """Register callback(event, old_bounds, new_bounds) for window changes."""
+        self.tracker.add_listener(callback)
+
+    def find_window(self):
+        """
+        Find the window ID and bounds for the target application.
+
+        Returns:
+            tuple: (window_id, bounds_dict) or (None, None) if not found
+        """
+        return self.tracker.scan()
+
+    def get_window_id(self):
+        """Get cached window ID, refreshing if necessary."""
+        return self.tracker.get()[0]
+
+    def get_window_bounds(self):
+        """Get cached window bounds, refreshing if necessary."""
+        return self.tracker.get()[1]
+
+    def capture_window(self):
+        """
+        Capture the entire window as a PIL Image.
+
+        Returns:
+            PIL.Image: Screenshot of the window, or None if capture failed
+                       Image is scaled to match logical points (for Retina compatibility)
+        """
+        window_id, bounds = self.tracker.get()
+        if window_id is None:
+            return None
+
+        image = self.backend.grab(window_id, bounds)
+        if image is None:
+            # Window might have closed or been recreated, look it up once more
+            self.tracker.lost()
+            window_id, bounds = self.tracker.get()
+            if window_id is None:
+                return None
+            image = self.backend.grab(window_id, bounds)
+        return image
+
+    def damage_token(self):
+        """
+        Take before capturing a region, and pass to region_changed() later.
+
+        Returns:
+            Marker of the window contents, or None if the backend does not track repaints
+        """
+        window_id = self.tracker.window_id
+        return None if window_id is None else self.backend.damage_token(window_id)
+
+    def region_changed(self, x, y, width, height, since):
+        """Whether the region was repainted since damage_token() returned since (True when unknown)."""
+        window_id = self.tracker.window_id
+        if window_id is None or since is None:
+            return True
+        return self.backend.region_changed(window_id, since, x, y, width, height)
+
+    def invalidate(self):
+        """Drop the reusable grab, so the next capture_region shows the effect of input just sent."""
+        self._last_frame = (None, None)
+
     def capture_region(self, x, y, width, height):
         """
         Capture a specific region within the window.
@@ -166,18 +447,28 @@ class WindowCapture:
         Returns:
             PIL.Image: Screenshot of the region, or None if capture failed
         """
-        full_image = self.capture_window()
-        if full_image is None:
-            return None
+        if self.backend.region_grabs:
+            window_id, bounds = self.tracker.get()
+            if window_id is None:
+                return None
+            return self.backend.grab_region(window_id, bounds, x, y, width, height)
+
+        grabbed_at, full_image = self._last_frame
+        now = time.monotonic()
+        if full_image is None or now - grabbed_at > self.max_frame_age:
+            full_image = self.capture_window()
+            if full_image is None:
+                return None
+            if self.max_frame_age:
+                self._last_frame = (now, full_image)
 
         # Crop to the specified region
         return full_image.crop((x, y, x + width, y + height))
 
     def refresh_window(self):
         """Force refresh of window ID and bounds."""
-        self._window_id = None
-        self._window_bounds = None
-        return self.find_window()
+        self.tracker.lost()
+        return self.tracker.scan()
 
     def get_scale_factors(self, ref_width, ref_height):
         """
@@ -258,40 +549,98 @@ class WindowCapture:
 
 
 class WindowFocus:
-    """Utilities for managing window focus on macOS."""
+    """
+    Utilities for managing window focus on macOS (osascript) and Linux (python-xlib, through the
+    window manager's _NET_ACTIVE_WINDOW). Failures return False/None instead of raising, as focus
+    is switched from the monitor thread in the middle of instruction groups.
+    """
+
+    _display = None
+    # One display connection shared by the main and monitor threads
+    _lock = threading.Lock()
 
     @staticmethod
-    def bring_to_front(app_name, delay=0.3):
+    def _errors():
+        errors = (OSError, subprocess.TimeoutExpired)
+        return errors + (Xerror.XError, Xerror.DisplayError) if XLIB_AVAILABLE else errors
+
+    @classmethod
+    def _x11(cls):
+        if cls._display is None:
+            cls._display = Xdisplay.Display()
+        return cls._display, cls._display.screen().root
+
+    @classmethod
+    def _x11_activate(cls, app_name):
+        display, root = cls._x11()
+        active = display.intern_atom('_NET_ACTIVE_WINDOW')
+        client_list = root.get_full_property(display.intern_atom('_NET_CLIENT_LIST'), X.AnyPropertyType)
+        target = app_name.lower()
+        for window_id in (client_list.value if client_list else ()):
+            window = display.create_resource_object('window', window_id)
+            try:
+                names = [window.get_wm_name() or '', *(window.get_wm_class() or ())]
+            except Xerror.XError:
+                continue
+            if any(target in name.lower() for name in names):
+                # Source indication 2: a pager, which window managers honour without focus stealing checks
+                message = Xevent.ClientMessage(window=window, client_type=active,
+                                               data=(32, [2, X.CurrentTime, 0, 0, 0]))
+                root.send_event(message, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+                display.flush()
+                return True
+        return False
+
+    @classmethod
+    def _x11_frontmost(cls):
+        display, root = cls._x11()
+        active = root.get_full_property(display.intern_atom('_NET_ACTIVE_WINDOW'), X.AnyPropertyType)
+        if not active or not active.value or not active.value[0]:
+            return None
+        return display.create_resource_object('window', active.value[0]).get_wm_name() or None
+
+    @classmethod
+    def bring_to_front(cls, app_name, delay=0.3):
         """
         Bring an application to the foreground.
 
         Args:
-            app_name: Name of the application to activate
+            app_name: Name of the application to activate (on Linux, part of a window title or class)
             delay: Seconds to wait after activation for window to fully focus
+
+        Returns:
+            bool: False if the application could not be activated
         """
-        script = f'tell application "{app_name}" to activate'
-        subprocess.run(
-            ['osascript', '-e', script],
-            capture_output=True,
-            timeout=5
-        )
+        try:
+            if XLIB_AVAILABLE:
+                with cls._lock:
+                    activated = cls._x11_activate(app_name)
+            else:
+                activated = subprocess.run(['osascript', '-e', f'tell application "{app_name}" to activate'],
+                                           capture_output=True, timeout=5).returncode == 0
+        except cls._errors():
+            cls._display = None
+            return False
         time.sleep(delay)  # Wait for window to fully come to front
-
-    @staticmethod
-    def get_frontmost_app():
-        """Get the name of the currently frontmost application."""
-        script = '''
-            tell application "System Events"
-                set frontApp to name of first application process whose frontmost is true
-            end tell
-            return frontApp
-        '''
-        result = subprocess.run(
-            ['osascript', '-e', script],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        return activated
+
+    @classmethod
+    def get_frontmost_app(cls):
+        """Get the name of the currently frontmost application, None if unknown."""
+        try:
+            if XLIB_AVAILABLE:
+                with cls._lock:
+                    return cls._x11_frontmost()
+            script = '''
+                tell application "System Events"
+                    set frontApp to name of first application process whose frontmost is true
+                end tell
+                return frontApp
+            '''
+            result = subprocess.run(['osascript', '-e', script], capture_output=True, text=True, timeout=5)
+        except cls._errors():
+            cls._display = None
+            return None
         return result.stdout.strip() if result.returncode == 0 else None
 
 
@@ -332,19 +681,17 @@ def list_windows(app_filter=None):
     Args:
         app_filter: Optional string to filter by app name
     """
-    if not QUARTZ_AVAILABLE:
-        print("Quartz not available")
+    backend = default_backend()
+    if backend is None:
+        print("No capture backend available (Quartz or Xlib)")
         return
 
-    window_list = CGWindowListCopyWindowInfo(kCGWindowListOptionOnScreenOnly, kCGNullWindowID)
-
     print(f"{'Owner':<30} {'Window Name':<40} {'ID':<10}")
     print("-" * 80)
 
-    for window in window_list:
-        owner = window.get('kCGWindowOwnerName', '')
-        name = window.get('kCGWindowName', '')
-        wid = window.get('kCGWindowNumber', '')
+    for wid, owner, name, _ in backend.list_windows():
+        owner = owner or ''
+        name = name or ''
 
         if app_filter and app_filter.lower() not in owner.lower():
             continue
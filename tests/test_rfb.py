@@ -0,0 +1,102 @@
+"""
+RFB capture against MockRFBServer: dirty rectangles, damage tracking and resolution changes.
+
+Run with ```python -m unittest discover tests``` (or pytest).
+"""
+import unittest
+import numpy as np
+from app.rfb import MockRFBServer, RFBBackend, RFBClient
+from app.window_capture import WindowCapture
+
+
+def frame(width=320, height=192, value=40):
+    rgb = np.full((height, width, 3), value, dtype=np.uint8)
+    # A gradient so misplaced or swapped channels show up
+    rgb[..., 0] = np.arange(width, dtype=np.uint8)[None, :]
+    rgb[..., 1] = np.arange(height, dtype=np.uint8)[:, None]
+    return rgb
+
+
+class RFBClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockRFBServer(tile=32)
+        self.frame = frame()
+        self.server.update(self.frame)
+        self.server.start()
+        self.client = RFBClient(port=self.server.port, timeout=2.0)
+        self.client.connect()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def push(self, image):
+        sequence = self.client.sequence
+        self.server.update(image)
+        self.assertTrue(self.client.wait_update(sequence, 2.0))
+        return sequence
+
+    def test_first_update_fills_the_framebuffer(self):
+        self.assertEqual((self.client.width, self.client.height), (320, 192))
+        np.testing.assert_array_equal(self.client.snapshot(), self.frame)
+
+    def test_only_dirty_tiles_are_sent(self):
+        rects_before = self.server.rects_sent
+        changed = self.frame.copy()
+        changed[40:50, 200:210] = 255
+        self.push(changed)
+        # One 32x32 tile covers the change
+        self.assertEqual(self.server.rects_sent - rects_before, 1)
+        np.testing.assert_array_equal(self.client.snapshot(), changed)
+        np.testing.assert_array_equal(self.client.snapshot(200, 40, 10, 10), changed[40:50, 200:210])
+
+    def test_region_changed_follows_the_damage(self):
+        token = self.client.sequence
+        self.assertFalse(self.client.region_changed(token, 0, 0, 64, 64))
+        changed = self.frame.copy()
+        changed[150:160, 280:290] = 0
+        self.push(changed)
+        self.assertTrue(self.client.region_changed(token, 270, 140, 20, 20))
+        self.assertFalse(self.client.region_changed(token, 0, 0, 64, 64))
+        # Reading at the new sequence starts from a clean slate
+        self.assertFalse(self.client.region_changed(self.client.sequence, 270, 140, 20, 20))
+        self.assertTrue(self.client.region_changed(None, 0, 0, 1, 1))
+
+    def test_desktop_size_resizes_the_framebuffer(self):
+        token = self.client.sequence
+        small = frame(160, 96, value=99)
+        self.push(small)
+        self.assertEqual((self.client.width, self.client.height), (160, 96))
+        np.testing.assert_array_equal(self.client.snapshot(), small)
+        # Damage from before a resize no longer describes the screen
+        self.assertTrue(self.client.region_changed(token, 0, 0, 1, 1))
+
+
+class RFBBackendTest(unittest.TestCase):
+
+    def test_window_capture_reads_the_remote_screen(self):
+        server = MockRFBServer(tile=32)
+        image = frame()
+        server.update(image)
+        server.start()
+        backend = RFBBackend('BloonsTD6', port=server.port, timeout=2.0)
+        try:
+            capture = WindowCapture('BloonsTD6', backend=backend)
+            self.assertIsNotNone(capture.find_window())
+            np.testing.assert_array_equal(np.asarray(capture.capture_region(10, 20, 30, 40)), image[20:60, 10:40])
+            token = capture.damage_token()
+            changed = image.copy()
+            changed[0:8, 0:8] = 0
+            sequence = backend.client.sequence
+            server.update(changed)
+            self.assertTrue(backend.client.wait_update(sequence, 2.0))
+            self.assertTrue(capture.region_changed(0, 0, 16, 16, token))
+            self.assertFalse(capture.region_changed(100, 100, 16, 16, token))
+        finally:
+            backend.close()
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Round tracker voting validated against recorded round counter readings.
+
+fixtures/round_readings.jsonl holds rounds 6-12 polled every 0.5s in the format
+RoundMonitor records (round_readings_log), with the OCR failures seen on the
+counter: a leading 1 or 2 added to the round (+10/+11/+12), reads of earlier
+rounds, and unreadable frames.
+"""
+import json
+import os
+import unittest
+from app.round_tracker import RoundTracker, parse_round, replay
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'round_readings.jsonl')
+
+
+class ReplayTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE) as f:
+            cls.readings = [json.loads(line) for line in f if line.strip()]
+        cls.confirmations, cls.stats = replay(FIXTURE, start_round=5)
+
+    def test_every_round_is_confirmed_in_order(self):
+        self.assertEqual([round for _, round in self.confirmations], list(range(6, 13)))
+
+    def test_rounds_are_confirmed_on_their_first_confident_reading(self):
+        first_seen = {}
+        for reading in self.readings:
+            round = parse_round(reading['text'])
+            if round is not None and reading['conf'] >= 0.7:
+                first_seen.setdefault(round, reading['t'])
+        for t, round in self.confirmations:
+            self.assertEqual(t, first_seen[round])
+
+    def test_misreads_and_drops_are_rejected(self):
+        texts = [reading['text'] for reading in self.readings]
+        # +10 at round 7, +11 twice in a row at round 8, +12 at round 9 and 10
+        misreads = [text for text in texts if text in ('17/100', '19/100', '21/100', '22/100')]
+        self.assertEqual(len(misreads), 5)
+        # 6 read at round 9, 1 at round 10 and 8 at round 11
+        drops = 3
+        self.assertEqual(self.stats[RoundTracker.REJECTED], len(misreads) + drops)
+        confirmed = {round for _, round in self.confirmations}
+        self.assertFalse(confirmed & {17, 19, 21, 22})
+
+    def test_unreadable_frames_are_counted(self):
+        unreadable = sum(1 for reading in self.readings if parse_round(reading['text']) is None)
+        self.assertEqual(self.stats[RoundTracker.UNREADABLE], unreadable)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Every strategy run through the simulator, as the CI check of app/simulator.py.
+
+Catches strategies and GameController changes that crash or skip milestones
+without a game or display (settings paths are relative to the repository root).
+"""
+import logging
+import os
+import unittest
+from app.config import Settings
+from app.simulator import simulate_map
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SimulatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._cwd = os.getcwd()
+        os.chdir(ROOT)
+        cls.global_settings = Settings().load_global_settings()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls._cwd)
+
+    def test_every_map_runs_all_milestones(self):
+        maps = sorted(Settings().get_available_maps())
+        self.assertTrue(maps)
+        logger = logging.getLogger('btd6.simulator.test')
+        for map_name in maps:
+            with self.subTest(map=map_name):
+                with self.assertNoLogs(logger, level=logging.ERROR):
+                    report = simulate_map(map_name, self.global_settings, logger)
+                instructions = Settings().load_map_settings(map_name, 'impoppable')['instructions']
+                self.assertEqual([r['round'] for r in report['milestones']], list(instructions['milestones']))
+                for milestone in report['milestones']:
+                    self.assertEqual(milestone['instructions'], instructions[str(milestone['round'])])
+                    if milestone['instructions']:
+                        # Each instruction sends input, a milestone without events was skipped
+                        self.assertGreater(milestone['events'], 0, f"round {milestone['round']} sent no input")
+                self.assertGreater(report['start_time'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()